@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Write Slurm or PBS array scripts which run several sites per array task.
+
+Each stage of a method gets its own array script. A submit script next
+to them submits the stages in order, each one after the previous array
+has finished, with a stage_restart.py job in between which stages the
+restart files for the next stage.
+"""
+
+import argparse
+import os
+import shlex
+import subprocess
+
+from harvest import find_sites
+from workflow import chain_stages
+
+
+SCHEDULERS = {
+    'slurm': {
+        'suffix': 'slurm',
+        'directive': '#SBATCH',
+        'name': '--job-name={name}',
+        'array': '--array=0-{last}',
+        'task_id': 'SLURM_ARRAY_TASK_ID',
+        'workdir': 'SLURM_SUBMIT_DIR',
+        'step': 'srun --exact aims.x',
+        'submit': 'sbatch --parsable',
+        'after': '--dependency=afterok:${job%%;*}'
+    },
+    'pbs': {
+        'suffix': 'pbs',
+        'directive': '#PBS',
+        'name': '-N {name}',
+        'array': '-J 0-{last}',
+        'task_id': 'PBS_ARRAY_INDEX',
+        'workdir': 'PBS_O_WORKDIR',
+        'step': 'mpiexec aims.x',
+        'submit': 'qsub',
+        'after': '-W depend=afterok:$job'
+    }
+}
+
+# Directories with the control.in and geometry.in of each stage, in each site
+STAGES = {
+    'fop_di': chain_stages('fop_di'),
+    'fop_si': chain_stages('fop_si'),
+    'fob': ['']
+}
+
+SCRIPT = '''#!/bin/bash
+{directives}
+
+# Sites of this task are on line (task id + 1) of the manifest
+# Run with DRY_RUN=1 and {task_id}=<n> to print the steps instead
+cd "${{{workdir}:-$(dirname "$0")}}"
+sites=$(sed -n "$(({task_id} + 1))p" {manifest})
+
+# The pid in aims.pid lets scf_monitor.py --hook signal stop a stalled step
+run_step() {{
+  if [[ -n "$DRY_RUN" ]]; then
+    echo "cd $1 && {step} > aims.out"
+  else
+    (cd "$1" && {{ {step} > aims.out & echo $! > aims.pid; wait $!; }})
+  fi
+}}
+
+# Fail the task if any step fails, so the afterok chain stops
+failed=0
+running=0
+for site in $sites; do
+  run_step "$site{stage}" &
+  running=$((running + 1))
+
+  # Keep at most {parallel} steps running at once
+  if (( running >= {parallel} )); then
+    wait -n || failed=1
+    running=$((running - 1))
+  fi
+done
+while (( running > 0 )); do
+  wait -n || failed=1
+  running=$((running - 1))
+done
+exit $failed
+'''
+
+RESTART_SCRIPT = '''#!/bin/bash
+{directives}
+
+cd "${{{workdir}:-$(dirname "$0")}}"
+{command}
+'''
+
+SUBMIT_SCRIPT = '''#!/bin/bash
+# Submit the stages in order, each one once the previous job has finished
+set -e
+cd "$(dirname "$0")"
+
+{submits}
+'''
+
+
+def pack_sites(sites, per_task):
+    """Split the sites into the lists of sites of each array task."""
+    return [sites[i:i + per_task] for i in range(0, len(sites), per_task)]
+
+
+def array_name(element, stage):
+    """Get the base name of the script and manifest of a stage."""
+    return f'{element}_{stage}' if stage else element
+
+
+def render_script(name, stage, last_task, manifest, scheduler='slurm', parallel=1, step=None,
+                  directives=()):
+    """Get the text of an array script."""
+    options = SCHEDULERS[scheduler]
+
+    lines = [options['name'].format(name=name), options['array'].format(last=last_task)]
+    lines.extend(directives)
+
+    return SCRIPT.format(
+        directives='\n'.join(f'{options["directive"]} {line}' for line in lines),
+        task_id=options['task_id'],
+        workdir=options['workdir'],
+        manifest=manifest,
+        step=step if step is not None else options['step'],
+        stage=f'/{stage}' if stage else '',
+        parallel=max(parallel, 1)
+    )
+
+
+def render_restart_script(name, command, scheduler='slurm', directives=()):
+    """Get the text of a script which stages the restart files between two stages."""
+    options = SCHEDULERS[scheduler]
+    lines = [options['name'].format(name=name)]
+    lines.extend(directives)
+
+    return RESTART_SCRIPT.format(
+        directives='\n'.join(f'{options["directive"]} {line}' for line in lines),
+        workdir=options['workdir'],
+        command=command
+    )
+
+
+def render_submit_script(scripts, scheduler='slurm'):
+    """Get the text of a script which submits scripts in order, each after the previous one."""
+    options = SCHEDULERS[scheduler]
+    submits = []
+
+    for n, script in enumerate(scripts):
+        after = f' {options["after"]}' if n else ''
+        submits.append(f'job=$({options["submit"]}{after} {shlex.quote(script)})\n'
+                       f'echo "Submitted {script} as $job"')
+
+    return SUBMIT_SCRIPT.format(submits='\n'.join(submits))
+
+
+def write_script(path, text):
+    """Write an executable script."""
+    with open(path, 'w') as script_file:
+        script_file.write(text)
+    os.chmod(path, 0o755)
+
+
+def write_array_jobs(method, element, sites=None, root='./', scheduler='slurm', per_task=8,
+                     parallel=1, step=None, directives=(), move=True):
+    """
+    Write an array script and site manifest for every stage of a method.
+
+    sites are the site directories relative to root, by default every
+    site of the element. Each array task runs per_task sites, with at
+    most parallel steps at once. step is the command of each step, e.g.
+    'srun --exact -n 32 aims.x'. Between two stages a script runs
+    stage_restart.py, moving the restart files unless move is False, and
+    a submit script chains every script with afterok dependencies.
+    Returns the paths of the array scripts, followed by the submit script.
+    """
+    if sites is None:
+        sites = [directory for _, directory in find_sites(element, root)]
+
+    tasks = pack_sites(list(sites), per_task)
+    if not tasks:
+        raise ValueError(f'no {element} sites to write array scripts for')
+
+    suffix = SCHEDULERS[scheduler]['suffix']
+    stage_restart = shlex.quote(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                             'stage_restart.py'))
+    scripts = []
+    chain = []
+
+    for n, stage in enumerate(STAGES[method]):
+        name = array_name(element, stage)
+        manifest = f'{name}.sites'
+
+        # The restart files of the previous stage are staged once it has finished
+        if n > 0:
+            restart_name = f'{name}_restart'
+            command = f'python3 {stage_restart} {method} -e {element} -s {n}'
+            if move:
+                command += ' --move'
+            write_script(os.path.join(root, f'{restart_name}.{suffix}'),
+                         render_restart_script(restart_name, command, scheduler, directives))
+            chain.append(f'{restart_name}.{suffix}')
+
+        with open(os.path.join(root, manifest), 'w') as manifest_file:
+            manifest_file.writelines(' '.join(task) + '\n' for task in tasks)
+
+        script = os.path.join(root, f'{name}.{suffix}')
+        write_script(script, render_script(name, stage, len(tasks) - 1, manifest, scheduler,
+                                           parallel, step, directives))
+        scripts.append(script)
+        chain.append(f'{name}.{suffix}')
+
+    submit = os.path.join(root, f'{array_name(element, method)}_submit.sh')
+    write_script(submit, render_submit_script(chain, scheduler))
+    scripts.append(submit)
+
+    return scripts
+
+
+def dry_run(script, tasks=None):
+    """
+    Get the steps an array script would run in each task, without a scheduler.
+
+    tasks are the task ids to render, by default every task in the
+    manifest next to the script. Returns a dict of task id to steps.
+    """
+    scheduler = 'slurm' if script.endswith('.slurm') else 'pbs'
+    root = os.path.dirname(os.path.abspath(script))
+    manifest = os.path.splitext(script)[0] + '.sites'
+
+    if tasks is None:
+        with open(manifest, 'r') as manifest_file:
+            tasks = range(sum(1 for _ in manifest_file))
+
+    steps = {}
+    for task in tasks:
+        env = dict(os.environ, DRY_RUN='1')
+        env[SCHEDULERS[scheduler]['task_id']] = str(task)
+        env[SCHEDULERS[scheduler]['workdir']] = root
+
+        result = subprocess.run(['bash', os.path.abspath(script)], env=env, check=True,
+                                capture_output=True, text=True)
+        steps[task] = sorted(result.stdout.splitlines())
+
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write array scripts for the sites of an '
+                                     'element, or print the steps of a script.')
+    parser.add_argument('-m', '--method', choices=STAGES, help='type of calculation')
+    parser.add_argument('-e', '--element', help='target element')
+    parser.add_argument('-s', '--scheduler', choices=SCHEDULERS, default='slurm',
+                        help='batch scheduler (default: slurm)')
+    parser.add_argument('-p', '--per-task', type=int, default=8,
+                        help='number of sites in each array task (default: 8)')
+    parser.add_argument('-j', '--parallel', type=int, default=1,
+                        help='number of steps to run at once in each task (default: 1)')
+    parser.add_argument('--step', help='command of each step (default: srun --exact aims.x '
+                        'or mpiexec aims.x)')
+    parser.add_argument('-d', '--directive', action='append', default=[],
+                        help="extra scheduler directive, e.g. '--time=02:00:00'")
+    parser.add_argument('--no-move', action='store_true',
+                        help='link or copy the restart files between stages instead of '
+                        'moving them')
+    parser.add_argument('--dry-run', metavar='SCRIPT',
+                        help='print the steps of each task of a written script')
+    args = parser.parse_args()
+
+    if args.dry_run is not None:
+        for task, steps in dry_run(args.dry_run).items():
+            print(f'Task {task}:')
+            print(*steps, sep='\n')
+        return
+
+    if args.method is None or args.element is None:
+        parser.error('--method and --element are required')
+
+    if not find_sites(args.element):
+        print(f'No {args.element} site directories found')
+        exit(1)
+
+    for script in write_array_jobs(args.method, args.element, scheduler=args.scheduler,
+                                   per_task=args.per_task, parallel=args.parallel,
+                                   step=args.step, directives=args.directive,
+                                   move=not args.no_move):
+        print(f'Written {script}')
+
+
+if __name__ == '__main__':
+    main()
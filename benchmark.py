@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""Time the generators, harvesters, broadening and restart staging on synthetic inputs."""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import fob
+import fop_di
+import fop_si
+from geometry_in import Geometry
+from harvest import harvest_energies
+from plot_xps import dos_binning, dos_binning_fft, dos_binning_sparse
+from stage_restart import stage_restarts
+from wass import distance_matrix
+
+
+BENCHMARKS = ['generate', 'harvest', 'broaden', 'wass', 'stage']
+SIZES = [10, 1000, 10000]
+
+# Atomic number, mass, valence and ion occupancy of the synthetic species
+SPECIES = {
+    'H': (1, 1.00794, [(1, 's', 1)], [(1, 's', 0.5)]),
+    'C': (6, 12.0107, [(2, 's', 2), (2, 'p', 2)], [(2, 's', 1), (2, 'p', 1)]),
+    'N': (7, 14.0067, [(2, 's', 2), (2, 'p', 3)], [(2, 's', 1), (2, 'p', 2)]),
+    'O': (8, 15.9994, [(2, 's', 2), (2, 'p', 4)], [(2, 's', 1), (2, 'p', 3)])
+}
+
+
+def synthetic_geometry(n_atoms, target='C', others=('H', 'N', 'O'), periodic=False, seed=0):
+    """
+    Get the lines of a geometry.in with n_atoms atoms of target.
+
+    Every target atom is followed by one atom of the other elements in
+    turn, and the cell is a cube which is periodic if requested.
+    """
+    rng = np.random.default_rng(seed)
+    side = 1.5 * (2 * n_atoms) ** (1 / 3) + 5.0
+    lines = ['# Synthetic geometry\n']
+
+    if periodic:
+        lines.extend(f'lattice_vector {v[0]:.6f} {v[1]:.6f} {v[2]:.6f}\n'
+                     for v in np.eye(3) * side)
+
+    positions = rng.uniform(0, side, (2 * n_atoms, 3))
+    for i, (x, y, z) in enumerate(positions):
+        element = target if i % 2 == 0 else others[(i // 2) % len(others)]
+        lines.append(f'atom      {x:.6f}   {y:.6f}   {z:.6f} {element}\n')
+
+    return lines
+
+
+def synthetic_species(element, level='tight'):
+    """Get the lines of a species defaults block."""
+    z, mass, valence, ion_occ = SPECIES[element]
+    lines = ['#' * 80, '#', f'#  Suggested "{level}" defaults for {element} atom', '#', '#' * 80,
+             f'  species        {element}',
+             '#     global species definitions',
+             f'    nucleus             {z}',
+             f'    mass                {mass}',
+             '#',
+             '    l_hartree           6',
+             '#',
+             '    cut_pot             4.0  2.0  1.0',
+             '    basis_dep_cutoff    1e-4',
+             '#',
+             '    radial_base         34 7.0',
+             '    radial_multiplier   2',
+             '    angular_grids specified',
+             '      division   0.2187   50',
+             '      division   0.4416  110',
+             '      outer_grid  434',
+             '#' * 80,
+             '#     valence basis states']
+    lines.extend(f'    valence      {n}  {l}   {occ}.' for n, l, occ in valence)
+    lines.append('#     ion occupancy')
+    lines.extend(f'    ion_occ      {n}  {l}   {occ}' for n, l, occ in ion_occ)
+    lines.extend(['#' * 80,
+                  '#  "First tier" - improvements: -1214.57 meV to -155.61 meV',
+                  '     hydro 2 p 1.7',
+                  '     hydro 3 d 6',
+                  '     hydro 2 s 4.9',
+                  '#  "Second tier" - improvements: -67.75 meV to -5.23 meV',
+                  '#     hydro 4 f 9.8',
+                  '#     hydro 3 p 5.2'])
+
+    return [line + '\n' for line in lines]
+
+
+def synthetic_control(elements=('C', 'H', 'N', 'O'), level='tight'):
+    """Get the lines of a ground state control.in with species blocks."""
+    lines = ['xc                 pbe\n',
+             'spin               collinear\n',
+             'default_initial_moment 0\n',
+             'relativistic       atomic_zora scalar\n',
+             'occupation_type    gaussian 0.01\n',
+             'sc_accuracy_rho    1E-5\n',
+             'sc_iter_limit      500\n',
+             'KS_method          parallel\n',
+             'restart_write_only restart_file\n',
+             '#output cube spin_density\n']
+
+    for element in elements:
+        lines.extend(synthetic_species(element, level))
+
+    return lines
+
+
+def write_species_defaults(root, elements=SPECIES, levels=('light', 'tight')):
+    """Write a species defaults tree, returning its root."""
+    for level in levels:
+        level_dir = os.path.join(root, 'defaults_2020', level)
+        os.makedirs(level_dir, exist_ok=True)
+
+        for element in elements:
+            with open(os.path.join(level_dir, f'{SPECIES[element][0]:02d}_{element}_default'),
+                      'w') as species_file:
+                species_file.writelines(synthetic_species(element, level))
+
+    return root
+
+
+def synthetic_output(size=2**18, energy=-1030.5, iterations=None, seed=0):
+    """
+    Get the text of a finished aims.out of about size bytes.
+
+    The SCF iterations have the density, energy change and time lines
+    of FHI-aims, followed by the final energy and total time.
+    """
+    rng = np.random.default_rng(seed)
+    header = '  Invoking FHI-aims ...\n' + '  Synthetic output for benchmarking\n' * 20
+    iteration = ('  Begin self-consistency iteration #{n:5d}\n'
+                 '  Date     :  20260101, Time     :  120000.000\n'
+                 '  ' + '-' * 60 + '\n'
+                 '  Self-consistency convergence accuracy:\n'
+                 '  | Change of charge density      :  {rho:.4E}\n'
+                 '  | Change of sum of eigenvalues  :  {eig:.4E} eV\n'
+                 '  | Change of total energy        :  {etot:.4E} eV\n'
+                 '  End self-consistency iteration #{n:5d}       :'
+                 '  max(cpu_time)    wall_clock(cpu1)\n'
+                 '  | Time for this iteration                     :        {t:.3f} s'
+                 '           {t:.3f} s\n')
+    footer = ('  Self-consistency cycle converged.\n'
+              '  | Total energy of the DFT / Hartree-Fock s.c.f. calculation      :'
+              f'     {energy:.8f} eV\n'
+              '          | Total time                                  :'
+              f'      {rng.uniform(100, 1000):.3f} s          {rng.uniform(100, 1000):.3f} s\n'
+              '          Have a nice day.\n')
+
+    length = len(iteration.format(n=1, rho=1, eig=1, etot=1, t=1))
+    if iterations is None:
+        iterations = max((size - len(header) - len(footer)) // length, 1)
+
+    times = rng.uniform(1, 2, iterations)
+    blocks = [iteration.format(n=n + 1, rho=10 ** (-n / 10), eig=-(10 ** (-n / 10)),
+                               etot=10 ** (-n / 8), t=times[n])
+              for n in range(iterations)]
+
+    return header + ''.join(blocks) + footer
+
+
+def best_time(function, repeat=1, setup=None):
+    """Get the shortest time of several calls of a function."""
+    times = []
+
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def quiet(function, *args, **kwargs):
+    """Call a function without its printed output."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def bench_generate(workdir, n_sites, repeat=1, periodic=False):
+    """Time writing the core hole directories of each method for n_sites sites."""
+    ground = os.path.join(workdir, 'ground')
+    os.makedirs(ground, exist_ok=True)
+    geometry_in = Geometry(synthetic_geometry(n_sites, periodic=periodic))
+    control_in = synthetic_control()
+    results = []
+
+    def clean():
+        for entry in os.scandir(workdir):
+            if entry.name.startswith('C') and entry.is_dir():
+                shutil.rmtree(entry.path)
+
+    generators = {
+        'fop_di': lambda: fop_di.generate('C', n_sites, 'tight', (1, 5), control_in,
+                                          geometry_in),
+        'fop_si': lambda: fop_si.generate('C', n_sites, 'tight', (1, 5), control_in,
+                                          geometry_in),
+        'fob': lambda: fob.generate('C', n_sites, control_in, geometry_in)
+    }
+
+    previous = os.getcwd()
+    os.chdir(ground)
+    try:
+        for method, generate in generators.items():
+            seconds = best_time(lambda: quiet(generate), repeat, clean)
+            results.append({'variant': method, 'seconds': seconds})
+        clean()
+    finally:
+        os.chdir(previous)
+
+    return results
+
+
+def bench_harvest(workdir, n_sites, repeat=1, output_size=2**18):
+    """Time harvesting the final energies of n_sites outputs, cold and cached."""
+    text = synthetic_output(output_size)
+
+    for i in range(1, n_sites + 1):
+        os.makedirs(os.path.join(workdir, f'C{i}', 'hole'), exist_ok=True)
+        with open(os.path.join(workdir, f'C{i}', 'hole', 'aims.out'), 'w') as out:
+            out.write(text)
+
+    results = [
+        {'variant': 'cold', 'seconds': best_time(
+            lambda: harvest_energies('C', 'fop', workdir, cache=False), repeat)},
+        {'variant': 'serial', 'seconds': best_time(
+            lambda: harvest_energies('C', 'fop', workdir, workers=1, cache=False), repeat)}
+    ]
+
+    harvest_energies('C', 'fop', workdir)
+    results.append({'variant': 'cached', 'seconds': best_time(
+        lambda: harvest_energies('C', 'fop', workdir), repeat)})
+
+    return results
+
+
+def bench_broaden(n_sites, repeat=1):
+    """Time broadening n_sites peaks with each scheme of plot_xps."""
+    rng = np.random.default_rng(0)
+    peaks = rng.uniform(283, 290, n_sites)
+    options = dict(broadening=0.7, mix1=0.3, mix2=0.3, start=280., stop=295., broadening2=0.7,
+                   ewid1=286., ewid2=287.)
+    schemes = {'direct': dos_binning, 'sparse': dos_binning_sparse, 'fft': dos_binning_fft}
+
+    return [{'variant': name, 'seconds': best_time(lambda: broaden(peaks, **options), repeat)}
+            for name, broaden in schemes.items()]
+
+
+def bench_wass(n_sites, repeat=1, n_sets=4):
+    """Time the Wasserstein distances of n_sets sets of n_sites peaks, pair by pair and as a matrix."""
+    import scipy.stats as st
+
+    rng = np.random.default_rng(0)
+    sets = [rng.normal(285, 1, n_sites) for _ in range(n_sets)]
+
+    def compare():
+        for a in sets:
+            for b in sets:
+                st.wasserstein_distance(a, b)
+
+    peaks = [(np.sort(values), np.ones(len(values))) for values in sets]
+
+    return [{'variant': f'{n_sets}x{n_sets}', 'seconds': best_time(compare, repeat)},
+            {'variant': 'matrix', 'seconds': best_time(lambda: distance_matrix(peaks), repeat)}]
+
+
+def bench_stage(workdir, n_sites, repeat=1, restart_size=2**20):
+    """Time staging the restart files of n_sites fop_si sites."""
+    output = synthetic_output(iterations=5)
+    restart = os.urandom(restart_size)
+    control = ''.join(synthetic_control()).replace('restart_write_only',
+                                                    'restart_read_only')
+
+    for i in range(1, n_sites + 1):
+        init = os.path.join(workdir, f'C{i}', 'init')
+        hole = os.path.join(workdir, f'C{i}', 'hole')
+        os.makedirs(init, exist_ok=True)
+        os.makedirs(hole, exist_ok=True)
+        with open(os.path.join(init, 'aims.out'), 'w') as out:
+            out.write(output)
+        with open(os.path.join(init, 'restart_file'), 'wb') as restart_file:
+            restart_file.write(restart)
+        with open(os.path.join(hole, 'control.in'), 'w') as control_file:
+            control_file.write(control)
+
+    results = []
+    for methods in (['reflink', 'hardlink', 'symlink', 'copy'], ['copy']):
+        seconds = best_time(lambda: stage_restarts('fop_si', 'C', root=workdir, methods=methods,
+                                                   journal=False), repeat)
+        results.append({'variant': methods[0] if len(methods) == 1 else 'links',
+                        'seconds': seconds})
+
+    return results
+
+
+def run_benchmarks(benchmarks=BENCHMARKS, sizes=SIZES, repeat=1, workdir=None,
+                   output_size=2**18, restart_size=2**20, periodic=False):
+    """Run the benchmarks at every size, returning a list of results."""
+    results = []
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        os.environ['SPECIES_DEFAULTS'] = write_species_defaults(os.path.join(tmp, 'species'))
+        os.environ['XDG_CACHE_HOME'] = os.path.join(tmp, 'cache')
+
+        for n_sites in sizes:
+            for benchmark in benchmarks:
+                bench_dir = os.path.join(tmp, f'{benchmark}_{n_sites}')
+                os.makedirs(bench_dir)
+
+                if benchmark == 'generate':
+                    timings = bench_generate(bench_dir, n_sites, repeat, periodic)
+                elif benchmark == 'harvest':
+                    timings = bench_harvest(bench_dir, n_sites, repeat, output_size)
+                elif benchmark == 'broaden':
+                    timings = bench_broaden(n_sites, repeat)
+                elif benchmark == 'wass':
+                    timings = bench_wass(n_sites, repeat)
+                else:
+                    timings = quiet(bench_stage, bench_dir, n_sites, repeat, restart_size)
+
+                shutil.rmtree(bench_dir)
+
+                for timing in timings:
+                    result = dict(benchmark=benchmark, sites=n_sites, **timing)
+                    results.append(result)
+                    print(f'{benchmark:10s} {timing["variant"]:8s} {n_sites:7d} sites: '
+                          f'{timing["seconds"]:.4f} s', flush=True)
+
+    return results
+
+
+def git_revision():
+    """Get the commit of the scripts, or None outside of a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(old, new):
+    """Print the ratio of new to old times of the benchmarks in both."""
+    old_times = {(r['benchmark'], r['variant'], r['sites']): r['seconds']
+                 for r in old['results']}
+
+    for result in new['results']:
+        key = (result['benchmark'], result['variant'], result['sites'])
+        if key in old_times and old_times[key] > 0:
+            print(f'{key[0]:10s} {key[1]:8s} {key[2]:7d} sites: '
+                  f'{result["seconds"] / old_times[key]:.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the scripts on synthetic inputs.')
+    parser.add_argument('-b', '--benchmarks', nargs='+', choices=BENCHMARKS,
+                        default=BENCHMARKS, help='benchmarks to run (default: all)')
+    parser.add_argument('-n', '--sizes', nargs='+', type=int, default=SIZES,
+                        help='numbers of sites (default: 10 1000 10000)')
+    parser.add_argument('-r', '--repeat', type=int, default=1,
+                        help='best of this many runs (default: 1)')
+    parser.add_argument('-o', '--output', default='benchmark.json',
+                        help='results file (default: benchmark.json)')
+    parser.add_argument('-c', '--compare', help='results file of an earlier version')
+    parser.add_argument('--workdir', help='directory for the synthetic files (default: /tmp)')
+    parser.add_argument('--output-size', type=int, default=2**18,
+                        help='bytes of each synthetic aims.out (default: 262144)')
+    parser.add_argument('--restart-size', type=int, default=2**20,
+                        help='bytes of each synthetic restart file (default: 1048576)')
+    parser.add_argument('--periodic', action='store_true',
+                        help='generate from a periodic synthetic geometry')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.benchmarks, args.sizes, args.repeat, args.workdir,
+                             args.output_size, args.restart_size, args.periodic)
+    report = {
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results
+    }
+
+    with open(args.output, 'w') as out:
+        json.dump(report, out, indent=1)
+    print(f'Results written to {args.output}')
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as old:
+            compare_results(json.load(old), report)
+
+
+if __name__ == '__main__':
+    main()
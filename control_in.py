@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Parse an FHI-aims control.in once and render modified copies of it."""
+
+
+class SpeciesBlock:
+    """Line indices of one species block in a control.in."""
+
+    def __init__(self, name, start):
+        self.name = name
+        self.start = start
+        self.end = None
+        self.nucleus = None
+        self.valence = []
+        self.ion_occ = []
+
+
+class ControlIn:
+    """
+    Lines of a control.in with tables to find keywords and species.
+
+    Edits are given as a dict of line index to new line plus a list of
+    lines to append, so that the parsed lines are never modified and
+    several stages or sites can be rendered from the same parse.
+    """
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.tokens = {}
+        self.keywords = {}
+        self.line_index = {}
+        self.species = []
+
+        block = None
+        for i, line in enumerate(self.lines):
+            spl = line.split()
+            self.line_index.setdefault(line, []).append(i)
+
+            if len(spl) == 0:
+                continue
+
+            # Keywords may be commented out as '#keyword' or '# keyword'
+            if spl[0] == '#' and len(spl) > 1:
+                keyword, args, commented = spl[1], spl[2:], True
+            elif spl[0].startswith('#'):
+                keyword, args, commented = spl[0][1:], spl[1:], True
+            else:
+                keyword, args, commented = spl[0], spl[1:], False
+
+            # Only lines with a value can be keyword lines
+            if len(spl) > 1:
+                for token in set(spl):
+                    self.tokens.setdefault(token, []).append(i)
+                self.keywords.setdefault((keyword, commented), []).append((i, args))
+
+            if not commented and keyword == 'species' and len(args) > 0:
+                if block is not None:
+                    block.end = i
+                block = SpeciesBlock(args[0], i)
+                self.species.append(block)
+            elif block is not None and not commented:
+                if keyword == 'nucleus' and block.nucleus is None:
+                    block.nucleus = i
+                elif keyword == 'valence':
+                    block.valence.append(i)
+                elif keyword == 'ion_occ':
+                    block.ion_occ.append(i)
+
+        if block is not None:
+            block.end = len(self.lines)
+
+    @classmethod
+    def read(cls, path):
+        """Parse a control.in file."""
+        with open(path, 'r') as control:
+            return cls(control.readlines())
+
+    def with_token(self, token):
+        """Get the indices of keyword lines containing a word."""
+        return self.tokens.get(token, [])
+
+    def keyword(self, name, commented=False, args=()):
+        """Get the indices of lines setting a keyword, whose values start with args."""
+        return [i for i, values in self.keywords.get((name, commented), [])
+                if tuple(values[:len(args)]) == tuple(args)]
+
+    def species_block(self, name):
+        """Get the first species block of a species, or None."""
+        for block in self.species:
+            if block.name == name:
+                return block
+
+        return None
+
+    def set_value(self, index, value):
+        """Get a line with its last word replaced, keeping the spacing."""
+        line = self.lines[index]
+        old = line.split()[-1]
+        pos = line.rindex(old)
+        return line[:pos] + value + line[pos + len(old):]
+
+    def contains(self, line, edits):
+        """Check if a line is in the control.in after applying edits."""
+        if line in edits.values():
+            return True
+
+        return any(i not in edits for i in self.line_index.get(line, []))
+
+    def render_lines(self, edits=None, append=()):
+        """Get the lines of the control.in after applying edits."""
+        lines = list(self.lines)
+
+        if edits is not None:
+            for i, line in edits.items():
+                lines[i] = line
+
+        lines.extend(append)
+        return lines
+
+    def render(self, edits=None, append=()):
+        """Get the text of the control.in after applying edits."""
+        return ''.join(self.render_lines(edits, append))
@@ -1,17 +1,14 @@
 #!/usr/bin/env python3
 
-import glob
-import shutil
+from stage_restart import CHAINS, print_report, stage_restarts
 
 
 def copy_restart():
     atom = str(input('Enter atom: '))
 
-    for dir in glob.glob(f'{atom}*'):
-        for file in glob.glob(f'{dir}/init/restart_file*'):
-            restart = file.split('/')[-1]
-            shutil.copyfile(f'{dir}/init/{restart}',
-                            f'{dir}/hole/{restart}')
+    # Link or clone the restart files rather than copying where possible
+    report = stage_restarts('fop_si', atom)
+    print_report(report, *CHAINS['fop_si'][0])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Cluster the atoms of an element with nearly identical local environments."""
+
+import argparse
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+import profiling
+from geometry_in import Geometry
+from harvest import write_site_weights
+
+
+CUTOFF = 5.0
+BIN_WIDTH = 0.2
+
+
+def wrapped_positions(geometry):
+    """Get the cartesian positions of all atoms, wrapped into the unit cell if periodic."""
+    positions = geometry.cartesian()
+    if not geometry.periodic:
+        return positions
+
+    frac = positions @ np.linalg.inv(geometry.lattice)
+    return (frac - np.floor(frac)) @ geometry.lattice
+
+
+def periodic_images(geometry, cutoff):
+    """
+    Get the positions and atom indices of every atom and of its periodic
+    images within cutoff of the unit cell.
+    """
+    positions = wrapped_positions(geometry)
+    atoms = np.arange(len(positions))
+    if not geometry.periodic:
+        return positions, atoms
+
+    lattice = geometry.lattice
+    frac = positions @ np.linalg.inv(lattice)
+
+    # Cells to repeat along each lattice vector, from the spacing of its planes
+    margin = cutoff * np.linalg.norm(np.linalg.inv(lattice), axis=0)
+    repeats = np.ceil(margin).astype(int)
+
+    shifts = np.array(np.meshgrid(*[np.arange(-n, n + 1) for n in repeats],
+                                  indexing='ij')).reshape(3, -1).T
+    images = (frac[None, :, :] + shifts[:, None, :]).reshape(-1, 3)
+    image_atoms = np.tile(atoms, len(shifts))
+
+    near = np.all((images > -margin) & (images < 1 + margin), axis=1)
+
+    return images[near] @ lattice, image_atoms[near]
+
+
+@profiling.timed()
+def descriptors(geometry, indices, cutoff=CUTOFF, bin_width=BIN_WIDTH):
+    """
+    Get a descriptor of the local environment of each atom in indices.
+
+    The descriptor is a radial histogram of the neighbours of each
+    species within cutoff, with every neighbour shared linearly between
+    its two nearest bins and faded out smoothly at the cutoff, so that
+    it changes continuously with the positions.
+    """
+    positions, image_atoms = periodic_images(geometry, cutoff)
+    n_species = len(geometry.species_names)
+    n_bins = int(np.ceil(cutoff / bin_width)) + 1
+
+    # The targets must sit in the same cell as the images around them
+    targets = cKDTree(wrapped_positions(geometry)[indices])
+    pairs = targets.sparse_distance_matrix(cKDTree(positions), cutoff, output_type='ndarray')
+    pairs = pairs[pairs['v'] > 1e-8]
+    profiling.count('neighbour pairs', len(pairs))
+
+    r = pairs['v']
+    fade = 0.5 * (np.cos(np.pi * r / cutoff) + 1)
+    position = r / bin_width
+    lower = np.floor(position).astype(int)
+    upper_share = position - lower
+
+    offsets = (pairs['i'] * n_species + geometry.species[image_atoms[pairs['j']]]) * n_bins
+    size = len(indices) * n_species * n_bins
+    histogram = (np.bincount(offsets + lower, fade * (1 - upper_share), minlength=size)
+                 + np.bincount(offsets + lower + 1, fade * upper_share, minlength=size))
+
+    return histogram.reshape(len(indices), n_species * n_bins)
+
+
+@profiling.timed()
+def leader_clusters(vectors, tol):
+    """
+    Group vectors greedily: each vector not yet in a cluster leads a new
+    one with every other free vector within tol of it.
+    """
+    tree = cKDTree(vectors)
+    cluster = np.full(len(vectors), -1)
+    clusters = []
+
+    for leader in range(len(vectors)):
+        if cluster[leader] >= 0:
+            continue
+
+        members = np.array(tree.query_ball_point(vectors[leader], tol), dtype=int)
+        members = np.sort(members[cluster[members] < 0])
+        cluster[members] = len(clusters)
+        clusters.append(members)
+
+    return clusters
+
+
+def cluster_sites(geometry, element, tol, cutoff=CUTOFF, bin_width=BIN_WIDTH):
+    """
+    Get the clusters of sites of an element with nearly identical
+    environments, as sorted lists of 1-based site numbers whose first
+    site is the representative.
+
+    tol is the largest descriptor distance to a representative. Moving
+    one neighbour by d changes the descriptor by up to about
+    sqrt(2) * d / bin_width.
+    """
+    indices = geometry.element_indices(element)
+    if len(indices) == 0:
+        return []
+
+    vectors = descriptors(geometry, indices, cutoff, bin_width)
+
+    return [(members + 1).tolist() for members in leader_clusters(vectors, tol)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cluster the sites of an element with nearly '
+                                     'identical environments and write their multiplicities.')
+    parser.add_argument('-e', '--element', help='target element')
+    parser.add_argument('-g', '--geometry', default='geometry.in',
+                        help='geometry file (default: geometry.in)')
+    parser.add_argument('-t', '--tol', type=float, default=0.05,
+                        help='largest descriptor distance within a cluster (default: 0.05)')
+    parser.add_argument('-c', '--cutoff', type=float, default=CUTOFF,
+                        help=f'radius of the environment in Angstrom (default: {CUTOFF})')
+    parser.add_argument('-r', '--root', default='../',
+                        help='directory of the core hole directories (default: ../)')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
+    if args.element is None:
+        args.element = str(input('Enter atom: '))
+
+    clusters = cluster_sites(Geometry.read(args.geometry), args.element, args.tol, args.cutoff)
+    path = write_site_weights(args.element, clusters, args.root)
+
+    for sites in clusters:
+        print(f'{args.element}{sites[0]}: {len(sites)} sites')
+    print(f'{len(clusters)} clusters written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,10 @@
 """Automate creation of files for FOB calculations in FHI-aims."""
 
 import os
-import shutil
+
+import profiling
+from control_in import ControlIn
+from geometry_in import Geometry
 
 
 def read_ground_inp():
@@ -52,19 +55,8 @@ def read_ground_inp():
 
     # Default to all atoms if specific atoms aren't specified
     if len(atom_specifier) == 0:
-        with open('geometry.in', 'r') as geom_in:
-            atom_counter = 0
-
-            for line in geom_in:
-                spl = line.split()
-
-                if len(spl) > 0 and 'atom' == spl[0] and target_atom in line:
-                    atom_counter += 1
-                    element = spl[-1]  # Identify atom
-                    identifier = spl[0]  # Extra check that line is an atom
-
-                    if identifier == 'atom' and element == target_atom:
-                        atom_specifier.append(atom_counter)
+        atom_counter = len(Geometry.read('geometry.in').element_indices(target_atom))
+        atom_specifier = list(range(1, atom_counter + 1))
 
         print('Specified atoms:', atom_specifier)
 
@@ -75,91 +67,100 @@ def read_ground_inp():
         return target_atom, atom_specifier
 
 
-def create_new_controls(target_atom, num_atom):
-    """Write new directories and control files to calculate FOB."""
+@profiling.timed()
+def create_new_controls(target_atom, num_atom, control_in=None, geometry_in=None):
+    """
+    Write new directories and control files to calculate FOB.
+
+    control_in holds the lines of the ground state control.in and
+    geometry_in its parsed Geometry, which are read from the current
+    directory if not given.
+    """
     ks_method = 'KS_method               serial\n'
     charge = 'charge                  1.0\n'
     cube = 'output                  cube spin_density\n'
 
-    for i in range(num_atom):
-        i += 1
+    if control_in is None:
+        with open('control.in', 'r') as read_control:
+            control_in = read_control.readlines()
+    if geometry_in is None:
+        geometry_in = Geometry.read('geometry.in')
+    target_atoms = geometry_in.element_indices(target_atom)
+    geom_content = ''.join(geometry_in.lines)
+    n_states = len(target_atoms)
+
+    if type(num_atom) == list:
+        loop_iterator = num_atom
+    else:
+        loop_iterator = range(num_atom)
+
+    # Find the lines to change once, only the FOB line differs between sites
+    control_ground = ControlIn(control_in)
+    edits = {}
+
+    # Some error checking
+    if len(control_ground.keyword('force_occupation_basis')) > 0:
+        print('force_occupation_basis keyword already found in control.in')
+        exit(1)
+    if len(control_ground.keyword('charge')) > 0:
+        print('charge keyword already found in control.in')
+        exit(1)
+    if len(control_ground.keyword('output', args=['cube', 'spin_density'])) > 0:
+        print('spin_density cube output already specified in control.in')
+
+    # Change keyword lines
+    for j in control_ground.with_token('KS_method'):
+        edits[j] = ks_method
+    fob_lines = control_ground.keyword('force_occupation_basis', commented=True)
+    for j in control_ground.keyword('charge', commented=True):
+        edits[j] = charge
+    for j in control_ground.keyword('output', commented=True, args=['cube', 'spin_density']):
+        edits[j] = cube
+
+    # Check if parameters not found
+    no_ks = not control_ground.contains(ks_method, edits)
+    no_charge = not control_ground.contains(charge, edits)
+    no_cube = not control_ground.contains(cube, edits)
+
+    for i in loop_iterator:
+        if type(num_atom) != list:
+            i += 1
+
         os.mkdir(f'../{target_atom}{i}/')
-        shutil.copyfile('control.in', f'../{target_atom}{i}/control.in')
-        shutil.copyfile('geometry.in', f'../{target_atom}{i}/geometry.in')
-
-        control = f'../{target_atom}{i}/control.in'
-        fob = f'force_occupation_basis  {i} 1 atomic 2 1 1 0.0 {num_atom}\n'
-
-        # Find and replace stuff to be changed
-        with open(control, 'r') as read_control:
-            content = read_control.readlines()
-
-            # Replace specific lines
-            for j, line in enumerate(content):
-                spl = line.split()
-
-                # Some error checking
-                if len(spl) > 1:
-
-                    if 'force_occupation_basis' == spl[0]:
-                        print('force_occupation_basis keyword already found in control.in')
-                        exit(1)
-                    if 'charge' == spl[0]:
-                        print('charge keyword already found in control.in')
-                        exit(1)
-                    if 'output' == spl[0] and \
-                       'cube' == spl[1] and \
-                       'spin_density' == spl[2]:
-                        print('spin_density cube output already specified in control.in')
-
-                    # Change keyword lines
-                    if 'KS_method' in spl:
-                        content[j] = ks_method
-                    if '#force_occupation_basis' in spl:
-                        content[j] = fob
-                    if '#' == spl[0] and 'force_occupation_basis' == spl[1]:
-                        content[j] = fob
-                    if '#charge' in spl:
-                        content[j] = charge
-                    if '#' == spl[0] and 'charge' == spl[1]:
-                        content[j] = charge
-                    if line.strip() == '#output                  cube spin_density':
-                        content[j] = cube
-                    if '#' == spl[0] and 'output' == spl[1]:
-                        content[j] = cube
-
-            # Check if parameters not found
-            no_ks = False
-            no_fob = False
-            no_charge = False
-            no_cube = False
-
-            if ks_method not in content:
-                no_ks = True
-            if fob not in content:
-                no_fob = True
-            if charge not in content:
-                no_charge = True
-            if cube not in content:
-                no_cube = True
+        with open(f'../{target_atom}{i}/geometry.in', 'w') as write_geom:
+            write_geom.write(geom_content)
+
+        # The basis is selected by the position of the atom in geometry.in
+        fob = f'force_occupation_basis  {target_atoms[i - 1] + 1} 1 atomic 2 1 1 0.0 {n_states}\n'
+        site_edits = dict(edits)
+        for j in fob_lines:
+            site_edits[j] = fob
+
+        # Append parameters to end of file if not found
+        append = []
+        if no_ks is True:
+            append.append(ks_method)
+        if len(fob_lines) == 0:
+            append.append(fob)
+        if no_charge is True:
+            append.append(charge)
+        if no_cube is True:
+            append.append(cube)
 
         # Write the data to the file
-        with open(control, 'w+') as write_control:
-            write_control.writelines(content)
-
-            # Append parameters to end of file if not found
-            if no_ks is True:
-                write_control.write(ks_method)
-            if no_fob is True:
-                write_control.write(fob)
-            if no_charge is True:
-                write_control.write(charge)
-            if no_cube is True:
-                write_control.write(cube)
+        with open(f'../{target_atom}{i}/control.in', 'w+') as write_control:
+            write_control.write(control_ground.render(site_edits, append))
+
+        profiling.count('sites written')
 
     print('Files and directories written successfully')
 
 
+def generate(target_atom, num_atom, control_in=None, geometry_in=None):
+    """Write the FOB directories of all sites of target_atom."""
+    create_new_controls(target_atom, num_atom, control_in, geometry_in)
+
+
 if __name__ == '__main__':
     target_atom, num_atom = read_ground_inp()
-    create_new_controls(target_atom, num_atom)
+    generate(target_atom, num_atom)
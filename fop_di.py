@@ -3,9 +3,12 @@
 
 import os
 import shutil
-import subprocess
-import glob
-import numpy as np
+
+import profiling
+from control_in import ControlIn
+from geometry_in import Geometry
+from species_defaults import get_library
+from warm_start import check_ground_restart, ground_restart_lines, link_ground_restart, read_line
 
 
 def read_ground_inp():
@@ -55,19 +58,8 @@ def read_ground_inp():
 
     # Default to all atoms if specific atoms aren't specified
     if len(atom_specifier) == 0:
-        with open('geometry.in', 'r') as geom_in:
-            atom_counter = 0
-
-            for line in geom_in:
-                spl = line.split()
-
-                if len(spl) > 0 and 'atom' == spl[0] and target_atom in line:
-                    atom_counter += 1
-                    element = spl[-1]  # Identify atom
-                    identifier = spl[0]  # Extra check that line is an atom
-
-                    if identifier == 'atom' and element == target_atom:
-                        atom_specifier.append(atom_counter)
+        atom_counter = len(Geometry.read('geometry.in').element_indices(target_atom))
+        atom_specifier = list(range(1, atom_counter + 1))
 
         print('Specified atoms:', atom_specifier)
 
@@ -153,8 +145,35 @@ def get_electronic_structure(target_atom):
     return atom_index, valence
 
 
-def create_init_1_files(target_atom, num_atom, at_num, atom_valence):
-    """Write new init directories and control files to calculate FOP."""
+def get_valence_index(control, block):
+    """Find the valence orbital with the highest principle, then azimuthal qn."""
+    azimuthal_refs = {
+        's': 1,
+        'p': 2,
+        'd': 3,
+        'f': 4
+    }
+    orbitals = []
+
+    for j in block.valence:
+        spl = control.lines[j].split()
+        orbitals.append((int(spl[1]), azimuthal_refs[spl[2]], j))
+
+    return max(orbitals)[2]
+
+
+@profiling.timed()
+def create_init_1_files(target_atom, num_atom, at_num, atom_valence, basis_set=None,
+                        control_in=None, geometry_in=None, warm_start=False):
+    """
+    Write new init directories and control files to calculate FOP.
+
+    The basis set level is prompted for if not given. control_in holds
+    the lines of the ground state control.in and geometry_in its parsed
+    Geometry, which are read from the current directory if not given.
+    With warm_start, every site starts from the ground state restart in
+    the current directory, which is linked into its init_1 directory.
+    """
     iter_limit = '# sc_iter_limit           1\n'
     init_iter = '# sc_init_iter          75\n'
     ks_method = 'KS_method                 serial\n'
@@ -167,22 +186,69 @@ def create_init_1_files(target_atom, num_atom, at_num, atom_valence):
     output_hirsh = '# output                  hirshfeld\n'
 
     # Add extra target_atom basis set
-    while True:
-        basis_set_opts = ['light', 'intermediate', 'tight', 'really_tight']
-        basis_set = str(input('Enter the species default basis set level: '))
+    basis_set_opts = ['light', 'intermediate', 'tight', 'really_tight']
 
-        if basis_set not in basis_set_opts:
+    while basis_set not in basis_set_opts:
+        if basis_set is not None:
             print('Not a valid basis set option! The following basis set options are valid:')
             print(*basis_set_opts, sep='    ')
-        else:
-            break
 
-    shutil.copyfile('control.in', 'control.in.new')
-    basis_set = glob.glob(f'{os.environ["SPECIES_DEFAULTS"]}/defaults_2020/{basis_set}/*{target_atom}_default')
-    bash_add_basis = f'cat {basis_set[0]}'
+        basis_set = str(input('Enter the species default basis set level: '))
 
-    new_control = open('control.in.new', 'a')
-    subprocess.run(bash_add_basis.split(), check=True, stdout=new_control)
+    if control_in is None:
+        with open('control.in', 'r') as read_control:
+            control_in = read_control.readlines()
+    if geometry_in is None:
+        geometry_in = Geometry.read('geometry.in')
+    target_atoms = geometry_in.element_indices(target_atom)
+
+    species_lines = get_library().lines(basis_set, target_atom)
+
+    with open('control.in.new', 'w') as new_control:
+        new_control.writelines(control_in)
+        new_control.writelines(species_lines)
+
+    # Find the lines to change once, every site gets the same control.in
+    control_new = ControlIn(list(control_in) + species_lines)
+    edits = {}
+
+    # Fix basis sets
+    block = control_new.species_block(target_atom)
+    edits[block.start] = f'  species        {target_atom}1\n'
+
+    # Change keyword lines
+    for keyword, line in [('sc_iter_limit', iter_limit), ('sc_init_iter', init_iter),
+                          ('KS_method', ks_method), ('restart_write_only', restart_file),
+                          ('restart_save_iterations', restart_save),
+                          ('force_single_restartfile', restart_force), ('charge', charge)]:
+        for j in control_new.with_token(keyword):
+            edits[j] = line
+    for j in control_new.keyword('output', args=['mulliken']):
+        edits[j] = output_mull
+    for j in control_new.keyword('output', args=['hirshfeld']):
+        edits[j] = output_hirsh
+
+    # Append parameters to end of file if not found
+    append = [line for line in [iter_limit, ks_method, restart_file, charge, output_cube]
+              if not control_new.contains(line, edits)]
+
+    # Add 0.1 charge to the nucleus
+    n_index = block.nucleus
+    nucleus = control_new.lines[n_index]  # save for hole
+    edits[n_index] = control_new.set_value(n_index, f'{at_num}.1')
+
+    # Add the 0.1 electron to the valence orbital
+    valence_index = get_valence_index(control_new, block)
+    valence = control_new.lines[valence_index]  # save for write hole file
+    edits[valence_index] = atom_valence
+
+    # Start from the converged ground state instead of from scratch
+    if warm_start:
+        ground_restart = check_ground_restart('.', control_in, geometry_in, target_atom,
+                                              species_lines)
+        append.append(read_line(ground_restart))
+
+    control_content = control_new.render(edits, append)
 
     if type(num_atom) == list:
         loop_iterator = num_atom
@@ -194,187 +260,47 @@ def create_init_1_files(target_atom, num_atom, at_num, atom_valence):
             i += 1
 
         os.makedirs(f'../{target_atom}{i}/init_1')
-        shutil.copyfile('control.in.new', f'../{target_atom}{i}/init_1/control.in')
-        shutil.copyfile('geometry.in', f'../{target_atom}{i}/init_1/geometry.in')
-
-        found_target_atom = False
         control = f'../{target_atom}{i}/init_1/control.in'
         geometry = f'../{target_atom}{i}/init_1/geometry.in'
 
-        # Change geometry file
-        with open(geometry, 'r') as read_geom:
-            geom_content = read_geom.readlines()
-
-            # Change atom to {atom}{num}
-            atom_counter = 0
-            for j, line in enumerate(geom_content):
-                spl = line.split()
-
-                if 'atom' in line and target_atom in line:
-                    if atom_counter + 1 == i:
-                        partial_hole_atom = f' {target_atom}1\n'
-                        geom_content[j] = ' '.join(spl[0:-1]) + partial_hole_atom
-
-                    atom_counter += 1
-
+        # Change atom to {atom}{num}
         with open(geometry, 'w+') as write_geom:
-            write_geom.writelines(geom_content)
-
-        # Change control file
-        with open(control, 'r') as read_control:
-            control_content = read_control.readlines()
-
-            # Replace specific lines
-            for j, line in enumerate(control_content):
-                spl = line.split()
-
-                if len(spl) > 1:
-                    # Fix basis sets
-                    if 'species' == spl[0] and target_atom == spl[1]:
-                        if found_target_atom is False:
-                            control_content[j] = f'  species        {target_atom}1\n'
-                            found_target_atom = True
-
-                    # Change keyword lines
-                    if 'sc_iter_limit' in spl:
-                        control_content[j] = iter_limit
-                    if 'sc_init_iter' in spl:
-                        control_content[j] = init_iter
-                    if 'KS_method' in spl:
-                        control_content[j] = ks_method
-                    if 'restart_write_only' in spl:
-                        control_content[j] = restart_file
-                    if 'restart_save_iterations' in spl:
-                        control_content[j] = restart_save
-                    if 'force_single_restartfile' in spl:
-                        control_content[j] = restart_force
-                    if 'charge' in spl:
-                        control_content[j] = charge
-                    if '#' == spl[0] and 'charge' == spl[1]:
-                        control_content[j] = charge
-                    if 'cube spin_density' in spl:
-                        control_content[j] = output_cube
-                    if 'output' == spl[0] and 'mulliken' == spl[1]:
-                        control_content[j] = output_mull
-                    if 'output' == spl[0] and 'hirshfeld' == spl[1]:
-                        control_content[j] = output_hirsh
-
-            # Check if parameters not found
-            no_iter_limit = False
-            no_ks = False
-            no_restart = False
-            no_charge = False
-            no_cube = False
-
-            if iter_limit not in control_content:
-                no_iter_limit = True
-            if ks_method not in control_content:
-                no_ks = True
-            if restart_file not in control_content:
-                no_restart = True
-            if charge not in control_content:
-                no_charge = True
-            if output_cube not in control_content:
-                no_cube = True
-
-        # Write the data to the file
-        with open(control, 'w+') as write_control:
-            write_control.writelines(control_content)
-
-            # Append parameters to end of file if not found
-            if no_iter_limit is True:
-                write_control.write(iter_limit)
-            if no_ks is True:
-                write_control.write(ks_method)
-            if no_restart is True:
-                write_control.write(restart_file)
-            if no_charge is True:
-                write_control.write(charge)
-            if no_cube is True:
-                write_control.write(output_cube)
-
-        # Add 0.1 charge
-        with open(control, 'r') as read_control:
-            control_content = read_control.readlines()
-
-            # Replace specific lines
-            for j, line in enumerate(control_content):
-                spl = line.split()
-
-                if target_atom + '1' in spl:
-                    # Add to nucleus
-                    if f'    nucleus             {at_num}\n' in control_content[j:]:
-                        n_index = control_content[j:].index(f'    nucleus             {at_num}\n') + j
-                        nucleus = control_content[n_index]  # save for hole
-                        control_content[n_index] = f'    nucleus             {at_num}.1\n'
-                    elif f'    nucleus      {at_num}\n' in control_content[j:]:
-                        n_index = control_content[j:].index(f'    nucleus      {at_num}\n') + j
-                        nucleus = control_content[n_index]  # save for hole
-                        control_content[n_index] = f'    nucleus      {at_num}.1\n'
-
-                    # Add to valence orbital
-                    if '#     ion occupancy\n' in control_content[j:]:
-                        vbs_index = control_content[j:].index('#     valence basis states\n') + j
-                        io_index = control_content[j:].index('#     ion occupancy\n') + j
-
-                        # Check which orbital to add 0.1 to
-                        principle_qns = np.array([])
-                        azimuthal_orbs = np.array([])
-                        azimuthal_qns = np.zeros(io_index - vbs_index - 1)
-                        azimuthal_refs = {
-                            's': 1,
-                            'p': 2,
-                            'd': 3,
-                            'f': 4
-                        }
-
-                        # Get azimuthal and principle quantum numbers
-                        for count, valence_orbital in enumerate(control_content[vbs_index+1:io_index]):
-                            principle_qns = np.append(principle_qns, np.array(valence_orbital.split()[1])).astype(int)
-                            azimuthal_orbs = np.append(azimuthal_orbs, np.array(valence_orbital.split()[2]))
-                            azimuthal_qns[count] = azimuthal_refs[azimuthal_orbs[count]]
-                            azimuthal_qns = azimuthal_qns.astype(int)
-
-                        # Find the orbital with highest principle and azimuthal qn
-                        highest_n = np.amax(principle_qns)
-                        highest_n_index = np.where(principle_qns == highest_n)
-
-                        # Check for highest l if 2 orbitals have the same n
-                        if len(highest_n_index[0]) > 1:
-                            highest_l = np.amax(azimuthal_qns)
-                            highest_l_index = np.where(azimuthal_qns == highest_l)
-                            addition_state = np.intersect1d(highest_n_index, highest_l_index)[0]
-                        else:
-                            addition_state = highest_n_index[0][0]
-
-                        # Add the 0.1 electron
-                        valence = control_content[vbs_index + addition_state + 1]  # save for write hole file
-                        valence_index = vbs_index + addition_state + 1
-                        control_content[valence_index] = atom_valence
-                        break
+            write_geom.write(geometry_in.render(target_atoms[i - 1], f'{target_atom}1'))
 
         with open(control, 'w+') as write_control:
-            write_control.writelines(control_content)
+            write_control.write(control_content)
+
+        if warm_start:
+            link_ground_restart('.', f'../{target_atom}{i}/init_1', ground_restart)
+
+        profiling.count('sites written')
 
     print('init_1 files written successfully')
 
     return nucleus, valence, n_index, valence_index
 
 
-def create_init_2_files(target_atom, num_atom, at_num, atom_valence, n_index, valence_index):
-    """Write new init directories and control files to calculate FOP."""
-    ks_states = [0, 0]
-    print()
-    print('Enter KS start and KS stop states (press enter after each)')
+@profiling.timed()
+def create_init_2_files(target_atom, num_atom, at_num, atom_valence, n_index, valence_index,
+                        ks_states=None):
+    """
+    Write new init directories and control files to calculate FOP.
 
-    while True:
-        try:
-            ks_states[0] = int(input('KS start: '))
-            ks_states[1] = int(input('KS stop: '))
-            break
-        except ValueError:
-            print('\nInvalid input! Ensure input is entered as an integer.')
-            print('Enter KS start and KS stop states (press enter after each)')
+    The KS start and stop states are prompted for if not given.
+    """
+    if ks_states is None:
+        ks_states = [0, 0]
+        print()
+        print('Enter KS start and KS stop states (press enter after each)')
+
+        while True:
+            try:
+                ks_states[0] = int(input('KS start: '))
+                ks_states[1] = int(input('KS stop: '))
+                break
+            except ValueError:
+                print('\nInvalid input! Ensure input is entered as an integer.')
+                print('Enter KS start and KS stop states (press enter after each)')
 
     iter_limit = 'sc_iter_limit             1\n'
     restart_file = 'restart             restart_file\n'
@@ -382,6 +308,34 @@ def create_init_2_files(target_atom, num_atom, at_num, atom_valence, n_index, va
     charge = 'charge                    1.1\n'
     fop = f'force_occupation_projector {ks_states[0]} 1 0.0 {ks_states[0]} {ks_states[1]}\n'
 
+    # Find the lines to change once, every site gets the same control.in
+    control_new = ControlIn.read('control.in.new')
+    edits = {}
+
+    # Fix basis sets
+    block = control_new.species_block(target_atom)
+    edits[block.start] = f'  species        {target_atom}1\n'
+
+    # Change keyword lines
+    for keyword, line in [('sc_iter_limit', iter_limit), ('restart_write_only', restart_file),
+                          ('force_single_restartfile', restart_force)]:
+        for j in control_new.with_token(keyword):
+            edits[j] = line
+    for j in control_new.keyword('force_occupation_projector', commented=True):
+        edits[j] = fop
+    for j in control_new.with_token('charge'):
+        edits[j] = charge
+
+    # Append parameters to end of file if not found
+    append = [line for line in [iter_limit, restart_file, charge]
+              if not control_new.contains(line, edits)]
+
+    # Add 0.1 charge to the nucleus and the valence orbital
+    edits[n_index] = control_new.set_value(n_index, f'{at_num}.1')
+    edits[valence_index] = atom_valence
+
+    control_content = control_new.render(edits, append)
+
     if type(num_atom) == list:
         loop_iterator = num_atom
     else:
@@ -392,97 +346,19 @@ def create_init_2_files(target_atom, num_atom, at_num, atom_valence, n_index, va
             i += 1
 
         os.makedirs(f'../{target_atom}{i}/init_2')
-        shutil.copyfile('control.in.new', f'../{target_atom}{i}/init_2/control.in')
         shutil.copyfile(f'../{target_atom}{i}/init_1/geometry.in', f'../{target_atom}{i}/init_2/geometry.in')
 
-        found_target_atom = False
-        control = f'../{target_atom}{i}/init_2/control.in'
-
-        # Change control file
-        with open(control, 'r') as read_control:
-            control_content = read_control.readlines()
-
-            # Replace specific lines
-            for j, line in enumerate(control_content):
-                spl = line.split()
-
-                if len(spl) > 1:
-                    # Fix basis sets
-                    if 'species' == spl[0] and target_atom == spl[1]:
-                        if found_target_atom is False:
-                            control_content[j] = f'  species        {target_atom}1\n'
-                            found_target_atom = True
-
-                    # Change keyword lines
-                    if 'sc_iter_limit' in spl:
-                        control_content[j] = iter_limit
-                    if 'restart_write_only' in spl:
-                        control_content[j] = restart_file
-                    if 'force_single_restartfile' in spl:
-                        control_content[j] = restart_force
-                    if '#force_occupation_projector' == spl[0]:
-                        control_content[j] = fop
-                    if 'charge' in spl:
-                        control_content[j] = charge
-                    if '#' == spl[0] and 'charge' == spl[1]:
-                        control_content[j] = charge
-
-            # Check if parameters not found
-            no_iter_limit = False
-            no_restart = False
-            no_charge = False
-
-            if iter_limit not in control_content:
-                no_iter_limit = True
-            if restart_file not in control_content:
-                no_restart = True
-            if charge not in control_content:
-                no_charge = True
-
-        # Write the data to the file
-        with open(control, 'w+') as write_control:
-            write_control.writelines(control_content)
-
-            # Append parameters to end of file if not found
-            if no_iter_limit is True:
-                write_control.write(iter_limit)
-            if no_restart is True:
-                write_control.write(restart_file)
-            if no_charge is True:
-                write_control.write(charge)
-
-        # Add 0.1 charge
-        with open(control, 'r') as read_control:
-            control_content = read_control.readlines()
-
-            # Replace specific lines
-            for j, line in enumerate(control_content):
-                spl = line.split()
-
-                if target_atom + '1' in spl:
-                    # Add to nucleus
-                    if f'    nucleus             {at_num}\n' in control_content[j:]:
-                        nucleus = control_content[n_index]  # save for hole
-                        control_content[n_index] = f'    nucleus             {at_num}.1\n'
-                    elif f'    nucleus      {at_num}\n' in control_content[j:]:
-                        nucleus = control_content[n_index]  # save for hole
-                        control_content[n_index] = f'    nucleus      {at_num}.1\n'
-
-                    # Add to valence orbital
-                    if '#     ion occupancy\n' in control_content[j:]:
-
-                        # Add the 0.1 electron
-                        control_content[valence_index] = atom_valence
-                        break
+        with open(f'../{target_atom}{i}/init_2/control.in', 'w+') as write_control:
+            write_control.write(control_content)
 
-        with open(control, 'w+') as write_control:
-            write_control.writelines(control_content)
+        profiling.count('sites written')
 
     print('init_2 files written successfully')
 
     return ks_states
 
 
+@profiling.timed()
 def create_hole_files(ks_states, target_atom, num_atom, nucleus, valence, n_index, valence_index):
     """Write new hole directories and control files to calculate FOP."""
     # occ_type = 'occupation_type         gaussian 0.1\n'
@@ -501,134 +377,77 @@ def create_hole_files(ks_states, target_atom, num_atom, nucleus, valence, n_inde
     if type(num_atom) == list:
         loop_iterator = num_atom
     else:
-        loop_iterator = range(num_atom)
+        loop_iterator = [i + 1 for i in range(num_atom)]
+
+    # All sites share the init_1 control.in, so only change it once
+    control_init = ControlIn.read(f'../{target_atom}{loop_iterator[0]}/init_1/control.in')
+
+    # Set nuclear and valence orbitals back to integer values
+    edits = {n_index: nucleus, valence_index: valence}
+
+    # Change keyword lines
+    # for j in control_init.with_token('occupation_type'):
+    #     edits[j] = occ_type
+    # for j in control_init.with_token('sc_iter_limit'):
+    #     edits[j] = iter_limit
+    for j in control_init.keyword('sc_init_iter', commented=True):
+        edits[j] = init_iter
+    for j in control_init.with_token('KS_method'):
+        edits[j] = ks_method
+    # for j in control_init.with_token('mixer'):
+    #     edits[j] = mixer
+    for j in control_init.keyword('restart'):
+        edits[j] = restart
+    # Drop the warm start line, so the hole reads the init restart as without one
+    for j in ground_restart_lines(control_init):
+        edits[j] = ''
+    for j in control_init.keyword('force_occupation_projector', commented=True):
+        edits[j] = fop
+    for j in control_init.with_token('charge'):
+        edits[j] = charge
+    # for j in control_init.with_token('charge_mix_param'):
+    #     edits[j] = charge_mix
+    for j in control_init.keyword('output', commented=True, args=['cube', 'spin_density']):
+        edits[j] = output_cube
+    for j in control_init.keyword('output', commented=True, args=['hirshfeld']):
+        edits[j] = output_hirsh
+    for j in control_init.keyword('output', commented=True, args=['mulliken']):
+        edits[j] = output_mull
+
+    # Append parameters to end of file if not found
+    # TODO finish adding mixer stuff
+    append = [line for line in [init_iter, restart, fop, charge, output_cube, output_mull,
+                                output_hirsh]
+              if not control_init.contains(line, edits)]
+
+    control_content = control_init.render(edits, append)
 
     for i in loop_iterator:
-        if type(num_atom) != list:
-            i += 1
-
         os.makedirs(f'../{target_atom}{i}/hole')
         shutil.copyfile(f'../{target_atom}{i}/init_1/geometry.in',
                         f'../{target_atom}{i}/hole/geometry.in')
-        shutil.copyfile(f'../{target_atom}{i}/init_1/control.in',
-                        f'../{target_atom}{i}/hole/control.in')
-
-        control = f'../{target_atom}{i}/hole/control.in'
-
-        with open(control, 'r') as read_control:
-            control_content = read_control.readlines()
-
-            # Replace specific lines
-            for j, line in enumerate(control_content):
-                spl = line.split()
-
-                # Set nuclear and valence orbitals back to integer values
-                control_content[n_index] = nucleus
-                control_content[valence_index] = valence
-
-                if len(spl) > 1:
-
-                    # Change keyword lines
-                    # if 'occupation_type' in spl:
-                    #     control_content[j] = occ_type
-                    # if 'sc_iter_limit' in spl:
-                    #     control_content[j] = iter_limit
-                    if '#sc_init_iter' in spl:
-                        control_content[j] = init_iter
-                    if '#' == spl[0] and 'sc_init_iter' == spl[1]:
-                        control_content[j] = init_iter
-                    if 'KS_method' in spl:
-                        control_content[j] = ks_method
-                    # if 'mixer' in spl:
-                    #     control_content[j] = mixer
-                    if 'restart' == spl[0]:
-                        control_content[j] = restart
-                    if '#force_occupation_projector' == spl[0]:
-                        control_content[j] = fop
-                    if '#' == spl[0] and 'force_occupation_projector' == spl[1]:
-                        control_content[j] = fop
-                    if 'charge' in spl:
-                        control_content[j] = charge
-                    # if 'charge_mix_param' in spl:
-                    #     control_content[j] = charge_mix
-                    if ['#output', 'cube', 'spin_density'] == spl or ['#', 'output', 'cube', 'spin_density'] == spl:
-                        control_content[j] = output_cube
-                    if ['#output', 'hirshfeld'] == spl or ['#', 'output', 'hirshfeld'] == spl:
-                        control_content[j] = output_hirsh
-                    if ['#output', 'mulliken'] == spl or ['#', 'output', 'mulliken'] == spl:
-                        control_content[j] = output_mull
-
-            # Check if parameters not found
-            # no_occ_type = False
-            no_init_iter = False
-            # no_iter_limit = False
-            # no_mixer = False
-            no_restart = False
-            no_fop = False
-            no_charge = False
-            # no_charge_mix = False
-            no_output_cube = False
-            no_output_mull = False
-            no_output_hirsh = False
-
-            # TODO finish adding mixer stuff
-            # if occ_type not in control_content:
-            #     no_occ_type = True
-            # if iter_limit not in control_content:
-            #     no_iter_limit = True
-            if init_iter not in control_content:
-                no_init_iter = True
-            # if mixer not in control_content:
-            #     no_mixer = True
-            if restart not in control_content:
-                no_restart = True
-            if fop not in control_content:
-                no_fop = True
-            if charge not in control_content:
-                no_charge = True
-            # if charge_mix not in control_content:
-            #     no_charge_mix = True
-            if output_cube not in control_content:
-                no_output_cube = True
-            if output_mull not in control_content:
-                no_output_mull = True
-            if output_hirsh not in control_content:
-                no_output_hirsh = True
-
-        # Write the data to the file
-        with open(control, 'w+') as write_control:
-            write_control.writelines(control_content)
-
-            # Append parameters to end of file if not found
-            # if no_occ_type is True:
-            #     write_control.write(occ_type)
-            # if no_iter_limit is True:
-            #     write_control.write(iter_limit)
-            if no_init_iter is True:
-                write_control.write(init_iter)
-            # if no_mixer is True:
-            #     write_control.write(mixer)
-            if no_restart is True:
-                write_control.write(restart)
-            if no_fop is True:
-                write_control.write(fop)
-            if no_charge is True:
-                write_control.write(charge)
-            # if no_charge_mix is True:
-            #     write_control.write(charge_mix)
-            if no_output_cube is True:
-                write_control.write(output_cube)
-            if no_output_mull is True:
-                write_control.write(output_mull)
-            if no_output_hirsh is True:
-                write_control.write(output_hirsh)
+
+        with open(f'../{target_atom}{i}/hole/control.in', 'w+') as write_control:
+            write_control.write(control_content)
+
+        profiling.count('sites written')
 
     print('hole files written successfully')
 
 
-if __name__ == '__main__':
-    target_atom, num_atom = read_ground_inp()
+def generate(target_atom, num_atom, basis_set=None, ks_states=None, control_in=None,
+             geometry_in=None, warm_start=False):
+    """Write the init_1, init_2 and hole directories of all sites of target_atom."""
     at_num, valence_orbs = get_electronic_structure(target_atom)
-    nucleus, valence, n_index, valence_index = create_init_1_files(target_atom, num_atom, at_num, valence_orbs)
-    ks_states = create_init_2_files(target_atom, num_atom, at_num, valence_orbs, n_index, valence_index)
+    nucleus, valence, n_index, valence_index = create_init_1_files(target_atom, num_atom, at_num,
+                                                                   valence_orbs, basis_set,
+                                                                   control_in, geometry_in,
+                                                                   warm_start)
+    ks_states = create_init_2_files(target_atom, num_atom, at_num, valence_orbs, n_index,
+                                    valence_index, ks_states)
     create_hole_files(ks_states, target_atom, num_atom, nucleus, valence, n_index, valence_index)
+
+
+if __name__ == '__main__':
+    target_atom, num_atom = read_ground_inp()
+    generate(target_atom, num_atom)
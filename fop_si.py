@@ -4,8 +4,12 @@
 
 import os
 import shutil
-import subprocess
-import glob
+
+import profiling
+from control_in import ControlIn
+from geometry_in import Geometry
+from species_defaults import get_library
+from warm_start import check_ground_restart, ground_restart_lines, link_ground_restart, read_line
 
 
 def read_ground_inp():
@@ -27,15 +31,7 @@ def read_ground_inp():
 
     # Default to all atoms if specific atoms aren't specified
     if atom_specifier == []:
-        with open('geometry.in', 'r') as geom_in:
-            atom_counter = 0
-
-            for line in geom_in:
-                element = line.split()[-1]  # Identify atom
-                identifier = line.split()[0]  # Extra check that line is an atom
-
-                if identifier == 'atom' and element == target_atom:
-                    atom_counter += 1
+        atom_counter = len(Geometry.read('geometry.in').element_indices(target_atom))
 
         return target_atom, atom_counter
 
@@ -118,12 +114,24 @@ def get_electronic_structure(target_atom):
     return atom_index, valence
 
 
-def create_init_files(target_atom, num_atom, at_num, atom_valence):
-    """Write new init directories and control files to calculate FOP."""
+@profiling.timed()
+def create_init_files(target_atom, num_atom, at_num, atom_valence, basis_set=None,
+                      control_in=None, geometry_in=None, warm_start=False):
+    """
+    Write new init directories and control files to calculate FOP.
+
+    The basis set level is prompted for if not given. control_in holds
+    the lines of the ground state control.in and geometry_in its parsed
+    Geometry, which are read from the current directory if not given.
+    With warm_start, every site starts from the ground state restart in
+    the current directory, which is linked into its init directory.
+    """
     iter_limit = 'sc_iter_limit           1\n'
     init_iter = '# sc_init_iter          75\n'
     ks_method = 'KS_method               serial\n'
     restart_file = 'restart                 restart_file\n'
+    if warm_start:
+        restart_file = 'restart_write_only      restart_file\n'
     restart_save = '# restart_save_iterations 100\n'
     restart_force = '# force_single_restartfile .true.\n'
     charge = 'charge                  0.1\n'
@@ -131,14 +139,74 @@ def create_init_files(target_atom, num_atom, at_num, atom_valence):
     output_hirsh = '# output                 hirshfeld\n'
 
     # Add extra target_atom basis set
-    basis_set = str(input('Enter the species default basis set level: '))
-    shutil.copyfile('control.in', 'control.in.new')
-    # basis_set = glob.glob(f'{os.environ["SPECIES_DEFAULTS"]}/mod_basis_sets/*{target_atom}_mod')
-    basis_set = glob.glob(f'{os.environ["SPECIES_DEFAULTS"]}/defaults_2020/{basis_set}/*{target_atom}_default')
-    bash_add_basis = f'cat {basis_set[0]}'
-
-    new_control = open('control.in.new', 'a')
-    subprocess.run(bash_add_basis.split(), check=True, stdout=new_control)
+    if basis_set is None:
+        basis_set = str(input('Enter the species default basis set level: '))
+
+    if control_in is None:
+        with open('control.in', 'r') as read_control:
+            control_in = read_control.readlines()
+    if geometry_in is None:
+        geometry_in = Geometry.read('geometry.in')
+    target_atoms = geometry_in.element_indices(target_atom)
+
+    species_lines = get_library().lines(basis_set, target_atom)
+
+    with open('control.in.new', 'w') as new_control:
+        new_control.writelines(control_in)
+        new_control.writelines(species_lines)
+
+    # Find the lines to change once, every site gets the same control.in
+    control_new = ControlIn(list(control_in) + species_lines)
+    edits = {}
+
+    # Some error checking
+    if len(control_new.keyword('restart')) > 0:
+        print('restart keyword already found in control.in')
+        exit(1)
+
+    if len(control_new.keyword('charge')) > 0:
+        print('charge keyword already found in control.in')
+        exit(1)
+
+    # Fix basis sets
+    block = control_new.species_block(target_atom)
+    edits[block.start] = f'  species        {target_atom}1\n'
+
+    # Change keyword lines
+    for keyword, line in [('sc_iter_limit', iter_limit), ('sc_init_iter', init_iter),
+                          ('KS_method', ks_method), ('restart_write_only', restart_file),
+                          ('restart_save_iterations', restart_save),
+                          ('force_single_restartfile', restart_force)]:
+        for j in control_new.with_token(keyword):
+            edits[j] = line
+    for j in control_new.keyword('charge', commented=True):
+        edits[j] = charge
+    for j in control_new.keyword('output', args=['mulliken']):
+        edits[j] = output_mull
+    for j in control_new.keyword('output', args=['hirshfeld']):
+        edits[j] = output_hirsh
+
+    # Append parameters to end of file if not found
+    append = [line for line in [iter_limit, ks_method, restart_file, charge]
+              if not control_new.contains(line, edits)]
+
+    # Add 0.1 charge to the nucleus
+    n_index = block.nucleus
+    nucleus = control_new.lines[n_index]  # save for hole
+    edits[n_index] = control_new.set_value(n_index, f'{at_num}.1')
+
+    # Add to the last valence orbital
+    v_index = block.valence[-1] + 1
+    valence = control_new.lines[v_index - 1]  # save for hole
+    edits[v_index - 1] = atom_valence
+
+    # Start from the converged ground state instead of from scratch
+    if warm_start:
+        ground_restart = check_ground_restart('.', control_in, geometry_in, target_atom,
+                                              species_lines)
+        append.append(read_line(ground_restart))
+
+    control_content = control_new.render(edits, append)
 
     if type(num_atom) == list:
         loop_iterator = num_atom
@@ -150,154 +218,40 @@ def create_init_files(target_atom, num_atom, at_num, atom_valence):
             i += 1
 
         os.makedirs(f'../{target_atom}{i}/init')
-        shutil.copyfile('control.in.new', f'../{target_atom}{i}/init/control.in')
         # shutil.copyfile('control.in', f'../{target_atom}{i}/init/control.in')
-        shutil.copyfile('geometry.in', f'../{target_atom}{i}/init/geometry.in')
 
         # for j in glob.glob('./restart_file*'):
         #     shutil.copyfile(j, f'../{target_atom}{i}/init/{j}')
 
-        found_target_atom = False
         control = f'../{target_atom}{i}/init/control.in'
         geometry = f'../{target_atom}{i}/init/geometry.in'
 
-        # Change geometry file
-        with open(geometry, 'r') as read_geom:
-            geom_content = read_geom.readlines()
-
-            # Change atom to {atom}{num}
-            atom_counter = 0
-            for j, line in enumerate(geom_content):
-                spl = line.split()
-
-                if 'atom' in line and target_atom in line:
-                    if atom_counter + 1 == i:
-                        partial_hole_atom = f' {target_atom}1\n'
-                        geom_content[j] = ' '.join(spl[0:-1]) + partial_hole_atom
-
-                    atom_counter += 1
-
+        # Change atom to {atom}{num}
         with open(geometry, 'w+') as write_geom:
-            write_geom.writelines(geom_content)
-
-        # Change control file
-        with open(control, 'r') as read_control:
-            control_content = read_control.readlines()
-
-            # Replace specific lines
-            for j, line in enumerate(control_content):
-                spl = line.split()
-
-                if len(spl) > 1:
-                    # Some error checking
-                    if 'restart' == spl[0]:
-                        print('restart keyword already found in control.in')
-                        exit(1)
-
-                    if 'charge' == spl[0]:
-                        print('charge keyword already found in control.in')
-                        exit(1)
-
-                    # Fix basis sets
-                    if 'species' == spl[0] and target_atom == spl[1]:
-                        if found_target_atom is False:
-                            control_content[j] = f'  species        {target_atom}1\n'
-                            found_target_atom = True
-
-                    # Change keyword lines
-                    if 'sc_iter_limit' in spl:
-                        control_content[j] = iter_limit
-                    if 'sc_init_iter' in spl:
-                        control_content[j] = init_iter
-                    if 'KS_method' in spl:
-                        control_content[j] = ks_method
-                    if 'restart_write_only' in spl:
-                        control_content[j] = restart_file
-                    if 'restart_save_iterations' in spl:
-                        control_content[j] = restart_save
-                    if 'force_single_restartfile' in spl:
-                        control_content[j] = restart_force
-                    if '#charge' in spl:
-                        control_content[j] = charge
-                    if '#' == spl[0] and 'charge' == spl[1]:
-                        control_content[j] = charge
-                    if 'output' == spl[0] and 'mulliken' == spl[1]:
-                        control_content[j] = output_mull
-                    if 'output' == spl[0] and 'hirshfeld' == spl[1]:
-                        control_content[j] = output_hirsh
-
-            # Check if parameters not found
-            no_iter_limit = False
-            no_ks = False
-            no_restart = False
-            no_charge = False
-
-            if iter_limit not in control_content:
-                no_iter_limit = True
-            if ks_method not in control_content:
-                no_ks = True
-            if restart_file not in control_content:
-                no_restart = True
-            if charge not in control_content:
-                no_charge = True
-
-        # Write the data to the file
-        with open(control, 'w+') as write_control:
-            write_control.writelines(control_content)
-
-            # Append parameters to end of file if not found
-            if no_iter_limit is True:
-                write_control.write(iter_limit)
-            if no_ks is True:
-                write_control.write(ks_method)
-            if no_restart is True:
-                write_control.write(restart_file)
-            if no_charge is True:
-                write_control.write(charge)
-
-        # Add 0.1 charge
-        with open(control, 'r') as read_control:
-            control_content = read_control.readlines()
-
-            # Replace specific lines
-            for j, line in enumerate(control_content):
-                spl = line.split()
-
-                if target_atom + '1' in spl:
-                    # Add to nucleus
-                    # print(control_content[j:])
-                    # exit()
-                    if f'    nucleus             {at_num}\n' in control_content[j:]:
-                        n_index = control_content[j:].index(f'    nucleus             {at_num}\n') + j
-                        nucleus = control_content[n_index]  # save for hole
-                        control_content[n_index] = f'    nucleus             {at_num}.1\n'
-                    elif f'    nucleus      {at_num}\n' in control_content[j:]:
-                        n_index = control_content[j:].index(f'    nucleus      {at_num}\n') + j
-                        nucleus = control_content[n_index]  # save for hole
-                        control_content[n_index] = f'    nucleus      {at_num}.1\n'
-
-                    # Add to valence orbital
-                    if '#     ion occupancy\n' in control_content[j:]:
-                        v_index = control_content[j:].index('#     ion occupancy\n') + j
-                        valence = control_content[v_index - 1]  # save for hole
-                        control_content[v_index - 1] = atom_valence
-                        break
+            write_geom.write(geometry_in.render(target_atoms[i - 1], f'{target_atom}1'))
 
         with open(control, 'w+') as write_control:
-            write_control.writelines(control_content)
+            write_control.write(control_content)
+
+        if warm_start:
+            link_ground_restart('.', f'../{target_atom}{i}/init', ground_restart)
+
+        profiling.count('sites written')
 
     print('init files written successfully')
 
     return nucleus, valence, n_index, v_index
 
 
-def create_hole_files(target_atom, num_atom, nucleus, valence, n_index, v_index):
+@profiling.timed()
+def create_hole_files(target_atom, num_atom, nucleus, valence, n_index, v_index,
+                      ks_states=(109, 270)):
     """Write new hole directories and control files to calculate FOP."""
     iter_limit = 'sc_iter_limit           1000\n'
     init_iter = 'sc_init_iter            75\n'
     ks_method = 'KS_method               serial\n'
     restart = 'restart_read_only       restart_file\n'
-    fop = 'force_occupation_projector 109 1 0.0 109 270\n'  # TODO
+    fop = f'force_occupation_projector {ks_states[0]} 1 0.0 {ks_states[0]} {ks_states[1]}\n'  # TODO
     charge = 'charge                  1.0\n'
     output_cube = 'output                  cube spin_density\n'
     output_mull = 'output                  mulliken\n'
@@ -306,120 +260,82 @@ def create_hole_files(target_atom, num_atom, nucleus, valence, n_index, v_index)
     if type(num_atom) == list:
         loop_iterator = num_atom
     else:
-        loop_iterator = range(num_atom)
+        loop_iterator = [i + 1 for i in range(num_atom)]
+
+    # All sites share the init control.in, so only change it once
+    control_init = ControlIn.read(f'../{target_atom}{loop_iterator[0]}/init/control.in')
+
+    # A warm started init reads the ground state restart and writes its own
+    ground_reads = ground_restart_lines(control_init)
+
+    # Some error checking
+    for keyword, args in [('sc_init_iter', []), ('force_occupation_projector', []),
+                          ('output', ['cube', 'spin_density']), ('output', ['mulliken']),
+                          ('output', ['hirshfeld'])]:
+        if len(control_init.keyword(keyword, args=args)) > 0:
+            print(f'{" ".join([keyword] + args)} already found in init/control.in')
+            exit(1)
+    if len(control_init.keyword('restart_read_only')) > len(ground_reads):
+        print('restart_read_only already found in init/control.in')
+        exit(1)
+
+    # Set nuclear and valence orbitals back to integer values
+    edits = {n_index: nucleus, v_index - 1: valence}
+
+    # Change keyword lines
+    for j in control_init.with_token('sc_iter_limit'):
+        edits[j] = iter_limit
+    for j in control_init.keyword('sc_init_iter', commented=True):
+        edits[j] = init_iter
+    for j in control_init.with_token('KS_method'):
+        edits[j] = ks_method
+    for j in control_init.keyword('restart'):
+        edits[j] = restart
+    for j in control_init.keyword('restart_write_only'):
+        edits[j] = restart
+    for j in ground_reads:
+        edits[j] = ''
+    for j in control_init.keyword('force_occupation_projector', commented=True):
+        edits[j] = fop
+    for j in control_init.with_token('charge'):
+        edits[j] = charge
+    for j in control_init.keyword('output', commented=True, args=['cube', 'spin_density']):
+        edits[j] = output_cube
+    for j in control_init.keyword('output', commented=True, args=['hirshfeld']):
+        edits[j] = output_hirsh
+    for j in control_init.keyword('output', commented=True, args=['mulliken']):
+        edits[j] = output_mull
+
+    # Append parameters to end of file if not found
+    append = [line for line in [init_iter, restart, fop, output_cube, output_mull, output_hirsh]
+              if not control_init.contains(line, edits)]
+
+    control_content = control_init.render(edits, append)
 
     for i in loop_iterator:
-        if type(num_atom) != list:
-            i += 1
-
         os.makedirs(f'../{target_atom}{i}/hole')
         shutil.copyfile(f'../{target_atom}{i}/init/geometry.in',
                         f'../{target_atom}{i}/hole/geometry.in')
-        shutil.copyfile(f'../{target_atom}{i}/init/control.in',
-                        f'../{target_atom}{i}/hole/control.in')
-
-        control = f'../{target_atom}{i}/hole/control.in'
-
-        with open(control, 'r') as read_control:
-            control_content = read_control.readlines()
-
-            # Replace specific lines
-            for j, line in enumerate(control_content):
-                spl = line.split()
-
-                # Set nuclear and valence orbitals back to integer values
-                control_content[n_index] = nucleus
-                control_content[v_index - 1] = valence
-
-                if len(spl) > 1:
-                    # Some error checking
-                    if 'sc_init_iter' == spl[0]:
-                        print('sc_init_iter keyword already found in init/control.in')
-                        exit(1)
-                    if 'restart_read_only' == spl[0]:
-                        print('restart_read_only keyword already found in init/control.in')
-                        exit(1)
-                    if 'force_occupation_projector' == spl[0]:
-                        print('force_occupation_projector keyword already found in init/control.in')
-                        exit(1)
-                    if 'output' == spl[0] and 'cube' == spl[1] and 'spin_density' == spl[2]:
-                        print('output cube spin_density already found in init/control.in')
-                        exit(1)
-                    if 'output' == spl[0] and 'mulliken' == spl[1]:
-                        print('output mulliken already found in init/control.in')
-                        exit(1)
-                    if 'output' == spl[0] and 'hirshfeld' == spl[1]:
-                        print('output hirshfeld already found in init/control.in')
-                        exit(1)
-
-                    # Change keyword lines
-                    if 'sc_iter_limit' in spl:
-                        control_content[j] = iter_limit
-                    if '#sc_init_iter' in spl:
-                        control_content[j] = init_iter
-                    if '#' == spl[0] and 'sc_init_iter' == spl[1]:
-                        control_content[j] = init_iter
-                    if 'KS_method' in spl:
-                        control_content[j] = ks_method
-                    if 'restart' == spl[0]:
-                        control_content[j] = restart
-                    if '#force_occupation_projector' == spl[0]:
-                        control_content[j] = fop
-                    if '#' == spl[0] and 'force_occupation_projector' == spl[1]:
-                        control_content[j] = fop
-                    if 'charge' in spl:
-                        control_content[j] = charge
-                    if ['#output', 'cube', 'spin_density'] == spl or ['#', 'output', 'cube', 'spin_density'] == spl:
-                        control_content[j] = output_cube
-                    if ['#output', 'hirshfeld'] == spl or ['#', 'output', 'hirshfeld'] == spl:
-                        control_content[j] = output_hirsh
-                    if ['#output', 'mulliken'] == spl or ['#', 'output', 'mulliken'] == spl:
-                        control_content[j] = output_mull
-
-            # Check if parameters not found
-            no_init_iter = False
-            no_restart = False
-            no_fop = False
-            no_output_cube = False
-            no_output_mull = False
-            no_output_hirsh = False
-
-            if init_iter not in control_content:
-                no_init_iter = True
-            if restart not in control_content:
-                no_restart = True
-            if fop not in control_content:
-                no_fop = True
-            if output_cube not in control_content:
-                no_output_cube = True
-            if output_mull not in control_content:
-                no_output_mull = True
-            if output_hirsh not in control_content:
-                no_output_hirsh = True
-
-        # Write the data to the file
-        with open(control, 'w+') as write_control:
-            write_control.writelines(control_content)
-
-            # Append parameters to end of file if not found
-            if no_init_iter is True:
-                write_control.write(init_iter)
-            if no_restart is True:
-                write_control.write(restart)
-            if no_fop is True:
-                write_control.write(fop)
-            if no_output_cube is True:
-                write_control.write(output_cube)
-            if no_output_mull is True:
-                write_control.write(output_mull)
-            if no_output_hirsh is True:
-                write_control.write(output_hirsh)
+
+        with open(f'../{target_atom}{i}/hole/control.in', 'w+') as write_control:
+            write_control.write(control_content)
+
+        profiling.count('sites written')
 
     print('hole files written successfully')
 
 
+def generate(target_atom, num_atom, basis_set=None, ks_states=(109, 270), control_in=None,
+             geometry_in=None, warm_start=False):
+    """Write the init and hole directories of all sites of target_atom."""
+    at_num, valence_orbs = get_electronic_structure(target_atom)
+    nucleus, valence, n_index, v_index = create_init_files(target_atom, num_atom, at_num,
+                                                           valence_orbs, basis_set,
+                                                           control_in, geometry_in,
+                                                           warm_start)
+    create_hole_files(target_atom, num_atom, nucleus, valence, n_index, v_index, ks_states)
+
+
 if __name__ == '__main__':
     target_atom, num_atom = read_ground_inp()
-    at_num, valence_orbs = get_electronic_structure(target_atom)
-    nucleus, valence, n_index, v_index = create_init_files(target_atom, num_atom, at_num, valence_orbs)
-    create_hole_files(target_atom, num_atom, nucleus, valence, n_index, v_index)
+    generate(target_atom, num_atom)
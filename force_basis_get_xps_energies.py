@@ -1,15 +1,13 @@
 #!/usr/bin/env python3
 
-import os
+import argparse
+
+import profiling
+from harvest import INDEX_FILE, harvest_energies, peak_weights, read_final_energy
 
 def read_ground():
     """Get the ground state energy."""
-    with open('ground/aims.out', 'r') as ground:
-        for line in ground:
-
-            # Get the energy
-            if 's.c.f. calculation      :' in line:
-                grenrgys = float(get_energy_level(line))
+    grenrgys = float(read_final_energy('ground/aims.out'))
 
     print('Ground state calculated energy (eV):')
     print(grenrgys)
@@ -36,42 +34,54 @@ def contains_number(string):
     return False
 
 
-def read_atoms(get_energy_level, contains_number):
+def read_atoms(get_energy_level, contains_number, workers=8, processes=False,
+               cache=True):
     """Get the excited state energies."""
-    dir_list = os.listdir('./')
     element = str(input('Enter atom: '))
-    energy = 's.c.f. calculation      :'
-    excienrgys = []
 
-    # Read each core hole dir
-    for directory in dir_list:
-        if element in directory and contains_number(directory) is True:
+    # Read each core hole dir, ordered by site index
+    sites = harvest_energies(element, 'fob', workers=workers,
+                             processes=processes, cache=cache)
+    excienrgys = [energy for _, energy in sites if energy is not None]
 
-            with open(directory + '/aims.out', 'r') as out:
-                for line in out:
-
-                    # Get the energy
-                    if energy in line:
-                        excienrgys.append(get_energy_level(line))
+    # Multiplicities of sites standing for several equivalent atoms
+    weights = peak_weights(element, sites)
 
     print('Core hole calculated energies (eV):', *excienrgys, sep='\n')
 
-    return element, excienrgys
+    return element, excienrgys, weights
 
 
-def calc_delta_scf(element, grenrgys, excienrgys):
-    """Calculate delta scf and write to a file."""
+def calc_delta_scf(element, grenrgys, excienrgys, weights=None):
+    """Calculate delta scf and write to a file, with the weight of each peak if given."""
     xps = []
 
     for i in excienrgys:
         xps.append(i - grenrgys)
 
     with open(element + '_xps_peaks.txt', 'w') as file:
-        for i in xps:
-            file.write(f'{i}\n')
+        if weights is None:
+            for i in xps:
+                file.write(f'{i}\n')
+        else:
+            for i, weight in zip(xps, weights):
+                file.write(f'{i} {weight}\n')
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calculate XPS binding energies.')
+    parser.add_argument('-w', '--workers', type=int, default=8,
+                        help='number of outputs to read concurrently')
+    parser.add_argument('--processes', action='store_true',
+                        help='read outputs with processes instead of threads')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'reread all outputs instead of using {INDEX_FILE}')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
     grenrgys = read_ground()
-    element, excienrgys = read_atoms(get_energy_level, contains_number)
-    calc_delta_scf(element, grenrgys, excienrgys)
+    element, excienrgys, weights = read_atoms(get_energy_level, contains_number,
+                                              args.workers, args.processes,
+                                              not args.no_cache)
+    calc_delta_scf(element, grenrgys, excienrgys, weights)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Create FOP and FOB calculations for many elements and structures at once."""
+
+import argparse
+import contextlib
+import json
+import os
+
+import fob
+import fop_di
+import fop_si
+import profiling
+from array_jobs import SCHEDULERS, write_array_jobs
+from environment import CUTOFF, cluster_sites
+from geometry_in import Geometry
+from harvest import write_site_weights
+from symmetry import equivalent_sites
+
+
+METHODS = {
+    'fop_di': fop_di,
+    'fop_si': fop_si,
+    'fob': fob
+}
+BASIS_SETS = ['light', 'intermediate', 'tight', 'really_tight']
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    """Run the generators in the ground state directory of a structure."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+class GroundInputs:
+    """Parsed geometry.in and lines of control.in, read once per ground directory."""
+
+    def __init__(self):
+        self.inputs = {}
+
+    def get(self, ground):
+        """Get the (geometry, control lines) of a ground directory."""
+        key = os.path.realpath(ground)
+
+        if key not in self.inputs:
+            geometry_in = Geometry.read(os.path.join(ground, 'geometry.in'))
+            with open(os.path.join(ground, 'control.in'), 'r') as control:
+                control_in = control.readlines()
+
+            self.inputs[key] = (geometry_in, control_in)
+
+        return self.inputs[key]
+
+
+@profiling.timed()
+def generate_system(method, ground, target_atom, atoms=None, basis_set=None,
+                    ks_states=None, inputs=None, array=None, symmetry=None, cluster=None,
+                    cutoff=CUTOFF, warm_start=False):
+    """
+    Write the core hole directories of one element of one structure.
+
+    atoms is a list of site numbers, or None for every atom of the
+    element. The directories are written next to the ground directory.
+    array holds the options of write_array_jobs to also write array
+    scripts for the sites, or is None. With a symmetry tolerance and no
+    atoms, only one site of each class of equivalent sites is written,
+    and the multiplicities are saved for harvesting. A cluster tolerance
+    does the same for the clusters of sites whose environments within
+    cutoff are nearly identical, and takes precedence over symmetry.
+    With warm_start, the FOP init stages start from the restart of the
+    ground state calculation instead of from scratch.
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown method {method}, choose from {", ".join(METHODS)}')
+    if method != 'fob' and basis_set not in BASIS_SETS:
+        raise ValueError(f'Basis set must be one of {", ".join(BASIS_SETS)}')
+    if method == 'fop_di' and ks_states is None:
+        raise ValueError('fop_di needs the KS start and stop states')
+
+    if inputs is None:
+        inputs = GroundInputs()
+    geometry_in, control_in = inputs.get(ground)
+
+    root = os.path.normpath(os.path.join(ground, '..'))
+
+    if not atoms and (symmetry is not None or cluster is not None):
+        if cluster is not None:
+            classes = cluster_sites(geometry_in, target_atom, cluster, cutoff)
+        else:
+            classes = equivalent_sites(geometry_in, target_atom, symmetry)
+        atoms = [sites[0] for sites in classes]
+        write_site_weights(target_atom, classes, root)
+        print(f'{target_atom}: {len(atoms)} representatives of '
+              f'{sum(len(sites) for sites in classes)} sites')
+
+    if atoms:
+        num_atom = list(atoms)
+    else:
+        num_atom = len(geometry_in.element_indices(target_atom))
+
+    print(f'{method}: {target_atom} in {ground}')
+
+    with working_directory(ground):
+        if method == 'fob':
+            fob.generate(target_atom, num_atom, control_in, geometry_in)
+        elif method == 'fop_si' and ks_states is None:
+            fop_si.generate(target_atom, num_atom, basis_set, control_in=control_in,
+                            geometry_in=geometry_in, warm_start=warm_start)
+        else:
+            METHODS[method].generate(target_atom, num_atom, basis_set, ks_states,
+                                     control_in, geometry_in, warm_start)
+
+    if array is not None:
+        site_numbers = num_atom if atoms else range(1, num_atom + 1)
+        sites = [f'{target_atom}{i}' for i in site_numbers]
+        scripts = write_array_jobs(method, target_atom, sites, root, **array)
+        print(f'Array scripts: {", ".join(scripts)}')
+
+
+def read_spec(path):
+    """Read a JSON or YAML batch specification."""
+    with open(path, 'r') as spec_file:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError('PyYAML is needed to read YAML batch specifications')
+            spec = yaml.safe_load(spec_file)
+        else:
+            spec = json.load(spec_file)
+
+    if isinstance(spec, dict):
+        spec = spec['jobs']
+
+    return spec
+
+
+def run_spec(jobs):
+    """
+    Generate every system in a batch specification.
+
+    Each job has a method, one or more ground directories ('ground'), one
+    or more elements ('elements') and optionally 'atoms', 'basis',
+    'ks_states', 'array', 'symmetry', 'cluster', 'cutoff' and
+    'warm_start'. ks_states is either [start, stop] or a mapping from
+    element to [start, stop]. array holds the options of
+    write_array_jobs, e.g. {"scheduler": "slurm", "per_task": 16}.
+    symmetry is the tolerance in Angstrom to only write inequivalent
+    sites, and cluster the descriptor tolerance to only write one site
+    of each cluster of similar environments. Both are ignored for jobs
+    with atoms. warm_start links the ground state restart into every FOP
+    init stage.
+    """
+    inputs = GroundInputs()
+
+    for job in jobs:
+        grounds = job['ground']
+        elements = job['elements']
+        if isinstance(grounds, str):
+            grounds = [grounds]
+        if isinstance(elements, str):
+            elements = [elements]
+
+        for ground in grounds:
+            for element in elements:
+                ks_states = job.get('ks_states')
+                if isinstance(ks_states, dict):
+                    ks_states = ks_states.get(element)
+
+                generate_system(job['method'], ground, element, job.get('atoms'),
+                                job.get('basis'), ks_states, inputs, job.get('array'),
+                                job.get('symmetry'), job.get('cluster'),
+                                job.get('cutoff', CUTOFF), job.get('warm_start', False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create FOP and FOB calculations.')
+    parser.add_argument('-s', '--spec', help='JSON or YAML batch specification')
+    parser.add_argument('-m', '--method', choices=METHODS, help='type of calculation')
+    parser.add_argument('-e', '--elements', nargs='+', help='target elements')
+    parser.add_argument('-g', '--ground', nargs='+', default=['./'],
+                        help='ground state directories (default: current directory)')
+    parser.add_argument('-a', '--atoms', nargs='+', type=int,
+                        help='atoms to create a core hole for (default: all)')
+    parser.add_argument('-b', '--basis', choices=BASIS_SETS,
+                        help='species default basis set level')
+    parser.add_argument('-k', '--ks', nargs=2, type=int, metavar=('START', 'STOP'),
+                        help='KS start and stop states of the projector')
+    parser.add_argument('--array', choices=SCHEDULERS,
+                        help='also write array scripts for this scheduler')
+    parser.add_argument('--per-task', type=int, default=8,
+                        help='number of sites in each array task (default: 8)')
+    parser.add_argument('--parallel', type=int, default=1,
+                        help='number of steps to run at once in each array task (default: 1)')
+    parser.add_argument('--step', help='command of each step of an array task')
+    parser.add_argument('--directive', action='append', default=[],
+                        help='extra scheduler directive of the array scripts')
+    parser.add_argument('--symmetry', nargs='?', type=float, const=1e-3, metavar='TOL',
+                        help='only create one atom of each class of symmetry-equivalent atoms, '
+                        'within TOL Angstrom (default: 1e-3), unless --atoms is given')
+    parser.add_argument('--cluster', nargs='?', type=float, const=0.05, metavar='TOL',
+                        help='only create one atom of each cluster of atoms with environments '
+                        'within TOL of each other (default: 0.05), unless --atoms is given')
+    parser.add_argument('--cutoff', type=float, default=CUTOFF,
+                        help=f'radius of the environments of --cluster (default: {CUTOFF})')
+    parser.add_argument('--warm-start', action='store_true',
+                        help='start the FOP init stages from the ground state restart, which '
+                        'is linked into them')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
+    if args.spec is not None:
+        jobs = read_spec(args.spec)
+    elif args.method is None or args.elements is None:
+        parser.error('either --spec or --method and --elements are required')
+    else:
+        jobs = [{
+            'method': args.method,
+            'ground': args.ground,
+            'elements': args.elements,
+            'atoms': args.atoms,
+            'basis': args.basis,
+            'ks_states': args.ks,
+            'array': None if args.array is None else {
+                'scheduler': args.array,
+                'per_task': args.per_task,
+                'parallel': args.parallel,
+                'step': args.step,
+                'directives': args.directive
+            },
+            'symmetry': args.symmetry,
+            'cluster': args.cluster,
+            'cutoff': args.cutoff,
+            'warm_start': args.warm_start
+        }]
+
+    run_spec(jobs)
+
+
+if __name__ == '__main__':
+    main()
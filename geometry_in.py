@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Parse an FHI-aims geometry.in once into arrays."""
+
+import numpy as np
+
+
+class Geometry:
+    """
+    Atoms and lattice of a geometry.in.
+
+    coords holds the positions as written in the file, with frac marking
+    the atom_frac lines. species holds an index into species_names for
+    every atom, and line_numbers the line each atom was read from.
+    """
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        coords = []
+        species = []
+        frac = []
+        line_numbers = []
+        lattice = []
+        self.species_names = []
+        name_index = {}
+
+        for i, line in enumerate(self.lines):
+            spl = line.split()
+
+            if len(spl) < 4:
+                continue
+
+            if spl[0] in ('atom', 'atom_frac') and len(spl) >= 5:
+                if spl[4] not in name_index:
+                    name_index[spl[4]] = len(self.species_names)
+                    self.species_names.append(spl[4])
+
+                coords.append([float(x) for x in spl[1:4]])
+                species.append(name_index[spl[4]])
+                frac.append(spl[0] == 'atom_frac')
+                line_numbers.append(i)
+            elif spl[0] == 'lattice_vector':
+                lattice.append([float(x) for x in spl[1:4]])
+
+        self.coords = np.array(coords, dtype=float).reshape(-1, 3)
+        self.species = np.array(species, dtype=int)
+        self.frac = np.array(frac, dtype=bool)
+        self.line_numbers = np.array(line_numbers, dtype=int)
+        self.lattice = np.array(lattice, dtype=float) if len(lattice) == 3 else None
+
+        # Atom indices of every species, in file order
+        self.element_atoms = {name: np.flatnonzero(self.species == n)
+                              for n, name in enumerate(self.species_names)}
+
+    @classmethod
+    def read(cls, path):
+        """Parse a geometry.in file."""
+        with open(path, 'r') as geom_in:
+            return cls(geom_in.readlines())
+
+    @property
+    def periodic(self):
+        """Check if the geometry has lattice vectors."""
+        return self.lattice is not None
+
+    def element_indices(self, element):
+        """Get the indices of the atoms of an element, in file order."""
+        return self.element_atoms.get(element, np.array([], dtype=int))
+
+    def cartesian(self):
+        """Get the cartesian positions of all atoms."""
+        positions = self.coords.copy()
+
+        if np.any(self.frac):
+            positions[self.frac] = self.coords[self.frac] @ self.lattice
+
+        return positions
+
+    def render(self, atom, label):
+        """Get the text of the geometry.in with the species of one atom changed."""
+        line_number = self.line_numbers[atom]
+        spl = self.lines[line_number].split()
+        spl[4] = label
+
+        return (''.join(self.lines[:line_number]) + ' '.join(spl) + '\n'
+                + ''.join(self.lines[line_number + 1:]))
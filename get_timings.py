@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Get the SCF step and total times of FHI-aims calculations."""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import profiling
+from harvest import get_energy_level, read_tail_energy
+from warm_start import reads_ground_restart
+
+
+TOTAL_LINE = '| Total time   '
+SCF_LINE = '| Time for this iteration'
+
+STAGES = ['ground', 'init_1', 'init_2', 'init', 'hole']
+
+# Number of final SCF steps averaged when there are enough of them
+STABLE_STEPS = 10
+
+
+def read_total_time(path, max_tail=65536):
+    """Get the total time in the tail of an aims.out, or None if it has not finished."""
+    with open(path, 'rb') as out:
+        return read_tail_energy(out, os.path.getsize(path), max_tail=max_tail,
+                                line=TOTAL_LINE)
+
+
+def read_scf_times(path):
+    """Get the time of every SCF iteration in an aims.out."""
+    marker = SCF_LINE.encode()
+    times = []
+    n_lines = 0
+
+    with open(path, 'rb') as out:
+        for n_lines, line in enumerate(out, 1):
+            if marker in line:
+                times.append(get_energy_level(line.decode(errors='replace')))
+
+        profiling.count('lines parsed', n_lines)
+        profiling.count('bytes read', out.tell())
+
+    return np.array([t for t in times if t is not None], dtype=float)
+
+
+def stable_scf_times(times):
+    """
+    Get the SCF iteration times once the timings have stabilised.
+
+    With at least STABLE_STEPS iterations these are the last
+    STABLE_STEPS. Otherwise the iterations before the first step which
+    is less than a second faster than the step before it are dropped.
+    """
+    if len(times) >= STABLE_STEPS:
+        return times[-STABLE_STEPS:]
+
+    stable = np.flatnonzero(times[:-1] - times[1:] < 1)
+    if len(stable) == 0:
+        return times
+
+    return times[stable[0] + 1:]
+
+
+def stage_order(stage):
+    """Sort key putting the stages in the order they run."""
+    return (STAGES.index(stage) if stage in STAGES else len(STAGES), stage)
+
+
+def find_outputs(directories):
+    """
+    Get the (site, stage, path) of the aims.out files in each directory.
+
+    An aims.out in a directory is a ground state calculation, and those
+    in its subdirectories are the stages of an excited state calculation.
+    """
+    outputs = []
+
+    for directory in directories:
+        site = os.path.basename(os.path.normpath(directory))
+        path = os.path.join(directory, 'aims.out')
+        if os.path.isfile(path):
+            outputs.append((site, 'ground', path))
+
+        for entry in sorted(os.scandir(directory), key=lambda entry: stage_order(entry.name)):
+            path = os.path.join(entry.path, 'aims.out')
+            if entry.is_dir() and os.path.isfile(path):
+                outputs.append((site, entry.name, path))
+
+    return outputs
+
+
+@profiling.timed()
+def read_timing(mode, site, stage, path):
+    """Get the timing record of one aims.out."""
+    profiling.count('files read')
+    record = {'site': site, 'stage': stage, 'path': path,
+              'warm_start': reads_ground_restart(os.path.dirname(path))}
+
+    if mode == 'total':
+        record['time'] = read_total_time(path)
+    else:
+        times = read_scf_times(path)
+        stable = stable_scf_times(times)
+        record['scf_iterations'] = len(times)
+        record['scf_averaged'] = len(stable)
+        record['time'] = float(stable.mean()) if len(stable) > 0 else None
+
+    return record
+
+
+def read_timings(mode, directories, workers=8):
+    """Read the timings of all aims.out files in the directories concurrently."""
+    outputs = find_outputs(directories)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        return list(executor.map(lambda output: read_timing(mode, *output), outputs))
+
+
+def stage_statistics(records, percentiles=(50, 90, 95)):
+    """
+    Get the count, mean, min, max and percentiles of the times of each
+    stage, with the mean number of SCF iterations and the number of
+    outputs started from the ground state restart.
+    """
+    stats = []
+    stages = sorted({record['stage'] for record in records}, key=stage_order)
+
+    for stage in stages:
+        stage_records = [record for record in records if record['stage'] == stage]
+        times = np.array([record['time'] for record in stage_records if record['time'] is not None])
+        stat = {'stage': stage, 'count': len(times),
+                'warm_start': sum(record['warm_start'] for record in stage_records)}
+
+        iterations = [record['scf_iterations'] for record in stage_records
+                      if 'scf_iterations' in record]
+        if iterations:
+            stat['scf_iterations'] = float(np.mean(iterations))
+
+        if len(times) > 0:
+            stat.update(mean=float(times.mean()), min=float(times.min()),
+                        max=float(times.max()))
+            for p, value in zip(percentiles, np.percentile(times, percentiles)):
+                stat[f'p{p:g}'] = float(value)
+
+        stats.append(stat)
+
+    return stats
+
+
+def write_csv(rows, out):
+    """Write a list of dicts as CSV."""
+    fields = []
+    for row in rows:
+        fields.extend(key for key in row if key not in fields)
+
+    writer = csv.DictWriter(out, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def print_timings(mode, records, stats):
+    """Print the timings in the format of get_timings.sh."""
+    for record in records:
+        if record['time'] is None:
+            print(f'{record["site"]} {record["stage"]}: not finished')
+        elif mode == 'total':
+            print(f'{record["site"]} {record["stage"]}: {record["time"]:.0f} seconds')
+            print(f'{record["site"]} {record["stage"]}: {record["time"] / 60:.2f} minutes')
+        else:
+            print(f'{record["site"]} {record["stage"]}')
+            print(f'Number of SCF iterations averaged: {record["scf_averaged"]}')
+            print(f'Average time per SCF step: {record["time"]:.2f} sec')
+        print()
+
+    unit = 'seconds' if mode == 'total' else 'sec per SCF step'
+    ground = next((stat for stat in stats if stat['stage'] == 'ground'), {})
+    for stat in stats:
+        if stat['count'] == 0:
+            continue
+
+        percentiles = ', '.join(f'{key} {value:.2f}' for key, value in stat.items()
+                                if key.startswith('p'))
+        print(f'{stat["stage"]} ({stat["count"]}): mean {stat["mean"]:.2f} {unit}, '
+              f'min {stat["min"]:.2f}, max {stat["max"]:.2f}, {percentiles}')
+
+        # Compare the stages started from the ground state restart with the ground state
+        if stat['warm_start'] and 'scf_iterations' in stat and 'scf_iterations' in ground:
+            saved = ground['scf_iterations'] - stat['scf_iterations']
+            print(f'  {stat["warm_start"]} warm started, {stat["scf_iterations"]:.1f} SCF '
+                  f'iterations vs {ground["scf_iterations"]:.1f} for ground, about '
+                  f'{saved * stat["mean"]:.0f} sec saved per site')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Get the timings of FHI-aims calculations.')
+    parser.add_argument('mode', choices=['scf', 'total'],
+                        help='time to parse from aims.out')
+    parser.add_argument('directories', nargs='+', help='directories to search for timings')
+    parser.add_argument('-f', '--format', choices=['text', 'csv', 'json'], default='text',
+                        help='output format (default: text)')
+    parser.add_argument('-o', '--output', help='write CSV or JSON output to a file')
+    parser.add_argument('-p', '--percentiles', nargs='+', type=float, default=[50, 90, 95],
+                        help='percentiles of the stage statistics (default: 50 90 95)')
+    parser.add_argument('-w', '--workers', type=int, default=8,
+                        help='number of files to read at once (default: 8)')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
+    records = read_timings(args.mode, args.directories, args.workers)
+    stats = stage_statistics(records, args.percentiles)
+
+    if args.format == 'text':
+        print_timings(args.mode, records, stats)
+        return
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'json':
+            json.dump({'mode': args.mode, 'sites': records, 'stages': stats}, out, indent=1)
+            out.write('\n')
+        else:
+            # Per-site rows followed by per-stage rows
+            write_csv(records, out)
+            out.write('\n')
+            write_csv(stats, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Read final energies from FHI-aims output files."""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import profiling
+
+
+ENERGY_LINE = 's.c.f. calculation      :'
+
+# Location of the output in each site directory
+LAYOUTS = {
+    'fop': os.path.join('hole', 'aims.out'),
+    'fob': 'aims.out'
+}
+
+# Harvest index kept next to the site directories
+INDEX_FILE = '.harvest_index.json'
+FINGERPRINT_SIZE = 4096
+
+# Multiplicities of the sites which stand for several equivalent atoms,
+# and of the sites of one layout only, e.g. FOP sites chosen by prescreen.py
+SITE_WEIGHTS_FILE = '{element}_site_weights.txt'
+LAYOUT_WEIGHTS_FILE = '{element}_{layout}_site_weights.txt'
+
+
+def get_energy_level(line):
+    """Check for a float in a line in a file."""
+    for word in line.split():
+        try:
+            return float(word)
+        except ValueError:
+            pass
+
+
+def read_tail_energy(out, size, block_size=65536, max_tail=2**20, line=ENERGY_LINE):
+    """Search backwards from the end of an open binary file for the value of a line."""
+    marker = line.encode()
+    tail = b''
+    pos = size
+
+    while pos > 0 and size - pos < max_tail:
+        step = min(block_size, pos)
+        pos -= step
+        out.seek(pos)
+        tail = out.read(step) + tail
+        profiling.count('bytes read', step)
+
+        # Only accept a match with a complete line around it
+        found = tail.rfind(marker)
+        if found != -1:
+            start = tail.rfind(b'\n', 0, found) + 1
+            end = tail.find(b'\n', found)
+            if end == -1:
+                end = len(tail)
+            if start > 0 or pos == 0:
+                return get_energy_level(tail[start:end].decode(errors='replace'))
+
+    return None
+
+
+def read_final_energy(path, block_size=65536, max_tail=2**20):
+    """
+    Get the last s.c.f. energy in an aims.out.
+
+    Reads blocks backwards from the end of the file, which is where the
+    final energy is printed, and only scans the whole file forwards if
+    the last max_tail bytes have no energy line. Returns None if the
+    file has no energy.
+    """
+    size = os.path.getsize(path)
+
+    with open(path, 'rb') as out:
+        energy = read_tail_energy(out, size, block_size, max_tail)
+
+        if energy is not None or size <= max_tail:
+            return energy
+
+        # Fall back to reading the whole file
+        out.seek(0)
+        marker = ENERGY_LINE.encode()
+        for line in out:
+            if marker in line:
+                energy = get_energy_level(line.decode(errors='replace'))
+        profiling.count('bytes read', out.tell())
+
+    return energy
+
+
+def find_sites(element, root='./'):
+    """Get the (site index, directory) of each core hole dir, sorted by index."""
+    pattern = re.compile(rf'{re.escape(element)}(\d+)')
+    sites = []
+
+    for directory in os.listdir(root):
+        match = pattern.fullmatch(directory)
+
+        if match is not None and os.path.isdir(os.path.join(root, directory)):
+            sites.append((int(match.group(1)), directory))
+
+    return sorted(sites)
+
+
+def tail_fingerprint(path, size=FINGERPRINT_SIZE):
+    """Hash the last bytes of a file."""
+    with open(path, 'rb') as out:
+        out.seek(max(os.path.getsize(path) - size, 0))
+        return hashlib.blake2b(out.read(size), digest_size=16).hexdigest()
+
+
+@profiling.timed()
+def read_site_energy(path, cached=None):
+    """
+    Get the index entry of a site output.
+
+    The entry holds the size, mtime, tail fingerprint, final energy and
+    status ('finished', 'incomplete' or 'missing') of the output. A
+    cached entry is reused if the size and mtime are unchanged, or if
+    only the mtime changed but the tail fingerprint is the same.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return {'energy': None, 'status': 'missing'}
+
+    if cached is not None and cached.get('size') == stat.st_size:
+        if cached.get('mtime') == stat.st_mtime_ns:
+            return cached
+
+        fingerprint = tail_fingerprint(path)
+        if cached.get('fingerprint') == fingerprint:
+            return dict(cached, mtime=stat.st_mtime_ns)
+    else:
+        fingerprint = tail_fingerprint(path)
+
+    energy = read_final_energy(path)
+    profiling.count('files read')
+
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'fingerprint': fingerprint,
+        'energy': energy,
+        'status': 'incomplete' if energy is None else 'finished'
+    }
+
+
+def load_index(root='./'):
+    """Read the harvest index, or an empty one if there is none."""
+    try:
+        with open(os.path.join(root, INDEX_FILE), 'r', encoding='utf-8') as index:
+            return json.load(index)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_index(entries, root='./'):
+    """
+    Merge entries into the harvest index on disk.
+
+    The index is re-read under an exclusive lock and replaced atomically
+    so that concurrent harvests do not lose each other's entries.
+    """
+    path = os.path.join(root, INDEX_FILE)
+
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index = load_index(root)
+        index.update(entries)
+
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=root, prefix=INDEX_FILE + '.')
+        try:
+            with os.fdopen(tmp_fd, 'w', encoding='utf-8') as tmp:
+                json.dump(index, tmp, indent=1, sort_keys=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+@profiling.timed()
+def harvest_energies(element, layout='fop', root='./', workers=8, processes=False,
+                     cache=True):
+    """
+    Read the final energies of all core hole sites concurrently.
+
+    Returns a list of (site index, energy) sorted by site index, with
+    None for sites without a final energy. layout is 'fop' for
+    <dir>/hole/aims.out or 'fob' for <dir>/aims.out. With cache, only
+    outputs that are new or changed since the last harvest are read.
+    """
+    sites = find_sites(element, root)
+    keys = [os.path.join(directory, LAYOUTS[layout]) for _, directory in sites]
+    paths = [os.path.join(root, key) for key in keys]
+    index = load_index(root) if cache else {}
+    cached = [index.get(key) for key in keys]
+
+    if workers <= 1 or len(paths) <= 1:
+        entries = [read_site_energy(path, entry) for path, entry in zip(paths, cached)]
+    else:
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with pool(max_workers=workers) as executor:
+            entries = list(executor.map(read_site_energy, paths, cached))
+
+    profiling.count('sites processed', len(sites))
+
+    if cache:
+        changed = {key: entry for key, entry, old in zip(keys, entries, cached)
+                   if entry != old}
+        if changed:
+            save_index(changed, root)
+
+    return [(index, entry['energy']) for (index, _), entry in zip(sites, entries)]
+
+
+def site_weights_path(element, root='./', layout=None):
+    """Get the path of the site weights of an element, or of one layout only."""
+    if layout is None:
+        return os.path.join(root, SITE_WEIGHTS_FILE.format(element=element))
+
+    return os.path.join(root, LAYOUT_WEIGHTS_FILE.format(element=element, layout=layout))
+
+
+def write_site_weights(element, classes, root='./', layout=None):
+    """
+    Write the classes of equivalent sites of an element.
+
+    Each line has the representative site, which is the only one with
+    a core hole directory, its multiplicity and all sites of its class.
+    With a layout the weights only apply to the sites of that layout.
+    Returns the path of the file.
+    """
+    path = site_weights_path(element, root, layout)
+
+    with open(path, 'w') as weights:
+        weights.write('# site multiplicity equivalent_sites\n')
+        for sites in classes:
+            weights.write(f'{sites[0]} {len(sites)} {" ".join(map(str, sites))}\n')
+
+    return path
+
+
+def read_site_classes(element, root='./', layout=None):
+    """Get the equivalent sites of each representative site, or None without a weights file."""
+    try:
+        with open(site_weights_path(element, root, layout), 'r') as weights:
+            return {int(line.split()[0]): [int(site) for site in line.split()[2:]]
+                    for line in weights if line.strip() and not line.startswith('#')}
+    except FileNotFoundError:
+        return None
+
+
+def read_site_weights(element, root='./', layout=None):
+    """Get the multiplicity of each representative site, or None without a weights file."""
+    try:
+        with open(site_weights_path(element, root, layout), 'r') as weights:
+            return {int(line.split()[0]): int(line.split()[1]) for line in weights
+                    if line.strip() and not line.startswith('#')}
+    except FileNotFoundError:
+        return None
+
+
+def peak_weights(element, sites, root='./', layout=None):
+    """
+    Get the multiplicity of each site with an energy from harvest_energies,
+    or None without a weights file. Sites missing from the file count once.
+
+    With a layout, its own weights file is used if there is one, in place
+    of the weights shared by every layout.
+    """
+    weights = None if layout is None else read_site_weights(element, root, layout)
+    if weights is None:
+        weights = read_site_weights(element, root)
+    if weights is None:
+        return None
+
+    return [weights.get(site, 1) for site, energy in sites if energy is not None]
@@ -1,16 +1,14 @@
 #!/usr/bin/env python3
 
-import os
+import argparse
+
+import profiling
+from harvest import INDEX_FILE, harvest_energies, peak_weights, read_final_energy
 
 
 def read_ground():
     """Get the ground state energy."""
-    with open('ground/aims.out', 'r', encoding='utf-8') as ground:
-        for line in ground:
-
-            # Get the energy
-            if 's.c.f. calculation      :' in line:
-                grenrgys = float(get_energy_level(line))
+    grenrgys = float(read_final_energy('ground/aims.out'))
 
     print('Ground state calculated energy (eV):')
     print(grenrgys)
@@ -35,33 +33,28 @@ def contains_number(string):
             return True
 
 
-def read_atoms(get_energy_level, contains_number):
+def read_atoms(get_energy_level, contains_number, workers=8, processes=False,
+               cache=True):
     """Get the excited state energies."""
-    dir_list = os.listdir('./')
     element = str(input('Enter atom: '))
-    energy = 's.c.f. calculation      :'
-    excienrgys = []
 
-    # Read each core hole dir
-    atom_counter = 0
-    for directory in dir_list:
-        if element in directory and contains_number(directory) is True:
-            atom_counter += 1
+    # Read each core hole dir, ordered by site index
+    sites = harvest_energies(element, 'fop', workers=workers,
+                             processes=processes, cache=cache)
+    atom_counter = len(sites)
+    excienrgys = [energy for _, energy in sites if energy is not None]
 
-            with open(directory + '/hole/aims.out', 'r', encoding='utf-8') as out:
-                for line in out:
-
-                    # Get the energy
-                    if energy in line:
-                        excienrgys.append(get_energy_level(line))
+    # Multiplicities of sites standing for several equivalent atoms, or
+    # for the groups of sites prescreen.py chose one FOP site from
+    weights = peak_weights(element, sites, layout='fop')
 
     print('Core hole calculated energies (eV):', *excienrgys, sep='\n')
 
-    return element, atom_counter, excienrgys
+    return element, atom_counter, excienrgys, weights
 
 
-def calc_delta_scf(element, grenrgys, excienrgys):
-    """Calculate delta scf and write to a file."""
+def calc_delta_scf(element, grenrgys, excienrgys, weights=None):
+    """Calculate delta scf and write to a file, with the weight of each peak if given."""
     print('Excited energies:', excienrgys)
     print('Ground energy:', grenrgys)
     xps = []
@@ -70,11 +63,28 @@ def calc_delta_scf(element, grenrgys, excienrgys):
         xps.append(i - grenrgys)
 
     with open(element + '_xps_peaks.txt', 'w') as file:
-        for i in xps:
-            file.write(f'{i}\n')
+        if weights is None:
+            for i in xps:
+                file.write(f'{i}\n')
+        else:
+            for i, weight in zip(xps, weights):
+                file.write(f'{i} {weight}\n')
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calculate XPS binding energies.')
+    parser.add_argument('-w', '--workers', type=int, default=8,
+                        help='number of outputs to read concurrently')
+    parser.add_argument('--processes', action='store_true',
+                        help='read outputs with processes instead of threads')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'reread all outputs instead of using {INDEX_FILE}')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
     grenrgys = read_ground()
-    element, atom_counter, excienrgys = read_atoms(get_energy_level, contains_number)
-    calc_delta_scf(element, grenrgys, excienrgys)
+    element, atom_counter, excienrgys, weights = read_atoms(get_energy_level,
+                                                            contains_number, args.workers,
+                                                            args.processes, not args.no_cache)
+    calc_delta_scf(element, grenrgys, excienrgys, weights)
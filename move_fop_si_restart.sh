@@ -2,8 +2,4 @@
 
 read -p 'Enter atom: ' atom
 
-for dir in "$atom"*; do
-  for file in "$dir/init/restart"*; do
-    mv "$file" "$dir/hole/"
-  done
-done
+python3 "$(dirname "$0")/stage_restart.py" fop_si --move --element "$atom"
@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
+import argparse
+
 import numpy as np
 
+import profiling
+
 def gaussian(x, x_mean, broadening):
     
     gaussian_val = np.sqrt((4*np.log(2))/(np.pi*(broadening**2)))* np.exp(-((4*np.log(2))/(broadening**2))*(x-x_mean)**2);
@@ -18,42 +22,393 @@ def PseudoVoigt(x, x_mean, broadening, mixing):
     """
     return (1-mixing)*gaussian(x, x_mean, broadening)+mixing*lorentzian(x, x_mean, broadening)
 
+def get_widths(eigenvalues, broadening, broadening2, mix1, mix2, ewid1, ewid2):
+    """
+    Get the broadening and mixing of each peak, ramping linearly
+    between ewid1 and ewid2.
+    """
+    eigenvalues = np.asarray(eigenvalues, dtype=float)
+
+    if ewid2 > ewid1:
+        ramp = np.clip((eigenvalues - ewid1) / (ewid2 - ewid1), 0., 1.)
+    else:
+        # Without a ramp, peaks above ewid1 take the second width
+        ramp = (eigenvalues > ewid1).astype(float)
+
+    sigma = broadening + (broadening2 - broadening) * ramp
+    mixing = mix1 + (mix2 - mix1) * ramp
+    return sigma, mixing
+
+def peak_prefactors(sigma, mixing, coeffs):
+    """ 
+    Get the Gaussian exponent and weight and the Lorentzian squared
+    half width and weight of each weighted pseudo-Voigt peak.
+    """
+    gauss_exp = (4*np.log(2))/(sigma**2)
+    gauss_weight = np.sqrt(gauss_exp/np.pi)*(1-mixing)*coeffs
+    lor_hwhm2 = (sigma/2)**2
+    lor_weight = sigma/(2*np.pi)*mixing*coeffs
+    return gauss_exp, gauss_weight, lor_hwhm2, lor_weight
+
+@profiling.timed()
 def dos_binning(eigenvalues,broadening=0.75, bin_width=0.01, mix1=0., mix2 = None,
-        coeffs=None,start=0.0, stop=10.0, broadening2 = None, ewid1 = 10.0, ewid2 = 20.0):
+        coeffs=None,start=0.0, stop=10.0, broadening2 = None, ewid1 = 10.0, ewid2 = 20.0,
+        chunk_size=2**22, dtype=np.float64):
     """ 
     performs binning for a given set of eigenvalues and 
     optionally weight coeffs.
+
+    The bins x peaks pseudo-Voigt matrix is evaluated in blocks of at
+    most chunk_size elements, in the precision given by dtype.
     """
     if broadening2 is None:
         broadening2 = broadening
+    if mix2 is None:
+        mix2 = mix1
+    eigenvalues = np.asarray(eigenvalues, dtype=float).ravel()
     if coeffs is None:
         coeffs = np.ones(len(eigenvalues))
+    coeffs = np.asarray(coeffs, dtype=float).ravel()
     lowest_e = start
     highest_e = stop
     num_bins = int((highest_e-lowest_e)/bin_width)
-    x_axis = np.zeros([num_bins])
-    data = np.zeros([num_bins])
     #setting up x-axis
-    for i in range(num_bins):
-        x_axis[i] = lowest_e + i * bin_width
+    x_axis = lowest_e + np.arange(num_bins) * bin_width
+    data = np.zeros([num_bins])
     #get DOS
-    sigma=np.zeros((len(eigenvalues)))
-    mixing=np.zeros((len(eigenvalues)))
-
-    for ei,e in enumerate(eigenvalues):
-        if e<=(ewid1):
-            sigma[ei]=broadening
-            mixing[ei]=mix1
-        elif e>(ewid2):
-            sigma[ei]=broadening2
-            mixing[ei]=mix2
-        else:
-            sigma[ei]=broadening + ((broadening2-broadening)/(ewid2-ewid1))*(e-ewid1)
-            mixing[ei]=(mix1 + ((mix2-mix1)/(ewid2-ewid1))*(e-ewid1))
-    for i in range(num_bins):
-        pseudovoigt_vec = np.zeros((len(eigenvalues)))
-        pseudovoigt_vec=PseudoVoigt(x_axis[i],eigenvalues,sigma,mixing)*coeffs
-        data[i]= np.sum(pseudovoigt_vec)
+    sigma, mixing = get_widths(eigenvalues, broadening, broadening2, mix1, mix2,
+                               ewid1, ewid2)
+
+    # Fold the peak prefactors into weight vectors so that each block
+    # reduces to two matrix-vector products
+    gauss_exp, gauss_weight, lor_hwhm2, lor_weight = peak_prefactors(sigma, mixing, coeffs)
+    use_lorentzian = np.any(lor_weight != 0)
+
+    num_peaks = len(eigenvalues)
+    if num_peaks == 0 or num_bins == 0:
+        return x_axis, data
+    peak_block = min(num_peaks, chunk_size)
+    bin_block = max(1, chunk_size // peak_block)
+    x_cast = x_axis.astype(dtype)
+
+    for j in range(0, num_peaks, peak_block):
+        peaks = slice(j, j + peak_block)
+        e_blk = eigenvalues[peaks].astype(dtype)
+        g_exp = gauss_exp[peaks].astype(dtype)
+        g_wt = gauss_weight[peaks].astype(dtype)
+        l_hw2 = lor_hwhm2[peaks].astype(dtype)
+        l_wt = lor_weight[peaks].astype(dtype)
+
+        for i in range(0, num_bins, bin_block):
+            bins = slice(i, i + bin_block)
+            dist2 = (x_cast[bins, None] - e_blk[None, :])**2
+            block = np.exp(-g_exp*dist2) @ g_wt
+            if use_lorentzian:
+                block += (1/(l_hw2 + dist2)) @ l_wt
+            data[bins] += block
+
+    return x_axis, data
+
+@profiling.timed()
+def site_binning(eigenvalues,broadening=0.75, bin_width=0.01, mix1=0., mix2 = None,
+        coeffs=None,start=0.0, stop=10.0, broadening2 = None, ewid1 = 10.0, ewid2 = 20.0,
+        chunk_size=2**22):
+    """ 
+    performs binning for each eigenvalue separately in one pass.
+
+    Returns the x-axis and a peaks x bins array of the individual
+    spectra, which sums over the peaks to the dos_binning spectrum.
+    """
+    if broadening2 is None:
+        broadening2 = broadening
+    if mix2 is None:
+        mix2 = mix1
+    eigenvalues = np.asarray(eigenvalues, dtype=float).ravel()
+    if coeffs is None:
+        coeffs = np.ones(len(eigenvalues))
+    coeffs = np.asarray(coeffs, dtype=float).ravel()
+    num_bins = int((stop-start)/bin_width)
+    x_axis = start + np.arange(num_bins) * bin_width
+    num_peaks = len(eigenvalues)
+    data = np.zeros([num_peaks, num_bins])
+    if num_peaks == 0:
+        return x_axis, data
+
+    sigma, mixing = get_widths(eigenvalues, broadening, broadening2, mix1, mix2,
+                               ewid1, ewid2)
+    gauss_exp, gauss_weight, lor_hwhm2, lor_weight = peak_prefactors(sigma, mixing, coeffs)
+    use_lorentzian = np.any(lor_weight != 0)
+    bin_block = max(1, chunk_size // num_peaks)
+
+    for i in range(0, num_bins, bin_block):
+        bins = slice(i, i + bin_block)
+        dist2 = (x_axis[None, bins] - eigenvalues[:, None])**2
+        block = gauss_weight[:, None]*np.exp(-gauss_exp[:, None]*dist2)
+        if use_lorentzian:
+            block += lor_weight[:, None]/(lor_hwhm2[:, None] + dist2)
+        data[:, bins] = block
+
+    return x_axis, data
+
+def tail_cutoff(sigma, mixing, tol):
+    """ 
+    Get the half-width beyond which at most a fraction tol of the area
+    of the Gaussian part of each pseudo-Voigt peak lies.
+
+    The Gaussian tail uses the bound erfc(z) <= exp(-z**2). Peaks with
+    Lorentzian mixing keep at least one full width, so that the series
+    for their Lorentzian tails converges quickly.
+    """
+    gauss_share = np.maximum(1 - mixing, 1e-300)
+    gauss_cut = sigma/np.sqrt(4*np.log(2)) * np.sqrt(np.log(np.maximum(gauss_share/tol, 1.)))
+    return np.where(mixing > 0, np.maximum(gauss_cut, sigma), gauss_cut)
+
+def tail_fraction(sigma, mixing, cutoff):
+    """Fraction of the area of the Gaussian part of each peak beyond +-cutoff."""
+    return (1-mixing)*np.exp(-(4*np.log(2))*(cutoff/sigma)**2)
+
+def lorentzian_terms(hwhm, cutoff, tol):
+    """ 
+    Get the number of terms of the series
+    1/(g**2 + d**2) = sum_n (-g**2)**n / d**(2n+2)
+    needed for a relative error below tol beyond +-cutoff.
+    """
+    ratio2 = (hwhm/cutoff)**2
+    if ratio2 <= 0:
+        return 1
+    return max(1, int(np.ceil(np.log(tol)/np.log(ratio2))))
+
+def lorentzian_far_field(eigenvalues, lor_hwhm2, lor_weight, start, bin_width, num_bins,
+                         reach, terms):
+    """ 
+    Sum the Lorentzian tails of peaks on the grid points more than reach
+    bins away from the two grid points around each peak.
+
+    Beyond reach the Lorentzians are summed term by term in their series
+    in 1/d**2, where every term is a convolution of a stick histogram
+    with a fixed kernel.
+    """
+    offsets = np.arange(-(num_bins-1), num_bins)
+    far = np.abs(offsets) > reach
+    dist2 = np.where(far, offsets*bin_width, 1.)**2
+    nfft = 1 << (2*num_bins - 2).bit_length()
+
+    spectrum = np.zeros(nfft//2 + 1, dtype=complex)
+    for n in range(terms):
+        hist = stick_histogram(eigenvalues, lor_weight*(-lor_hwhm2)**n, start, bin_width,
+                               num_bins)
+        kernel = np.where(far, dist2**-(n+1), 0.)
+        spectrum += np.fft.rfft(hist, nfft) * np.fft.rfft(kernel, nfft)
+
+    return np.fft.irfft(spectrum, nfft)[num_bins-1:2*num_bins-1]
+
+@profiling.timed()
+def dos_binning_sparse(eigenvalues,broadening=0.75, bin_width=0.01, mix1=0., mix2 = None,
+        coeffs=None,start=0.0, stop=10.0, broadening2 = None, ewid1 = 10.0, ewid2 = 20.0,
+        tol=1e-6, chunk_size=2**22):
+    """ 
+    performs binning for a given set of eigenvalues and optionally
+    weight coeffs, evaluating each peak only on the bins within its
+    cutoff window.
+
+    The window of each peak is chosen from its width so that at most a
+    fraction tol of the area of its Gaussian part is dropped. With
+    Lorentzian mixing every peak shares one window, and the Lorentzian
+    tails beyond it are added as a series of convolutions, accurate to
+    a relative tol. Also returns an upper bound on the total dropped
+    intensity.
+    """
+    if broadening2 is None:
+        broadening2 = broadening
+    if mix2 is None:
+        mix2 = mix1
+    eigenvalues = np.asarray(eigenvalues, dtype=float).ravel()
+    if coeffs is None:
+        coeffs = np.ones(len(eigenvalues))
+    coeffs = np.asarray(coeffs, dtype=float).ravel()
+    num_bins = int((stop-start)/bin_width)
+    x_axis = start + np.arange(num_bins) * bin_width
+    data = np.zeros([num_bins])
+
+    # Sorted peaks touch neighbouring bins in each chunk
+    order = np.argsort(eigenvalues, kind='stable')
+    eigenvalues = eigenvalues[order]
+    coeffs = coeffs[order]
+    sigma, mixing = get_widths(eigenvalues, broadening, broadening2, mix1, mix2,
+                               ewid1, ewid2)
+    gauss_exp, gauss_weight, lor_hwhm2, lor_weight = peak_prefactors(sigma, mixing, coeffs)
+    use_lorentzian = np.any(lor_weight != 0) and num_bins > 1
+    cutoff = tail_cutoff(sigma, mixing, tol)
+
+    if use_lorentzian:
+        # One window of reach bins either side of the two grid points
+        # around each peak, beyond which the far field takes over
+        reach = int(np.ceil(cutoff.max() / bin_width))
+        pos = (eigenvalues - start) / bin_width
+        lower = np.minimum(np.floor(pos).astype(int), num_bins - 2)
+        off_grid = (pos < 0) | (pos > num_bins - 1)
+        lo = np.maximum(lower - reach, 0)
+        hi = np.minimum(lower + reach + 2, num_bins)
+        cutoff = np.full(len(eigenvalues), reach * bin_width)
+    else:
+        lo = np.searchsorted(x_axis, eigenvalues - cutoff, side='left')
+        hi = np.searchsorted(x_axis, eigenvalues + cutoff, side='right')
+        off_grid = np.zeros(len(eigenvalues), dtype=bool)
+    lengths = hi - lo
+
+    # Windows spanning the whole grid gain nothing from truncation, and
+    # the far field only covers peaks on the grid
+    full = (lengths == num_bins) | off_grid
+
+    # Any peak evaluated in its window only loses its Gaussian tail
+    # beyond it, and the remainder of its Lorentzian series
+    dropped = np.abs(coeffs) * tail_fraction(sigma, mixing, cutoff)
+    if use_lorentzian:
+        terms = lorentzian_terms(np.sqrt(lor_hwhm2.max()), reach * bin_width, tol)
+        dropped += (np.abs(lor_weight) * 2 * lor_hwhm2**terms
+                    / ((2*terms + 1) * (reach * bin_width)**(2*terms + 1)))
+    tail_bound = dropped[~full].sum()
+
+    if np.any(full):
+        _, data = dos_binning(eigenvalues[full], broadening=broadening,
+                              bin_width=bin_width, mix1=mix1, mix2=mix2,
+                              coeffs=coeffs[full], start=start, stop=stop,
+                              broadening2=broadening2, ewid1=ewid1, ewid2=ewid2,
+                              chunk_size=chunk_size)
+        data = data[:num_bins]
+        lengths = np.where(full, 0, lengths)
+
+    if use_lorentzian and not np.all(full):
+        sparse = ~full
+        data += lorentzian_far_field(eigenvalues[sparse], lor_hwhm2[sparse],
+                                     lor_weight[sparse], start, bin_width, num_bins,
+                                     reach, terms)
+
+        # The far field reaches the first bin past each window from the
+        # farther grid point; the windows below hold the exact values
+        share = pos[sparse] - lower[sparse]
+        edge2 = ((reach + 1) * bin_width)**2
+        edge = sum(lor_weight[sparse] * (-lor_hwhm2[sparse])**n / edge2**(n+1)
+                   for n in range(terms))
+        below = lower[sparse] - reach
+        above = lower[sparse] + reach + 1
+        data -= np.bincount(below[below >= 0], (share * edge)[below >= 0], minlength=num_bins)
+        data -= np.bincount(above[above < num_bins], ((1 - share) * edge)[above < num_bins],
+                            minlength=num_bins)
+
+    # Evaluate chunks of peaks on windows padded to the longest one in
+    # the chunk; neighbouring sorted peaks have similar windows
+    first = 0
+    while first < len(eigenvalues):
+        width = max(int(lengths[first:first + chunk_size].max(initial=0)), 1)
+        last = min(len(eigenvalues), first + max(1, chunk_size // width))
+        peaks = slice(first, last)
+        width = int(lengths[peaks].max())
+        if width > 0:
+            offsets = np.arange(width)
+            bin_idx = lo[peaks, None] + offsets
+            outside = offsets >= lengths[peaks, None]
+            bin_idx[outside] = 0
+            dist2 = (start + bin_idx*bin_width - eigenvalues[peaks, None])**2
+            vals = gauss_weight[peaks, None]*np.exp(-gauss_exp[peaks, None]*dist2)
+            if use_lorentzian:
+                vals += lor_weight[peaks, None]/(lor_hwhm2[peaks, None] + dist2)
+            vals[outside] = 0.
+            data += np.bincount(bin_idx.ravel(), weights=vals.ravel(), minlength=num_bins)
+        first = last
+
+    return x_axis, data, tail_bound
+
+def stick_histogram(eigenvalues, coeffs, start, bin_width, num_bins):
+    """
+    Bin weighted peaks onto a grid, splitting each weight linearly
+    between the two nearest grid points.
+    """
+    pos = (eigenvalues - start) / bin_width
+    lower = np.minimum(np.floor(pos).astype(int), num_bins - 2)
+    frac = pos - lower
+    hist = np.bincount(lower, (1 - frac) * coeffs, minlength=num_bins)
+    hist += np.bincount(lower + 1, frac * coeffs, minlength=num_bins)
+    return hist[:num_bins]
+
+def fft_broaden(hist, bin_width, broadening, mixing):
+    """ 
+    Linear convolution of a stick histogram with one pseudo-Voigt
+    kernel using FFTs.
+    """
+    n = len(hist)
+    offsets = np.arange(-(n-1), n) * bin_width
+    kernel = PseudoVoigt(offsets, 0., broadening, mixing)
+    nfft = 1 << (len(hist) + len(kernel) - 2).bit_length()
+    conv = np.fft.irfft(np.fft.rfft(hist, nfft) * np.fft.rfft(kernel, nfft), nfft)
+    return conv[n-1:2*n-1]
+
+@profiling.timed()
+def dos_binning_fft(eigenvalues,broadening=0.75, bin_width=0.01, mix1=0., mix2 = None,
+        coeffs=None,start=0.0, stop=10.0, broadening2 = None, ewid1 = 10.0, ewid2 = 20.0,
+        pad=None, ramp_segments=16):
+    """ 
+    performs binning for a given set of eigenvalues and optionally
+    weight coeffs by convolving a stick histogram with the pseudo-Voigt
+    kernel.
+
+    The grid is extended by pad (default: the window width) on either
+    side so that tails of peaks outside start..stop are kept; peaks
+    beyond the padding are evaluated directly. Peaks between ewid1 and
+    ewid2 are split into ramp_segments groups, each broadened with its
+    mean width and mixing.
+    """
+    if broadening2 is None:
+        broadening2 = broadening
+    if mix2 is None:
+        mix2 = mix1
+    eigenvalues = np.asarray(eigenvalues, dtype=float).ravel()
+    if coeffs is None:
+        coeffs = np.ones(len(eigenvalues))
+    coeffs = np.asarray(coeffs, dtype=float).ravel()
+    if pad is None:
+        pad = stop - start
+    num_bins = int((stop-start)/bin_width)
+    x_axis = start + np.arange(num_bins) * bin_width
+    data = np.zeros([num_bins])
+    if num_bins == 0:
+        return x_axis, data
+
+    # Extended grid holding the histogram
+    n_pad = int(np.ceil(pad/bin_width))
+    n_ext = num_bins + 2*n_pad
+    ext_start = start - n_pad*bin_width
+    pos = (eigenvalues - ext_start) / bin_width
+    inside = (pos >= 0) & (pos <= n_ext - 1)
+
+    if not np.all(inside):
+        _, data = dos_binning(eigenvalues[~inside], broadening=broadening,
+                              bin_width=bin_width, mix1=mix1, mix2=mix2,
+                              coeffs=coeffs[~inside], start=start, stop=stop,
+                              broadening2=broadening2, ewid1=ewid1, ewid2=ewid2)
+        data = data[:num_bins]
+    eigenvalues = eigenvalues[inside]
+    coeffs = coeffs[inside]
+
+    # Assign each peak to a constant width segment
+    sigma, mixing = get_widths(eigenvalues, broadening, broadening2, mix1, mix2,
+                               ewid1, ewid2)
+    if broadening == broadening2 and mix1 == mix2:
+        segment = np.zeros(len(eigenvalues), dtype=int)
+    elif ewid2 > ewid1:
+        ramp = (eigenvalues - ewid1) / (ewid2 - ewid1)
+        segment = np.clip(np.ceil(ramp * ramp_segments), 0, ramp_segments + 1).astype(int)
+    else:
+        segment = (eigenvalues > ewid1).astype(int)
+
+    for seg in np.unique(segment):
+        members = segment == seg
+        hist = stick_histogram(eigenvalues[members], coeffs[members], ext_start,
+                               bin_width, n_ext)
+        conv = fft_broaden(hist, bin_width, sigma[members].mean(),
+                           mixing[members].mean())
+        data += conv[n_pad:n_pad+num_bins]
+
     return x_axis, data
 
 ###################################
@@ -66,44 +421,65 @@ ewid1 = firstpeak+1.0
 ewid2 = firstpeak+2.0
 mix1 = 0.3
 mix2 = 0.3
+# Broadening scheme: 'direct' sums every peak on every bin, 'sparse'
+# evaluates each peak within a cutoff window dropping at most a fraction
+# tail_tol of its Gaussian area, with the Lorentzian tails beyond it summed
+# as convolutions, 'fft' convolves a stick histogram with the pseudo-Voigt
+# kernel
+mode = 'direct'
+tail_tol = 1e-6
 ########################################
 
-#Set what element you have calculated XPS for
-element = str(input('Enter atom: '))
-#Read in the XPS peaks in generated with python script
-data = np.loadtxt(element+'_xps_peaks.txt')
-print(data)
-
-#Apply the broadening
-x, y = dos_binning(data, broadening=broad1, mix1=mix1, mix2=mix2, start=xstart, stop=xstop,
-                coeffs = None, broadening2=broad2, ewid1=ewid1, ewid2=ewid2)
-
-#Write out the spectrum to a text file
-fileout = open(element+'_xps_spectrum.txt', 'w')
-for (xi, yi) in zip(x,y):
-    dat = str(xi) + ' ' + str(yi) + '\n'
-    fileout.write(dat)
-fileout.close()
-
-#To get the indivdual atom peaks uncomment the quit() command
-ind_at = input('Get individual atom energies? [y/N] ')
-
-if ind_at.lower() != 'y':
-    exit()
-
-xs = []
-ys = []
-
-for z in range(len(data)):
-    peak = []
-    peak.append(data[z])
-    x_tmp, y_tmp = dos_binning(peak, broadening=broad1, mix1=mix1, mix2=mix2, start=xstart, stop=xstop,
-                coeffs = None, broadening2=broad2, ewid1=ewid1, ewid2=ewid2)
-    xs.append(x_tmp)
-    ys.append(y_tmp)
-
-    txtfile = open(element+'_xps_spectrum_'+element+str(z)+'.txt','w')
-    for (xsz, ysz) in zip(x_tmp, y_tmp):
-        txt = str(xsz) + ' ' + str(ysz) + '\n'
-        txtfile.write(txt)
-    txtfile.close()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Broaden XPS peaks into a spectrum.')
+    profiling.add_argument(parser)
+    profiling.setup(parser.parse_args().profile)
+
+    #Set what element you have calculated XPS for
+    element = str(input('Enter atom: '))
+    #Read in the XPS peaks in generated with python script
+    with profiling.timer('read peaks'):
+        data = np.loadtxt(element+'_xps_peaks.txt', ndmin=2)
+
+    #A second column holds the number of equivalent sites of each peak
+    coeffs = data[:, 1] if data.shape[1] > 1 else None
+    data = data[:, 0]
+    profiling.count('peaks', len(data))
+    print(data)
+
+    #Get the spectrum of every atom as well as the total
+    ind_at = input('Get individual atom energies? [y/N] ')
+
+    #Apply the broadening
+    if ind_at.lower() == 'y':
+        x, ys = site_binning(data, broadening=broad1, mix1=mix1, mix2=mix2, start=xstart,
+                        stop=xstop, coeffs=coeffs, broadening2=broad2, ewid1=ewid1, ewid2=ewid2)
+        y = ys.sum(axis=0)
+    elif mode == 'sparse':
+        x, y, tail = dos_binning_sparse(data, broadening=broad1, mix1=mix1, mix2=mix2, start=xstart,
+                        stop=xstop, coeffs=coeffs, broadening2=broad2, ewid1=ewid1, ewid2=ewid2,
+                        tol=tail_tol)
+        print(f'Intensity dropped from truncated tails: <= {tail}')
+    else:
+        if mode == 'fft':
+            broaden = dos_binning_fft
+        else:
+            broaden = dos_binning
+
+        x, y = broaden(data, broadening=broad1, mix1=mix1, mix2=mix2, start=xstart, stop=xstop,
+                        coeffs=coeffs, broadening2=broad2, ewid1=ewid1, ewid2=ewid2)
+
+    #Write out the spectrum to a text file
+    with profiling.timer('write spectrum'):
+        fileout = open(element+'_xps_spectrum.txt', 'w')
+        for (xi, yi) in zip(x,y):
+            dat = str(xi) + ' ' + str(yi) + '\n'
+            fileout.write(dat)
+        profiling.count('bytes written', fileout.tell())
+        fileout.close()
+
+    #Write the individual atom spectra as columns of a single file
+    if ind_at.lower() == 'y':
+        labels = ' '.join(element+str(z) for z in range(len(ys)))
+        np.savetxt(element+'_xps_site_spectra.txt', np.column_stack((x, ys.T)),
+                   header='energy '+labels)
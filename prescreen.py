@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Use cheap FOB energies to choose the sites which need FOP calculations.
+
+Run FOB over every site first, e.g. generate.py -m fob -e C, from the
+ground directory. Once the FOB calculations have finished, run this
+script next to the site directories. It groups the sites whose FOB
+energies agree within a threshold and writes FOP directories only for
+one representative of each group, next to the FOB files in the same
+site directories. Outliers, and sites whose FOB calculation did not
+finish, are groups of their own. The group sizes are saved as the FOP
+site weights, <El>_fop_site_weights.txt, which only the FOP harvest reads,
+so the harvested FOP spectrum counts each representative once for every
+site of its group while the FOB spectrum keeps its own weights.
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+import profiling
+from generate import BASIS_SETS, generate_system
+from harvest import harvest_energies, read_site_classes, write_site_weights
+from workflow import chain_stages
+
+
+def group_energies(sites, threshold):
+    """
+    Group sites by their FOB energies.
+
+    sites holds (site, energy) pairs. Going up in energy, each site not
+    yet in a group starts one with every later site within threshold of
+    it. The representative of a group, its first site, is the one
+    closest to the mean energy of the group. Sites without an energy
+    are groups of their own.
+    """
+    finished = sorted((energy, site) for site, energy in sites if energy is not None)
+    energies = np.array([energy for energy, _ in finished])
+    groups = []
+
+    start = 0
+    while start < len(finished):
+        stop = np.searchsorted(energies, energies[start] + threshold, side='right')
+        members = [site for _, site in finished[start:stop]]
+        block = energies[start:stop]
+        closest = members[np.argmin(np.abs(block - block.mean()))]
+
+        groups.append([closest] + sorted(site for site in members if site != closest))
+        start = stop
+
+    groups.extend([site] for site, energy in sites if energy is None)
+
+    return sorted(groups)
+
+
+def fop_sites(method, element, groups, root='./'):
+    """Get the representatives which have no FOP directories yet."""
+    first_stage = chain_stages(method)[0]
+
+    return [group[0] for group in groups
+            if not os.path.isdir(os.path.join(root, f'{element}{group[0]}', first_stage))]
+
+
+def expand_groups(groups, classes):
+    """
+    Replace every site of each group by the equivalent sites it stands
+    for, keeping the representative first.
+    """
+    if not classes:
+        return groups
+
+    expanded = []
+    for group in groups:
+        sites = [site for member in group for site in classes.get(member, [member])]
+        expanded.append([group[0]] + sorted(set(sites) - {group[0]}))
+
+    return expanded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Group sites by their FOB energies and create '
+                                     'FOP calculations for one site of each group.')
+    parser.add_argument('-m', '--method', choices=['fop_di', 'fop_si'], default='fop_di',
+                        help='type of FOP calculation (default: fop_di)')
+    parser.add_argument('-e', '--element', help='target element')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1,
+                        help='largest spread of FOB energies in a group in eV (default: 0.1)')
+    parser.add_argument('-b', '--basis', choices=BASIS_SETS,
+                        help='species default basis set level')
+    parser.add_argument('-k', '--ks', nargs=2, type=int, metavar=('START', 'STOP'),
+                        help='KS start and stop states of the projector')
+    parser.add_argument('-r', '--root', default='./',
+                        help='directory of ground and the core hole directories (default: ./)')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='only print the groups')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
+    if args.element is None:
+        args.element = str(input('Enter atom: '))
+
+    sites = harvest_energies(args.element, 'fob', args.root)
+    if not sites:
+        print(f'No {args.element} site directories found, run the FOB calculations first')
+        exit(1)
+
+    groups = group_energies(sites, args.threshold)
+    energies = dict(sites)
+    for group in groups:
+        energy = energies[group[0]]
+        print(f'{args.element}{group[0]}: {len(group)} sites',
+              'no FOB energy' if energy is None else f'FOB energy {energy}')
+    print(f'{len(groups)} groups of {len(sites)} sites')
+
+    if args.dry_run:
+        return
+
+    if args.basis is None:
+        parser.error('--basis is needed to create the FOP calculations')
+    if args.method == 'fop_di' and args.ks is None:
+        parser.error('--ks is needed to create fop_di calculations')
+
+    # FOB sites may already stand for several equivalent atoms each
+    classes = read_site_classes(args.element, args.root)
+    write_site_weights(args.element, expand_groups(groups, classes), args.root, layout='fop')
+
+    atoms = fop_sites(args.method, args.element, groups, args.root)
+    if atoms:
+        generate_system(args.method, os.path.join(args.root, 'ground'), args.element, atoms,
+                        args.basis, None if args.ks is None else list(args.ks))
+    else:
+        print('Every representative already has FOP directories')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Timers, counters and peak memory of the scripts, with a Chrome trace export.
+
+Everything is off until enable() is called, usually by the --profile
+flag of a script. While disabled, timer() returns a shared no-op
+context manager and count() and timed functions return after one
+check of a global flag.
+"""
+
+import atexit
+import functools
+import json
+import os
+import resource
+import threading
+import time
+from collections import Counter
+
+
+ENABLED = False
+TRACE_FILE = 'profile_trace.json'
+
+_lock = threading.Lock()
+_start = time.perf_counter()
+_timers = {}
+_counters = Counter()
+_events = []
+_peak_rss = 0
+
+
+class _NullTimer:
+    """Timer used while profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def rss_mb():
+    """Get the peak resident memory of the process so far in MB."""
+    # ru_maxrss is in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _Timer:
+    """Add the time spent in a block to a named timer and the trace."""
+
+    def __init__(self, name, args=None):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _peak_rss
+        end = time.perf_counter()
+        rss = rss_mb()
+
+        with _lock:
+            calls, seconds = _timers.get(self.name, (0, 0.0))
+            _timers[self.name] = (calls + 1, seconds + end - self.start)
+
+            event = {'name': self.name, 'ph': 'X', 'pid': os.getpid(),
+                     'tid': threading.get_ident(), 'ts': (self.start - _start) * 1e6,
+                     'dur': (end - self.start) * 1e6}
+            if self.args:
+                event['args'] = self.args
+            _events.append(event)
+
+            # Sample the memory at the end of every block
+            if rss > _peak_rss:
+                _peak_rss = rss
+                _events.append({'name': 'memory', 'ph': 'C', 'pid': os.getpid(),
+                                'ts': (end - _start) * 1e6, 'args': {'peak_rss_mb': rss}})
+
+        return False
+
+
+def enable():
+    """Start recording timers, counters and memory."""
+    global ENABLED, _start
+    ENABLED = True
+    _start = time.perf_counter()
+
+
+def timer(name, **args):
+    """Time a block: with profiling.timer('parse'): ..."""
+    if not ENABLED:
+        return _NULL_TIMER
+
+    return _Timer(name, args)
+
+
+def count(name, n=1):
+    """Add n to a named counter."""
+    if not ENABLED:
+        return
+
+    with _lock:
+        _counters[name] += n
+
+
+def timed(name=None):
+    """Decorate a function to time every call under name, or its qualified name."""
+    def decorator(function):
+        label = name or function.__qualname__
+        if name is None and function.__module__ != '__main__':
+            label = f'{function.__module__}.{label}'
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+
+            with _Timer(label):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summary():
+    """Get the timers, counters and peak memory as text."""
+    lines = [f'{"timer":40s} {"calls":>8s} {"total s":>10s} {"mean ms":>10s}']
+
+    with _lock:
+        timers = sorted(_timers.items(), key=lambda item: -item[1][1])
+        counters = sorted(_counters.items())
+
+    for name, (calls, seconds) in timers:
+        lines.append(f'{name:40s} {calls:8d} {seconds:10.4f} {1000 * seconds / calls:10.3f}')
+
+    for name, value in counters:
+        lines.append(f'{name:40s} {value:>19,}')
+
+    lines.append(f'{"peak memory (MB)":40s} {rss_mb():19.1f}')
+    lines.append(f'{"wall time (s)":40s} {time.perf_counter() - _start:19.4f}')
+
+    return '\n'.join(lines)
+
+
+def write_trace(path=TRACE_FILE):
+    """Write the timeline as a Chrome trace, which chrome://tracing or Perfetto can open."""
+    with _lock:
+        events = list(_events)
+        counters = dict(_counters)
+
+    with open(path, 'w') as trace:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                   'otherData': {'counters': counters, 'peak_rss_mb': rss_mb()}}, trace)
+
+
+def report(path=TRACE_FILE):
+    """Print the summary and write the trace."""
+    print()
+    print(summary())
+    write_trace(path)
+    print(f'Trace written to {path}')
+
+
+def add_argument(parser):
+    """Add the --profile flag to an argument parser."""
+    parser.add_argument('--profile', nargs='?', const=TRACE_FILE, metavar='TRACE',
+                        help='print timers, counters and peak memory at exit and write a '
+                        f'Chrome trace (default: {TRACE_FILE})')
+
+
+def setup(trace_path):
+    """Enable profiling and report at exit if a --profile trace path was given."""
+    if trace_path is None:
+        return
+
+    enable()
+    atexit.register(report, trace_path)
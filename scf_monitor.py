@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Follow running FHI-aims calculations and abort those whose SCF has stalled."""
+
+import argparse
+import os
+import shlex
+import signal
+import subprocess
+import time
+
+from harvest import ENERGY_LINE, LAYOUTS, find_sites, get_energy_level
+
+
+# Values of each SCF iteration, by the start of their line
+ITERATION_LINES = {
+    '| Change of charge density': 'density',
+    '| Change of charge/spin density': 'density',
+    '| Change of total energy': 'energy',
+    '| Time for this iteration': 'time'
+}
+FINISHED_LINES = [ENERGY_LINE, 'Have a nice day']
+
+# Written next to aims.out by workflow.py and array_jobs.py launchers
+PID_FILE = 'aims.pid'
+
+# The iteration time is the last line printed for an iteration
+END_OF_ITERATION = 'time'
+
+
+class OutputFollower:
+    """
+    Incremental reader of the SCF iterations of one aims.out.
+
+    Each poll only reads the bytes written since the previous poll,
+    keeping any incomplete last line until the rest of it is written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.partial = b''
+        self.iterations = []
+        self.current = {}
+        self.finished = False
+        self.aborted = False
+
+    def poll(self):
+        """Read the new lines of the output, returning the number of new iterations."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+        # Start again if the output was replaced by a new run
+        if size < self.offset:
+            self.__init__(self.path)
+
+        if size == self.offset:
+            return 0
+
+        with open(self.path, 'rb') as out:
+            out.seek(self.offset)
+            data = self.partial + out.read(size - self.offset)
+        self.offset = size
+
+        lines = data.split(b'\n')
+        self.partial = lines.pop()
+        count = len(self.iterations)
+
+        for line in lines:
+            self.parse_line(line.decode(errors='replace').strip())
+
+        return len(self.iterations) - count
+
+    def parse_line(self, line):
+        """Add the value of one line to the current iteration."""
+        for start, key in ITERATION_LINES.items():
+            if line.startswith(start):
+                self.current[key] = get_energy_level(line.split(':', 1)[-1])
+
+                if key == END_OF_ITERATION:
+                    self.iterations.append(self.current)
+                    self.current = {}
+                return
+
+        if any(finished in line for finished in FINISHED_LINES):
+            self.finished = True
+
+
+def stall_reason(iterations, min_iterations=100, window=50, improvement=0.9,
+                 energy_tol=1e-4, max_iterations=None):
+    """
+    Get why the SCF of a calculation has stalled, or None if it has not.
+
+    Only calculations with at least min_iterations iterations are
+    judged. A calculation has stalled if the lowest density change of
+    the last window iterations is not below improvement times the lowest
+    one before them while the energy still changes by more than
+    energy_tol eV, or if it has run more than max_iterations iterations.
+    """
+    if max_iterations is not None and len(iterations) > max_iterations:
+        return f'{len(iterations)} SCF iterations'
+
+    if len(iterations) < max(min_iterations, window + 1):
+        return None
+
+    density = [it.get('density') for it in iterations]
+    energy = [abs(it['energy']) for it in iterations[-window:] if it.get('energy') is not None]
+    before = [d for d in density[:-window] if d is not None]
+    recent = [d for d in density[-window:] if d is not None]
+
+    if len(before) == 0 or len(recent) == 0 or len(energy) == 0:
+        return None
+
+    if min(recent) >= improvement * min(before) and min(energy) > energy_tol:
+        return (f'density change {min(recent):.2e} did not improve on {min(before):.2e} '
+                f'in {window} iterations')
+
+    return None
+
+
+def flag_hook(path, reason):
+    """Write why a calculation stalled to a STALLED file next to its output."""
+    print(f'{path}: {reason}')
+    with open(os.path.join(os.path.dirname(path), 'STALLED'), 'w') as flag:
+        flag.write(reason + '\n')
+
+
+def signal_hook(pid_file=PID_FILE, sig=signal.SIGTERM, pid=None):
+    """
+    Make a hook which signals a process, by default the one whose pid is
+    in a file next to the output.
+    """
+    def hook(path, reason):
+        flag_hook(path, reason)
+        if pid is not None:
+            os.kill(pid, sig)
+            return
+
+        with open(os.path.join(os.path.dirname(path), pid_file), 'r') as pid_lines:
+            os.kill(int(pid_lines.read().split()[0]), sig)
+
+    return hook
+
+
+def command_hook(command):
+    """
+    Make a hook which runs a command, e.g. 'scancel {job}'.
+
+    The command may contain {path}, {dir} and {reason}, and {job}, which
+    is read from a jobid file next to the output.
+    """
+    def hook(path, reason):
+        flag_hook(path, reason)
+        directory = os.path.dirname(path)
+        job = ''
+        if '{job}' in command:
+            with open(os.path.join(directory, 'jobid'), 'r') as jobid:
+                job = jobid.read().strip()
+
+        subprocess.run(shlex.split(command.format(path=path, dir=directory, reason=reason,
+                                                  job=job)), check=False)
+
+    return hook
+
+
+def monitor(paths, hook=flag_hook, interval=60, once=False, **criteria):
+    """
+    Follow outputs until every one has finished or been aborted.
+
+    hook(path, reason) is called once for every calculation which
+    stalls by the criteria of stall_reason. Returns the followers.
+    """
+    followers = [OutputFollower(path) for path in paths]
+
+    while True:
+        for follower in followers:
+            if follower.finished or follower.aborted:
+                continue
+
+            if follower.poll() > 0:
+                reason = stall_reason(follower.iterations, **criteria)
+                if reason is not None and not follower.finished:
+                    follower.aborted = True
+                    hook(follower.path, reason)
+
+        if once or all(follower.finished or follower.aborted for follower in followers):
+            return followers
+
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow running FHI-aims calculations and '
+                                     'abort those whose SCF has stalled.')
+    parser.add_argument('paths', nargs='*', help='aims.out files or their directories')
+    parser.add_argument('-e', '--element', help='follow every site of an element')
+    parser.add_argument('-l', '--layout', choices=LAYOUTS, default='fop',
+                        help='site layout used with --element (default: fop)')
+    parser.add_argument('-i', '--interval', type=float, default=60,
+                        help='seconds between polls (default: 60)')
+    parser.add_argument('--once', action='store_true', help='poll once and exit')
+    parser.add_argument('--min-iterations', type=int, default=100,
+                        help='iterations before a run can be judged (default: 100)')
+    parser.add_argument('--window', type=int, default=50,
+                        help='iterations in which the density must improve (default: 50)')
+    parser.add_argument('--improvement', type=float, default=0.9,
+                        help='factor the lowest density change must drop by (default: 0.9)')
+    parser.add_argument('--energy-tol', type=float, default=1e-4,
+                        help='energy change in eV below which a run is not stalled '
+                        '(default: 1e-4)')
+    parser.add_argument('--max-iterations', type=int,
+                        help='abort any run with more iterations than this')
+    parser.add_argument('--hook', choices=['flag', 'signal', 'command'], default='flag',
+                        help='what to do with a stalled run (default: flag)')
+    parser.add_argument('--command', help="command of the command hook, e.g. 'scancel {job}'")
+    parser.add_argument('--pid', type=int,
+                        help=f'process to signal with the signal hook (default: the one in '
+                        f'{PID_FILE} next to each output)')
+    args = parser.parse_args()
+
+    paths = [os.path.join(path, 'aims.out') if os.path.isdir(path) else path
+             for path in args.paths]
+    if args.element is not None:
+        paths += [os.path.join(directory, LAYOUTS[args.layout])
+                  for _, directory in find_sites(args.element)]
+    if len(paths) == 0:
+        parser.error('no outputs to follow')
+
+    if args.hook == 'signal':
+        hook = signal_hook(pid=args.pid)
+    elif args.hook == 'command':
+        if args.command is None:
+            parser.error('--command is required with --hook command')
+        hook = command_hook(args.command)
+    else:
+        hook = flag_hook
+
+    followers = monitor(paths, hook, args.interval, args.once,
+                        min_iterations=args.min_iterations, window=args.window,
+                        improvement=args.improvement, energy_tol=args.energy_tol,
+                        max_iterations=args.max_iterations)
+
+    for follower in followers:
+        status = 'finished' if follower.finished else 'aborted' if follower.aborted else 'running'
+        print(f'{follower.path}: {len(follower.iterations)} iterations, {status}')
+
+
+if __name__ == '__main__':
+    main()
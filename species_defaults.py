@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Look up FHI-aims species defaults without scanning the directory every time."""
+
+import json
+import os
+import re
+import tempfile
+
+from control_in import ControlIn
+
+
+DEFAULTS_DIR = 'defaults_2020'
+
+# Species default files are named like 06_C_default
+SPECIES_FILE = re.compile(r'\d+_([A-Z][a-z]?)_default')
+
+
+def cache_path(root):
+    """Get the on-disk index of a species defaults tree."""
+    cache_dir = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    name = re.sub(r'[^A-Za-z0-9]+', '_', os.path.realpath(root)).strip('_')
+
+    return os.path.join(cache_dir, 'aims_xps', f'species_{name}.json')
+
+
+class SpeciesLibrary:
+    """
+    Index of the species defaults of each basis set level.
+
+    The files of a level are listed once and the index is kept on disk,
+    with the mtime of the level directory and of each species file, so
+    it is only rebuilt when files are added, removed or changed. Every
+    index entry and species block is keyed on (level, element, file
+    mtime); blocks are read once and then served from memory.
+    """
+
+    def __init__(self, root=None, cache=True):
+        if root is None:
+            if 'SPECIES_DEFAULTS' not in os.environ:
+                raise KeyError('SPECIES_DEFAULTS is not set')
+            root = os.environ['SPECIES_DEFAULTS']
+
+        self.root = root
+        self.cache_file = cache_path(root) if cache else None
+        self.levels = self.load_index()
+        self.blocks = {}
+
+    def load_index(self):
+        """Read the on-disk index, or an empty one if there is none."""
+        if self.cache_file is None:
+            return {}
+
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as index:
+                return json.load(index)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        """Replace the on-disk index atomically, skipping it if not writable."""
+        if self.cache_file is None:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_file))
+            with os.fdopen(tmp_fd, 'w', encoding='utf-8') as tmp:
+                json.dump(self.levels, tmp, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass
+
+    def level_dir(self, level):
+        """Get the directory of a basis set level."""
+        return os.path.join(self.root, DEFAULTS_DIR, level)
+
+    def index(self, level, rebuild=False):
+        """Get the species file name and mtime of each element of a basis set level."""
+        path = self.level_dir(level)
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f'No species defaults for basis set level {level} in {path}')
+
+        entry = self.levels.get(level)
+        if rebuild or entry is None or entry['mtime'] != mtime:
+            files = {}
+            with os.scandir(path) as level_dir:
+                for species_file in level_dir:
+                    match = SPECIES_FILE.fullmatch(species_file.name)
+                    if match is not None and species_file.is_file():
+                        files[match.group(1)] = [species_file.name,
+                                                 species_file.stat().st_mtime_ns]
+
+            entry = {'mtime': mtime, 'files': files}
+            self.levels[level] = entry
+            self.save_index()
+
+        return entry['files']
+
+    def file_mtime(self, level, element):
+        """Get the mtime of the indexed species file of an element, or None if it changed."""
+        entry = self.index(level).get(element)
+        if not isinstance(entry, list):
+            return None
+
+        name, mtime = entry
+        try:
+            if os.stat(os.path.join(self.level_dir(level), name)).st_mtime_ns == mtime:
+                return mtime
+        except FileNotFoundError:
+            pass
+
+        return None
+
+    def path(self, level, element):
+        """Get the path of the species defaults of an element."""
+        # Entries whose file changed since it was indexed are stale
+        if self.file_mtime(level, element) is None:
+            self.index(level, rebuild=True)
+        files = self.index(level)
+
+        if element not in files:
+            raise FileNotFoundError(f'No {level} species defaults for {element} in '
+                                    f'{self.level_dir(level)}')
+
+        return os.path.join(self.level_dir(level), files[element][0])
+
+    def lines(self, level, element):
+        """Get the lines of the species defaults of an element."""
+        path = self.path(level, element)
+        key = (level, element, self.index(level)[element][1])
+
+        if key not in self.blocks:
+            with open(path, 'r') as species_file:
+                self.blocks[key] = species_file.readlines()
+
+        return self.blocks[key]
+
+    def species(self, level, element):
+        """Get the parsed species defaults of an element."""
+        return ControlIn(self.lines(level, element))
+
+
+_libraries = {}
+
+
+def get_library(root=None):
+    """Get the shared species library of a species defaults tree."""
+    if root is None:
+        root = os.environ.get('SPECIES_DEFAULTS')
+
+    if root not in _libraries:
+        _libraries[root] = SpeciesLibrary(root)
+
+    return _libraries[root]
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Stage restart files between the stages of FOP calculations without copying them."""
+
+import argparse
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import profiling
+from control_in import ControlIn
+from harvest import find_sites, read_final_energy
+
+
+# Stages whose restart files are read by the next stage
+CHAINS = {
+    'fop_di': [('init_1', 'init_2'), ('init_2', 'hole')],
+    'fop_si': [('init', 'hole')]
+}
+
+# Ways to stage a file, from cheapest to most expensive
+METHODS = ['reflink', 'hardlink', 'symlink', 'copy']
+RESTART_PREFIX = 'restart'
+
+# Sites staged so far, one JSON line per site, kept next to the site directories
+JOURNAL_FILE = '.stage_journal.jsonl'
+
+# Linux ioctl to share the extents of one file with another
+FICLONE = 0x40049409
+
+
+def reflink(src, dst):
+    """Clone a file by sharing its extents, on filesystems which support it."""
+    try:
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+    except OSError:
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        raise
+
+
+def symlink(src, dst):
+    """Link to a file with a path relative to the link."""
+    os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst)
+
+
+LINKERS = {
+    'reflink': reflink,
+    'hardlink': os.link,
+    'symlink': symlink,
+    'copy': shutil.copyfile
+}
+
+
+def checksum(path, block_size=2**20):
+    """Hash the contents of a file."""
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(path, 'rb') as data:
+        for block in iter(lambda: data.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def verify_file(src, dst, verify=None):
+    """Check that a staged file matches its source by 'size' or 'checksum'."""
+    if verify is None:
+        return
+
+    if os.path.getsize(src) != os.path.getsize(dst):
+        raise OSError(errno.EIO, f'Size of staged file differs from {src}', dst)
+
+    if verify == 'checksum' and checksum(src) != checksum(dst):
+        raise OSError(errno.EIO, f'Checksum of staged file differs from {src}', dst)
+
+
+def restart_files(stage_dir):
+    """Get the names of the restart files in a stage directory."""
+    with os.scandir(stage_dir) as files:
+        return sorted(entry.name for entry in files
+                      if entry.name.startswith(RESTART_PREFIX) and entry.is_file())
+
+
+def writes_restart(stage_dir):
+    """Check if the control.in of a stage writes to the restart file it reads."""
+    try:
+        control = ControlIn.read(os.path.join(stage_dir, 'control.in'))
+    except FileNotFoundError:
+        return True
+
+    return len(control.keyword('restart')) > 0 or len(control.keyword('restart_write_only')) > 0
+
+
+def safe_methods(methods, stage_dir):
+    """
+    Drop the methods which share data with the source for a stage that
+    writes its restart file, as it would overwrite the source as well.
+    """
+    if not writes_restart(stage_dir):
+        return methods
+
+    methods = [method for method in methods if method not in ('hardlink', 'symlink')]
+    return methods if methods else ['copy']
+
+
+@profiling.timed()
+def stage_file(src, dst, methods=METHODS, move=False, verify=None):
+    """
+    Stage one file, returning the method which was used.
+
+    With move, the file is renamed, which falls back to copying and
+    removing the source across filesystems. Otherwise methods are tried
+    in order until one works.
+    """
+    if os.path.lexists(dst):
+        os.unlink(dst)
+
+    if move:
+        try:
+            os.rename(src, dst)
+            return 'move'
+        except OSError as err:
+            if err.errno != errno.EXDEV:
+                raise
+
+        shutil.copyfile(src, dst)
+        verify_file(src, dst, verify)
+        os.unlink(src)
+        return 'copy'
+
+    for n, method in enumerate(methods):
+        try:
+            LINKERS[method](src, dst)
+            break
+        except OSError:
+            if n == len(methods) - 1:
+                raise
+
+    verify_file(src, dst, verify)
+    return method
+
+
+def source_finished(stage_dir):
+    """Check if the calculation of a stage has written its final energy."""
+    try:
+        return read_final_energy(os.path.join(stage_dir, 'aims.out')) is not None
+    except FileNotFoundError:
+        return False
+
+
+def stage_site(site_dir, src_stage, dst_stage, methods=METHODS, move=False, verify=None):
+    """
+    Stage the restart files of one site.
+
+    Returns the (method, size) of each staged file, by file name.
+    """
+    src_dir = os.path.join(site_dir, src_stage)
+    dst_dir = os.path.join(site_dir, dst_stage)
+    methods = safe_methods(methods, dst_dir)
+    staged = {}
+
+    for name in restart_files(src_dir):
+        src = os.path.join(src_dir, name)
+        size = os.path.getsize(src)
+        staged[name] = (stage_file(src, os.path.join(dst_dir, name), methods, move, verify),
+                        size)
+        profiling.count(f'files staged ({staged[name][0]})')
+        profiling.count('bytes staged', size)
+
+    return staged
+
+
+def journal_key(directory, src_stage, dst_stage):
+    """Get the journal entry name of one site and stage transition."""
+    return f'{directory}/{src_stage}->{dst_stage}'
+
+
+def load_journal(root='./'):
+    """Read the staged files of each site from the journal."""
+    journal = {}
+
+    try:
+        with open(os.path.join(root, JOURNAL_FILE), 'r', encoding='utf-8') as lines:
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut off by an interrupted run
+                    continue
+                journal[entry['site']] = entry['files']
+    except FileNotFoundError:
+        pass
+
+    return journal
+
+
+def already_staged(dst_dir, files):
+    """Check if the files a journal entry recorded are still in place."""
+    for name, size in files.items():
+        try:
+            if os.path.getsize(os.path.join(dst_dir, name)) != size:
+                return False
+        except FileNotFoundError:
+            return False
+
+    return True
+
+
+def stage_restarts(method, element, step=1, root='./', methods=METHODS, move=False,
+                   verify=None, workers=8, journal=True):
+    """
+    Stage the restart files of every site of an element concurrently.
+
+    step is the transition of the method's stage chain, starting from 1,
+    so for fop_di step 1 is init_1 -> init_2 and step 2 is init_2 -> hole.
+    Sites whose source stage has no final energy are skipped, as are
+    sites the journal records as staged, so an interrupted run resumes
+    where it stopped.
+
+    Returns a report with the number of files staged with each method,
+    the staged files and bytes, the elapsed time and the skipped sites.
+    """
+    src_stage, dst_stage = CHAINS[method][step - 1]
+    done = load_journal(root) if journal else {}
+    report = {'methods': Counter(), 'files': 0, 'bytes': 0, 'seconds': 0.0,
+              'skipped': Counter()}
+    start = time.perf_counter()
+
+    todo = []
+    for _, directory in find_sites(element, root):
+        site_dir = os.path.join(root, directory)
+        key = journal_key(directory, src_stage, dst_stage)
+
+        if not os.path.isdir(os.path.join(site_dir, dst_stage)):
+            print(f'{directory}/{dst_stage} does not exist, skipping')
+            report['skipped']['missing'] += 1
+        elif key in done and already_staged(os.path.join(site_dir, dst_stage), done[key]):
+            report['skipped']['staged'] += 1
+        else:
+            todo.append(directory)
+
+    def stage(site_dir):
+        if not source_finished(os.path.join(site_dir, src_stage)):
+            return None
+        return stage_site(site_dir, src_stage, dst_stage, methods, move, verify)
+
+    journal_path = os.path.join(root, JOURNAL_FILE) if journal else os.devnull
+
+    with open(journal_path, 'a', encoding='utf-8') as journal_file:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = {executor.submit(stage, os.path.join(root, directory)): directory
+                       for directory in todo}
+
+            for future in as_completed(futures):
+                directory = futures[future]
+                staged = future.result()
+
+                if staged is None:
+                    print(f'{directory}/{src_stage} has not finished, skipping')
+                    report['skipped']['unfinished'] += 1
+                    continue
+
+                for file_method, size in staged.values():
+                    report['methods'][file_method] += 1
+                    report['bytes'] += size
+                report['files'] += len(staged)
+                profiling.count('sites processed')
+
+                # Record each site as soon as it is done
+                files = {name: size for name, (_, size) in staged.items()}
+                key = journal_key(directory, src_stage, dst_stage)
+                journal_file.write(json.dumps({'site': key, 'files': files}) + '\n')
+                journal_file.flush()
+
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def print_report(report, src_stage, dst_stage):
+    """Print the staged files and throughput of a staging run."""
+    summary = ', '.join(f'{method} {count}' for method, count in report['methods'].items())
+    print(f'Staged {report["files"]} restart files from {src_stage} to {dst_stage}'
+          + (f' ({summary})' if summary else ''))
+
+    skipped = ', '.join(f'{reason} {count}' for reason, count in report['skipped'].items())
+    if skipped:
+        print(f'Skipped sites: {skipped}')
+
+    seconds = max(report['seconds'], 1e-9)
+    print(f'{report["bytes"] / 1e9:.3f} GB in {report["seconds"]:.2f} s: '
+          f'{report["bytes"] / 1e9 / seconds:.3f} GB/s, {report["files"] / seconds:.1f} files/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stage restart files for the next stage '
+                                     'of FOP calculations.')
+    parser.add_argument('method', choices=CHAINS, help='type of calculation')
+    parser.add_argument('-e', '--element', help='target element')
+    parser.add_argument('-s', '--step', type=int,
+                        help='stage transition, 1 (init_1 -> init_2) or 2 (init_2 -> hole) '
+                        'for fop_di')
+    parser.add_argument('-m', '--methods', nargs='+', choices=METHODS, default=METHODS,
+                        help='ways to stage the files, in order of preference')
+    parser.add_argument('--move', action='store_true',
+                        help='move the files instead of linking them')
+    parser.add_argument('--verify', choices=['size', 'checksum'],
+                        help='check the staged files against their source')
+    parser.add_argument('-w', '--workers', type=int, default=8,
+                        help='number of sites to stage at once (default: 8)')
+    parser.add_argument('--no-journal', action='store_true',
+                        help='stage every site again and do not record the staged sites')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
+    chain = CHAINS[args.method]
+    if args.step is None:
+        if len(chain) > 1:
+            parser.error(f'--step is required for {args.method}')
+        args.step = 1
+    elif not 1 <= args.step <= len(chain):
+        parser.error(f'--step must be between 1 and {len(chain)} for {args.method}')
+
+    if args.element is None:
+        args.element = str(input('Enter atom: '))
+
+    report = stage_restarts(args.method, args.element, args.step, methods=args.methods,
+                            move=args.move, verify=args.verify, workers=args.workers,
+                            journal=not args.no_journal)
+    print_report(report, *chain[args.step - 1])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Predict the binding energies of every site of an element from the sites
+already calculated, and choose which sites to calculate next.
+
+The model is Gaussian process regression, i.e. kernel ridge regression
+with an uncertainty, on the environment descriptors of environment.py.
+"""
+
+import argparse
+import os
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve, solve_triangular
+
+import profiling
+from environment import CUTOFF, descriptors
+from geometry_in import Geometry
+from harvest import harvest_energies, read_final_energy
+
+
+PREDICTED_FILE = '{element}_surrogate.txt'
+PREDICTED_PEAKS_FILE = '{element}_predicted_xps_peaks.txt'
+NEXT_SITES_FILE = '{element}_next_sites.txt'
+
+# Spread of the binding energies in eV assumed before two sites are known
+PRIOR_STD = 1.0
+LENGTH_SCALES = (0.25, 0.5, 1.0, 2.0, 4.0)
+
+
+def squared_distances(a, b):
+    """Get the squared distances between the rows of a and b."""
+    d2 = (a * a).sum(axis=1)[:, None] + (b * b).sum(axis=1)[None, :] - 2 * a @ b.T
+    return np.maximum(d2, 0)
+
+
+def median_distance(vectors, size=1000, seed=0):
+    """Get the median distance between descriptors, from a sample of at most size."""
+    if len(vectors) > size:
+        vectors = vectors[np.random.default_rng(seed).choice(len(vectors), size, replace=False)]
+
+    d2 = squared_distances(vectors, vectors)[np.triu_indices(len(vectors), 1)]
+    median = np.sqrt(np.median(d2)) if len(d2) else 1.0
+
+    return median if median > 0 else 1.0
+
+
+class Surrogate:
+    """
+    Gaussian process on site descriptors with a squared exponential kernel.
+
+    noise is the standard deviation of the calculated energies in eV. The
+    length scale is chosen from multiples of the median descriptor
+    distance by the marginal likelihood of the training energies.
+    """
+
+    def __init__(self, vectors, noise=0.02):
+        self.vectors = np.asarray(vectors, dtype=float)
+        self.noise = noise
+        self.scale = median_distance(self.vectors)
+        self.length = self.scale
+        self.mean = 0.0
+        self.variance = PRIOR_STD**2
+        self.train = np.array([], dtype=int)
+
+    def kernel(self, a, b, length=None):
+        """Get the kernel matrix between descriptor rows a and b."""
+        length = self.length if length is None else length
+        return self.variance * np.exp(-squared_distances(a, b) / (2 * length**2))
+
+    def log_likelihood(self, x, y, length):
+        """Get the log marginal likelihood of energies y at descriptors x."""
+        k = self.kernel(x, x, length) + self.noise**2 * np.eye(len(x))
+        factor = cho_factor(k, lower=True)
+        alpha = cho_solve(factor, y)
+
+        return -0.5 * y @ alpha - np.log(np.diag(factor[0])).sum()
+
+    @profiling.timed()
+    def fit(self, train, energies):
+        """Fit the model to the energies of the sites with descriptor indices train."""
+        self.train = np.asarray(train, dtype=int)
+        energies = np.asarray(energies, dtype=float)
+        x = self.vectors[self.train]
+
+        self.mean = energies.mean() if len(energies) else 0.0
+        if len(energies) > 1:
+            self.variance = max(energies.var(), self.noise**2)
+        y = energies - self.mean
+
+        if len(energies) > 2:
+            self.length = max((self.scale * f for f in LENGTH_SCALES),
+                              key=lambda length: self.log_likelihood(x, y, length))
+
+        self.factor = np.zeros((0, 0))
+        self.alpha = np.zeros(0)
+        if len(x):
+            self.factor = np.linalg.cholesky(self.kernel(x, x) + self.noise**2 * np.eye(len(x)))
+            self.alpha = cho_solve((self.factor, True), y)
+
+        return self
+
+    def training_columns(self, x):
+        """Get the training kernel columns of descriptors x solved by the Cholesky factor."""
+        k = self.kernel(self.vectors[self.train], x)
+        if not len(self.train):
+            return k
+
+        return solve_triangular(self.factor, k, lower=True)
+
+    @profiling.timed()
+    def predict(self, sites=None):
+        """Get the predicted energies and their standard deviations at some or all sites."""
+        x = self.vectors if sites is None else self.vectors[sites]
+        mean = self.mean + self.kernel(x, self.vectors[self.train]) @ self.alpha
+
+        v = self.training_columns(x)
+        var = self.variance - (v * v).sum(axis=0)
+
+        return mean, np.sqrt(np.maximum(var, 0))
+
+    @profiling.timed()
+    def select(self, tol, limit=None):
+        """
+        Choose sites to calculate until no predicted standard deviation is
+        above tol, or limit sites are chosen.
+
+        The variances do not depend on the energies, so each chosen site
+        is added to the model as if it had been calculated before the
+        next one is chosen, the one with the largest remaining variance.
+        This is a pivoted Cholesky decomposition of the posterior
+        covariance, one column per chosen site.
+        """
+        v = self.training_columns(self.vectors)
+        var = np.maximum(self.variance - (v * v).sum(axis=0), 0)
+        var[self.train] = 0
+
+        chosen = []
+        columns = []
+        limit = len(self.vectors) if limit is None else limit
+
+        while len(chosen) < limit:
+            site = np.argmax(var)
+            if np.sqrt(var[site]) <= tol:
+                break
+
+            covariance = (self.kernel(self.vectors, self.vectors[site:site + 1])[:, 0]
+                          - v.T @ v[:, site])
+            for column in columns:
+                covariance -= column * column[site]
+
+            column = covariance / np.sqrt(var[site] + self.noise**2)
+            var = np.maximum(var - column**2, 0)
+            var[site] = 0
+
+            columns.append(column)
+            chosen.append(site)
+
+        return chosen
+
+
+def read_training(element, layout, root):
+    """Get the (site, binding energy) of every calculated site."""
+    ground = float(read_final_energy(os.path.join(root, 'ground', 'aims.out')))
+
+    return [(site, energy - ground) for site, energy in harvest_energies(element, layout, root)
+            if energy is not None]
+
+
+def write_predictions(element, mean, std, computed, root='./'):
+    """
+    Write the prediction of every site and the peaks file of the predicted
+    spectrum.
+
+    computed holds the calculated binding energy of each calculated site,
+    by site number, which replaces its prediction in the peaks file.
+    """
+    path = os.path.join(root, PREDICTED_FILE.format(element=element))
+    with open(path, 'w') as out:
+        out.write('# site energy std computed\n')
+        for site, (energy, sigma) in enumerate(zip(mean, std), start=1):
+            out.write(f'{site} {energy} {sigma} {int(site in computed)}\n')
+
+    with open(os.path.join(root, PREDICTED_PEAKS_FILE.format(element=element)), 'w') as peaks:
+        for site, energy in enumerate(mean, start=1):
+            peaks.write(f'{computed.get(site, energy)}\n')
+
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Predict the binding energies of the sites of '
+                                     'an element and choose which to calculate next.')
+    parser.add_argument('-e', '--element', help='target element')
+    parser.add_argument('-m', '--method', choices=['fop', 'fob'], default='fop',
+                        help='layout of the calculated sites (default: fop)')
+    parser.add_argument('-r', '--root', default='./',
+                        help='directory of ground and the core hole directories (default: ./)')
+    parser.add_argument('-t', '--tol', type=float, default=0.1,
+                        help='target standard deviation of every peak in eV (default: 0.1)')
+    parser.add_argument('-n', '--limit', type=int,
+                        help='largest number of sites to choose (default: no limit)')
+    parser.add_argument('--noise', type=float, default=0.02,
+                        help='standard deviation of the calculated energies in eV '
+                        '(default: 0.02)')
+    parser.add_argument('-c', '--cutoff', type=float, default=CUTOFF,
+                        help=f'radius of the environments in Angstrom (default: {CUTOFF})')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
+    if args.element is None:
+        args.element = str(input('Enter atom: '))
+
+    geometry = Geometry.read(os.path.join(args.root, 'ground', 'geometry.in'))
+    indices = geometry.element_indices(args.element)
+    if len(indices) == 0:
+        print(f'No {args.element} atoms in the geometry')
+        exit(1)
+
+    training = [(site, energy) for site, energy in read_training(args.element, args.method,
+                                                                 args.root)
+                if site <= len(indices)]
+    model = Surrogate(descriptors(geometry, indices, args.cutoff), args.noise)
+    model.fit([site - 1 for site, _ in training], [energy for _, energy in training])
+
+    mean, std = model.predict()
+    computed = dict(training)
+    path = write_predictions(args.element, mean, std, computed, args.root)
+
+    chosen = sorted(site + 1 for site in model.select(args.tol, args.limit))
+    next_path = os.path.join(args.root, NEXT_SITES_FILE.format(element=args.element))
+    with open(next_path, 'w') as out:
+        out.write(' '.join(map(str, chosen)) + '\n')
+
+    print(f'{len(training)} of {len(indices)} sites calculated, largest predicted std '
+          f'{std.max():.3f} eV, predictions written to {path}')
+    if chosen:
+        print(f'{len(chosen)} sites to calculate next written to {next_path}, e.g. for '
+              f'generate.py -e {args.element} -a $(cat {next_path})')
+    else:
+        print(f'Every site is predicted within {args.tol} eV')
+
+
+if __name__ == '__main__':
+    main()
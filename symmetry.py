@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Find the symmetry-equivalent atoms of an element in a geometry.in."""
+
+import argparse
+import itertools
+
+import numpy as np
+
+from geometry_in import Geometry
+from harvest import write_site_weights
+
+
+def union_classes(n, mappings):
+    """Group 0..n-1 into the classes joined by any of the mappings."""
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for mapping in mappings:
+        for i, j in enumerate(mapping):
+            parent[find(i)] = find(j)
+
+    classes = {}
+    for i in range(n):
+        classes.setdefault(find(i), []).append(i)
+
+    return sorted(classes.values())
+
+
+def match_atoms(images, positions, species, tol, lattice=None):
+    """
+    Get the atom each image lands on, or None if any image lands on no
+    atom of its species. With a lattice, positions and images are
+    fractional and compared up to lattice translations.
+    """
+    diff = images[:, None, :] - positions[None, :, :]
+    if lattice is not None:
+        diff -= np.round(diff)
+        diff = diff @ lattice
+
+    close = (np.einsum('ijk,ijk->ij', diff, diff) < tol**2) & \
+        (species[:, None] == species[None, :])
+    if not close.any(axis=1).all():
+        return None
+
+    return close.argmax(axis=1)
+
+
+def lattice_lengths(metric):
+    """Get the lengths of the lattice vectors and of the sums of each pair from metrics."""
+    i, j = np.triu_indices(3)
+    squares = metric[..., i, i] + metric[..., j, j] + 2 * metric[..., i, j]
+    squares = np.where(i == j, squares / 4, squares)
+
+    return np.sqrt(np.maximum(squares, 0))
+
+
+def lattice_rotations(lattice, tol):
+    """
+    Get the integer matrices which map the lattice onto itself.
+
+    The lengths of the mapped lattice vectors and of their pairwise sums,
+    which fix the metric, must be within tol Angstrom of the original ones.
+    """
+    candidates = np.array(list(itertools.product((-1, 0, 1), repeat=9))).reshape(-1, 3, 3)
+    candidates = candidates[np.abs(np.round(np.linalg.det(candidates))) == 1]
+
+    # f -> W f keeps the metric for a symmetry of the lattice
+    metric = lattice @ lattice.T
+    kept = np.einsum('nji,jk,nkl->nil', candidates, metric, candidates)
+    change = np.abs(lattice_lengths(kept) - lattice_lengths(metric))
+
+    return candidates[change.max(axis=1) < tol]
+
+
+def periodic_mappings(geometry, tol):
+    """Get the atom permutations of the space group operations of a periodic geometry."""
+    lattice = geometry.lattice
+    frac = geometry.cartesian() @ np.linalg.inv(lattice)
+    frac -= np.floor(frac)
+    species = geometry.species
+
+    # Translations map the first atom of the rarest species onto the others
+    counts = np.bincount(species)
+    rare = np.flatnonzero(species == np.argmin(np.where(counts > 0, counts, len(species) + 1)))
+
+    mappings = []
+    for rotation in lattice_rotations(lattice, tol):
+        rotated = frac @ rotation.T
+
+        for target in rare:
+            mapping = match_atoms(rotated + frac[target] - rotated[rare[0]], frac, species, tol,
+                                  lattice)
+            if mapping is not None:
+                mappings.append(mapping)
+
+    return mappings
+
+
+def frame(a, b):
+    """Get the orthonormal frame with its first axis along a and b in its first plane."""
+    e1 = a / np.linalg.norm(a)
+    e2 = b - (b @ e1) * e1
+    e2 /= np.linalg.norm(e2)
+
+    return np.column_stack((e1, e2, np.cross(e1, e2)))
+
+
+def molecule_mappings(geometry, tol):
+    """
+    Get the atom permutations of the point group operations of a molecule.
+
+    The operations keep the centroid fixed. Each one is found by aligning
+    the frame of two reference atoms with the frame of two atoms of the
+    same species at the same distances and angle, with and without a
+    reflection.
+    """
+    positions = geometry.cartesian()
+    positions = positions - positions.mean(axis=0)
+    species = geometry.species
+    norms = np.linalg.norm(positions, axis=1)
+
+    operations = [np.eye(3), -np.eye(3)]
+    off_centre = np.flatnonzero(norms > tol)
+
+    if len(off_centre) > 0:
+        # First reference atom from the species with the fewest atoms off the centre
+        counts = np.bincount(species[off_centre], minlength=len(geometry.species_names))
+        counts[counts == 0] = len(species) + 1
+        first = off_centre[species[off_centre] == np.argmin(counts)][0]
+        a = positions[first]
+
+        # Second reference atom as far from the line of the first as possible
+        cross = np.linalg.norm(np.cross(a, positions), axis=1)
+        second = np.argmax(cross)
+
+        if cross[second] > tol * norms[first]:
+            b = positions[second]
+            reference = frame(a, b)
+            angle_tol = tol * (norms[first] + norms[second])
+
+            firsts = np.flatnonzero((species == species[first])
+                                    & (np.abs(norms - norms[first]) < tol))
+            seconds = np.flatnonzero((species == species[second])
+                                     & (np.abs(norms - norms[second]) < tol))
+
+            for i in firsts:
+                for j in seconds:
+                    if i == j or abs(positions[i] @ positions[j] - a @ b) > angle_tol:
+                        continue
+
+                    target = frame(positions[i], positions[j])
+                    operations.append(target @ reference.T)
+                    operations.append(target @ np.diag([1, 1, -1]) @ reference.T)
+
+    mappings = []
+    for operation in operations:
+        mapping = match_atoms(positions @ operation.T, positions, species, tol)
+        if mapping is not None:
+            mappings.append(mapping)
+
+    return mappings
+
+
+def spglib_classes(geometry, tol):
+    """Get the classes of equivalent atoms from spglib, or None if it is not installed."""
+    try:
+        import spglib
+    except ImportError:
+        return None
+
+    frac = geometry.cartesian() @ np.linalg.inv(geometry.lattice)
+    dataset = spglib.get_symmetry_dataset((geometry.lattice, frac, geometry.species), symprec=tol)
+    if dataset is None:
+        return None
+
+    equivalent = getattr(dataset, 'equivalent_atoms', None)
+    if equivalent is None:
+        equivalent = dataset['equivalent_atoms']
+
+    return union_classes(len(equivalent), [equivalent])
+
+
+def equivalent_atoms(geometry, tol=1e-3):
+    """Get the classes of symmetry-equivalent atoms of a geometry, as atom indices."""
+    if geometry.periodic:
+        classes = spglib_classes(geometry, tol)
+        if classes is not None:
+            return classes
+        mappings = periodic_mappings(geometry, tol)
+    else:
+        mappings = molecule_mappings(geometry, tol)
+
+    return union_classes(len(geometry.species), mappings)
+
+
+def equivalent_sites(geometry, element, tol=1e-3):
+    """
+    Get the classes of symmetry-equivalent sites of an element.
+
+    Sites are numbered from 1 in the order of the element's atoms in
+    geometry.in, as in the core hole directory names. Each class is
+    sorted, so its first site is its representative.
+    """
+    site_numbers = {atom: n + 1 for n, atom in enumerate(geometry.element_indices(element))}
+
+    return [[site_numbers[atom] for atom in atoms]
+            for atoms in equivalent_atoms(geometry, tol) if atoms[0] in site_numbers]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the symmetry-equivalent sites of an '
+                                     'element and write their multiplicities.')
+    parser.add_argument('-e', '--element', help='target element')
+    parser.add_argument('-g', '--geometry', default='geometry.in',
+                        help='geometry file (default: geometry.in)')
+    parser.add_argument('-t', '--tol', type=float, default=1e-3,
+                        help='distance tolerance in Angstrom (default: 1e-3)')
+    parser.add_argument('-r', '--root', default='../',
+                        help='directory of the core hole directories (default: ../)')
+    args = parser.parse_args()
+
+    if args.element is None:
+        args.element = str(input('Enter atom: '))
+
+    classes = equivalent_sites(Geometry.read(args.geometry), args.element, args.tol)
+    path = write_site_weights(args.element, classes, args.root)
+
+    for sites in classes:
+        print(f'{args.element}{sites[0]}: {len(sites)} sites ({" ".join(map(str, sites))})')
+    print(f'{len(classes)} inequivalent sites written to {path}')
+
+
+if __name__ == '__main__':
+    main()
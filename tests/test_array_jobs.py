@@ -0,0 +1,45 @@
+import os
+import subprocess
+
+import pytest
+
+from array_jobs import write_array_jobs
+
+
+def test_no_sites_is_an_error(tmp_path):
+    with pytest.raises(ValueError):
+        write_array_jobs('fop_di', 'C', [], str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_stages_are_chained(tmp_path):
+    scripts = write_array_jobs('fop_di', 'C', ['C1', 'C2'], str(tmp_path))
+    with open(scripts[-1]) as submit:
+        lines = [line.split() for line in submit if line.startswith('job=')]
+
+    submitted = [line[-1].rstrip(')') for line in lines]
+    assert submitted == ['C_init_1.slurm', 'C_init_2_restart.slurm', 'C_init_2.slurm',
+                         'C_hole_restart.slurm', 'C_hole.slurm']
+    assert all(any(word.startswith('--dependency=afterok:') for word in line)
+               for line in lines[1:])
+
+    with open(tmp_path / 'C_hole_restart.slurm') as restart:
+        assert 'stage_restart.py fop_di -e C -s 2 --move' in restart.read()
+
+
+@pytest.mark.parametrize('step, code', [('true', 0), ('false', 1)])
+def test_failed_step_fails_the_task(tmp_path, step, code):
+    for site in ('C1', 'C2', 'C3'):
+        os.makedirs(tmp_path / site / 'init')
+    # Only C2 runs the step under test
+    step = f'bash -c \'[[ $PWD != */C2/* ]] || {step}\''
+    scripts = write_array_jobs('fop_si', 'C', ['C1', 'C2', 'C3'], str(tmp_path), per_task=3,
+                               parallel=2, step=step)
+
+    env = dict(os.environ, SLURM_ARRAY_TASK_ID='0', SLURM_SUBMIT_DIR=str(tmp_path))
+    env.pop('DRY_RUN', None)
+    result = subprocess.run(['bash', scripts[0]], env=env)
+
+    assert result.returncode == code
+    for site in ('C1', 'C2', 'C3'):
+        assert os.path.isfile(tmp_path / site / 'init' / 'aims.pid')
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from environment import cluster_sites, descriptors
+from geometry_in import Geometry
+
+
+def cu_slab(shift=(0.0, 0.0, 0.0)):
+    """A 2x2 Cu(100) slab of three layers with an adatom, moved by shift."""
+    a = 3.61 / np.sqrt(2)
+    lattice = np.array([[2 * a, 0.0, 0.0], [0.0, 2 * a, 0.0], [0.0, 0.0, 20.0]])
+    atoms = [(i * a + (layer % 2) * a / 2, j * a + (layer % 2) * a / 2, layer * 1.805)
+             for layer in range(3) for i in range(2) for j in range(2)]
+    atoms.append((a / 2, a / 2, 3 * 1.805 + 0.2))
+
+    lines = [f'lattice_vector {x} {y} {z}\n' for x, y, z in lattice]
+    lines += [f'atom {x + shift[0]} {y + shift[1]} {z + shift[2]} Cu\n' for x, y, z in atoms]
+    return Geometry(lines), lattice
+
+
+@pytest.mark.parametrize('vector', [0, 1, 2])
+def test_lattice_translation_keeps_environments(vector):
+    geometry, lattice = cu_slab()
+    shifted, _ = cu_slab(lattice[vector])
+    indices = geometry.element_indices('Cu')
+
+    np.testing.assert_allclose(descriptors(shifted, indices), descriptors(geometry, indices),
+                               atol=1e-9)
+    assert cluster_sites(shifted, 'Cu', 0.05) == cluster_sites(geometry, 'Cu', 0.05)
@@ -0,0 +1,35 @@
+import os
+import shutil
+
+import pytest
+
+from generate import generate_system
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'generate')
+
+
+def tree(root):
+    """Get the contents of every file below root, by relative path."""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as data:
+                files[os.path.relpath(path, root)] = data.read()
+    return files
+
+
+@pytest.mark.parametrize('method, ks_states', [('fop_di', [5, 20]), ('fop_si', None),
+                                               ('fob', None)])
+def test_generated_files_match_the_baseline(tmp_path, monkeypatch, method, ks_states):
+    # The expected files were written by the original interactive generators
+    monkeypatch.setenv('SPECIES_DEFAULTS', os.path.join(DATA, 'species'))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    structure = tmp_path / 'structure'
+    shutil.copytree(os.path.join(DATA, 'ground'), structure / 'ground')
+
+    generate_system(method, str(structure / 'ground'), 'C', basis_set='tight',
+                    ks_states=ks_states)
+
+    shutil.rmtree(structure / 'ground')
+    assert tree(structure) == tree(os.path.join(DATA, 'expected', method))
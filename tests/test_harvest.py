@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import harvest
+from harvest import ENERGY_LINE, INDEX_FILE, harvest_energies, load_index, save_index
+
+
+def write_out(path, energy, mtime_ns=None):
+    with open(path, 'w') as out:
+        out.write('  | Time for this iteration  :  1.000 s\n')
+        out.write(f'  | Total energy of the DFT / Hartree-Fock {ENERGY_LINE}  {energy} eV\n')
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def make_sites(root, energies):
+    for n, energy in enumerate(energies, start=1):
+        os.makedirs(os.path.join(root, f'C{n}', 'hole'))
+        if energy is not None:
+            write_out(os.path.join(root, f'C{n}', 'hole', 'aims.out'), energy, 10**18)
+
+
+def harvest_sites(root, **options):
+    return harvest_energies('C', 'fop', str(root), **options)
+
+
+def test_changed_outputs_are_read_again(tmp_path, monkeypatch):
+    make_sites(tmp_path, ['-10.50', '-20.50', None])
+    assert harvest_sites(tmp_path) == [(1, -10.5), (2, -20.5), (3, None)]
+    out = str(tmp_path / 'C1' / 'hole' / 'aims.out')
+
+    # A new size
+    write_out(out, '-10.625', 10**18)
+    assert harvest_sites(tmp_path)[0] == (1, -10.625)
+
+    # The same size and a new mtime, with a different tail
+    write_out(out, '-10.750', 2 * 10**18)
+    assert harvest_sites(tmp_path)[0] == (1, -10.75)
+
+    # A new output where there was none
+    write_out(str(tmp_path / 'C3' / 'hole' / 'aims.out'), '-30.5')
+    assert harvest_sites(tmp_path)[2] == (3, -30.5)
+
+    # Only a new mtime with the same tail keeps the cached energy
+    monkeypatch.setattr(harvest, 'read_final_energy', lambda path: pytest.fail(path))
+    os.utime(out, ns=(3 * 10**18, 3 * 10**18))
+    assert harvest_sites(tmp_path)[0] == (1, -10.75)
+    assert load_index(str(tmp_path))[os.path.join('C1', 'hole', 'aims.out')]['mtime'] == \
+        3 * 10**18
+
+
+@pytest.mark.parametrize('options', [dict(workers=1), dict(workers=4),
+                                     dict(workers=2, processes=True)])
+def test_no_cache_gives_the_same_energies(tmp_path, options):
+    make_sites(tmp_path, ['-10.5', None, '-12.25', '-11.0'])
+
+    uncached = harvest_sites(tmp_path, cache=False, **options)
+    assert not os.path.exists(tmp_path / INDEX_FILE)
+
+    assert harvest_sites(tmp_path, **options) == uncached
+    assert harvest_sites(tmp_path, **options) == uncached
+    assert uncached == [(1, -10.5), (2, None), (3, -12.25), (4, -11.0)]
+
+
+def save_entries(root, worker):
+    for n in range(20):
+        save_index({f'{worker}/{n}': {'energy': n}}, root)
+
+
+def test_concurrent_saves_keep_every_entry(tmp_path):
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(save_entries, [str(tmp_path)] * 8, range(8)))
+
+    index = load_index(str(tmp_path))
+    assert len(index) == 8 * 20
+    assert index['7/19'] == {'energy': 19}
+    assert [name for name in os.listdir(tmp_path) if name != INDEX_FILE + '.lock'] == \
+        [INDEX_FILE]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import plot_xps
+from plot_xps import get_widths
+
+
+def baseline_widths(eigenvalues, broadening, broadening2, mix1, mix2, ewid1, ewid2):
+    """The per-peak loop of the original dos_binning."""
+    sigma = np.zeros(len(eigenvalues))
+    mixing = np.zeros(len(eigenvalues))
+
+    for ei, e in enumerate(eigenvalues):
+        if e <= ewid1:
+            sigma[ei], mixing[ei] = broadening, mix1
+        elif e > ewid2:
+            sigma[ei], mixing[ei] = broadening2, mix2
+        else:
+            sigma[ei] = broadening + ((broadening2 - broadening) / (ewid2 - ewid1)) * (e - ewid1)
+            mixing[ei] = mix1 + ((mix2 - mix1) / (ewid2 - ewid1)) * (e - ewid1)
+
+    return sigma, mixing
+
+
+@pytest.mark.parametrize('ewid1, ewid2', [(286.0, 287.0), (287.0, 286.0), (286.5, 286.5)])
+def test_get_widths_matches_baseline(ewid1, ewid2):
+    eigenvalues = np.linspace(284.0, 289.0, 101)
+    args = (0.7, 1.1, 0.3, 0.6, ewid1, ewid2)
+
+    for got, expected in zip(get_widths(eigenvalues, *args), baseline_widths(eigenvalues, *args)):
+        np.testing.assert_allclose(got, expected, rtol=1e-14)
+
+
+@pytest.mark.parametrize('mix1, mix2', [(0.0, 0.0), (0.3, 0.3), (0.2, 0.5)])
+def test_sparse_binning_matches_direct(monkeypatch, mix1, mix2):
+    rng = np.random.default_rng(0)
+    peaks = rng.uniform(283.0, 290.0, 500)
+    options = dict(broadening=0.7, broadening2=1.1, mix1=mix1, mix2=mix2, start=280.0,
+                   stop=295.0, ewid1=286.0, ewid2=287.0, coeffs=rng.uniform(0.5, 2.0, 500))
+    _, expected = plot_xps.dos_binning(peaks, **options)
+
+    # Every peak is on the grid, so none may fall back to direct summation
+    def direct(*args, **kwargs):
+        raise AssertionError('dos_binning_sparse fell back to direct summation')
+    monkeypatch.setattr(plot_xps, 'dos_binning', direct)
+    _, got, tail = plot_xps.dos_binning_sparse(peaks, tol=1e-6, **options)
+
+    assert tail <= 1e-6 * options['coeffs'].sum()
+    np.testing.assert_allclose(got, expected, rtol=0, atol=1e-6 * expected.max())
+
+
+@pytest.mark.parametrize('ewid1, ewid2', [(286.0, 287.0), (287.0, 286.0), (286.5, 286.5)])
+def test_fft_binning_matches_direct(ewid1, ewid2):
+    rng = np.random.default_rng(0)
+    peaks = rng.uniform(283.0, 290.0, 500)
+    options = dict(broadening=0.7, broadening2=1.1, mix1=0.3, mix2=0.3, start=280.0,
+                   stop=295.0, ewid1=ewid1, ewid2=ewid2)
+    _, expected = plot_xps.dos_binning(peaks, **options)
+    _, got = plot_xps.dos_binning_fft(peaks, **options)
+
+    # The ramp is split into segments of one width each
+    np.testing.assert_allclose(got, expected, rtol=0, atol=2e-4 * expected.max())
@@ -0,0 +1,23 @@
+from harvest import peak_weights, write_site_weights
+from prescreen import expand_groups, group_energies
+
+
+def test_fop_weights_leave_fob_weights_alone(tmp_path):
+    root = str(tmp_path)
+    write_site_weights('C', [[1, 2], [3], [4, 5, 6]], root)
+    fob = [(1, -10.0), (3, -10.05), (4, -12.0)]
+
+    groups = group_energies(fob, 0.1)
+    assert groups == [[3, 1], [4]]
+    write_site_weights('C', expand_groups(groups, {1: [1, 2], 3: [3], 4: [4, 5, 6]}), root,
+                       layout='fop')
+
+    assert peak_weights('C', fob, root) == [2, 1, 3]
+    assert peak_weights('C', [(3, -9.0), (4, -11.0)], root, layout='fop') == [3, 3]
+
+
+def test_layout_falls_back_to_shared_weights(tmp_path):
+    write_site_weights('C', [[1, 2]], str(tmp_path))
+
+    assert peak_weights('C', [(1, -9.0)], str(tmp_path), layout='fop') == [2]
+    assert peak_weights('N', [(1, -9.0)], str(tmp_path), layout='fop') is None
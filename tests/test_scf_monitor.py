@@ -0,0 +1,78 @@
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from scf_monitor import PID_FILE, OutputFollower, monitor, signal_hook, stall_reason
+
+CRITERIA = dict(min_iterations=20, window=10, improvement=0.9, energy_tol=1e-4)
+
+
+def iteration(density, energy):
+    return (f'  | Change of charge density      :  {density:.6e}\n'
+            f'  | Change of total energy        :  {energy:.6e} eV\n'
+            f'  | Time for this iteration       :  1.000 s  1.000 s\n')
+
+
+def densities(kind, count):
+    if kind == 'converging':
+        return [10.0 ** (-0.2 * n) for n in range(count)]
+    if kind == 'stalled':
+        return [1e-2 * (1 + 0.5 * (n % 2)) for n in range(count)]
+    return [1e-3 * 1.2 ** n for n in range(count)]
+
+
+def grow(path, lines, step=7):
+    """Append lines a few at a time, cutting the last one in half, as a running aims.x does."""
+    text = ''.join(lines)
+    for start in range(0, len(text), step * 40):
+        with open(path, 'a') as out:
+            out.write(text[start:start + step * 40])
+        yield
+
+
+@pytest.mark.parametrize('kind, stalled', [('converging', False), ('stalled', True),
+                                           ('diverging', True)])
+def test_growing_output(tmp_path, kind, stalled):
+    path = str(tmp_path / 'aims.out')
+    follower = OutputFollower(path)
+    reasons = []
+
+    for _ in grow(path, [iteration(d, 0.1 * d) for d in densities(kind, 40)]):
+        follower.poll()
+        reasons.append(stall_reason(follower.iterations, **CRITERIA))
+
+    assert len(follower.iterations) == 40
+    assert [it['density'] for it in follower.iterations] == \
+        pytest.approx(densities(kind, 40), rel=1e-6)
+    assert any(reasons) == stalled
+
+
+def test_signal_hook_stops_a_fake_process(tmp_path):
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    try:
+        (tmp_path / PID_FILE).write_text(f'{process.pid}\n')
+        path = str(tmp_path / 'aims.out')
+
+        for _ in grow(path, [iteration(d, 0.1 * d) for d in densities('diverging', 40)]):
+            followers = monitor([path], signal_hook(), once=True, **CRITERIA)
+            if followers[0].aborted:
+                break
+
+        assert followers[0].aborted
+        assert process.wait(timeout=10) == -signal.SIGTERM
+        assert 'did not improve' in (tmp_path / 'STALLED').read_text()
+    finally:
+        process.kill()
+
+
+def test_finished_output_is_not_aborted(tmp_path):
+    path = tmp_path / 'aims.out'
+    lines = [iteration(d, 0.1 * d) for d in densities('stalled', 40)]
+    path.write_text(''.join(lines) + '          Have a nice day.\n')
+
+    follower = monitor([str(path)], lambda path, reason: pytest.fail(reason), once=True,
+                       **CRITERIA)[0]
+    assert follower.finished
@@ -0,0 +1,28 @@
+import os
+
+from species_defaults import DEFAULTS_DIR, SpeciesLibrary
+
+
+def write_species(path, text, mtime_ns):
+    with open(path, 'w') as species_file:
+        species_file.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_disk_index_follows_file_mtime(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    level = tmp_path / 'species' / DEFAULTS_DIR / 'light'
+    level.mkdir(parents=True)
+    species = str(level / '06_C_default')
+    write_species(species, 'species C\n', 10**18)
+    dir_mtime = os.stat(level).st_mtime_ns
+
+    assert SpeciesLibrary(str(tmp_path / 'species')).lines('light', 'C') == ['species C\n']
+
+    # Editing a file in place leaves the mtime of its directory alone
+    write_species(species, 'species C\n    hydro 2 p 1.7\n', 2 * 10**18)
+    os.utime(level, ns=(dir_mtime, dir_mtime))
+
+    library = SpeciesLibrary(str(tmp_path / 'species'))
+    assert library.lines('light', 'C') == ['species C\n', '    hydro 2 p 1.7\n']
+    assert library.levels['light']['files']['C'] == ['06_C_default', 2 * 10**18]
@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+
+import stage_restart
+from harvest import ENERGY_LINE
+from stage_restart import (JOURNAL_FILE, safe_methods, stage_file, stage_restarts, stage_site,
+                           writes_restart)
+
+
+def make_stage(site_dir, stage, finished=True, restart=None, control=None):
+    stage_dir = os.path.join(site_dir, stage)
+    os.makedirs(stage_dir)
+    if finished:
+        with open(os.path.join(stage_dir, 'aims.out'), 'w') as out:
+            out.write(f'  | Total energy of the DFT / Hartree-Fock {ENERGY_LINE}  -10.0 eV\n')
+    if restart is not None:
+        with open(os.path.join(stage_dir, 'restart_file'), 'w') as restart_file:
+            restart_file.write(restart)
+    if control is not None:
+        with open(os.path.join(stage_dir, 'control.in'), 'w') as control_in:
+            control_in.write(control)
+    return stage_dir
+
+
+def fail(src, dst):
+    raise OSError('not supported')
+
+
+def test_links_fall_back_to_copy(tmp_path, monkeypatch):
+    src = tmp_path / 'src'
+    src.write_text('data')
+    monkeypatch.setitem(stage_restart.LINKERS, 'reflink', fail)
+
+    assert stage_file(str(src), str(tmp_path / 'linked')) == 'hardlink'
+    assert os.path.samefile(src, tmp_path / 'linked')
+
+    monkeypatch.setitem(stage_restart.LINKERS, 'hardlink', fail)
+    monkeypatch.setitem(stage_restart.LINKERS, 'symlink', fail)
+    assert stage_file(str(src), str(tmp_path / 'copied'), verify='checksum') == 'copy'
+    assert not os.path.samefile(src, tmp_path / 'copied')
+    assert (tmp_path / 'copied').read_text() == 'data'
+
+
+def test_restart_writing_destination_is_never_linked(tmp_path, monkeypatch):
+    monkeypatch.setitem(stage_restart.LINKERS, 'reflink', fail)
+    make_stage(str(tmp_path), 'init', restart='init')
+    reads = make_stage(str(tmp_path), 'read', False, control='restart_read_only restart_file\n')
+    writes = make_stage(str(tmp_path), 'hole', False, control='restart restart_file\n')
+
+    assert not writes_restart(reads)
+    assert safe_methods(['hardlink', 'symlink'], writes) == ['copy']
+    assert stage_site(str(tmp_path), 'init', 'read') == {'restart_file': ('hardlink', 4)}
+    assert stage_site(str(tmp_path), 'init', 'hole') == {'restart_file': ('copy', 4)}
+
+    # Writing the destination restart leaves the source alone
+    with open(os.path.join(writes, 'restart_file'), 'w') as restart_file:
+        restart_file.write('hole restart')
+    assert (tmp_path / 'init' / 'restart_file').read_text() == 'init'
+
+
+def test_move(tmp_path):
+    make_stage(str(tmp_path), 'init', restart='init')
+    make_stage(str(tmp_path), 'hole', False)
+
+    assert stage_site(str(tmp_path), 'init', 'hole', move=True) == \
+        {'restart_file': ('move', 4)}
+    assert not os.path.exists(tmp_path / 'init' / 'restart_file')
+    assert (tmp_path / 'hole' / 'restart_file').read_text() == 'init'
+
+
+def make_sites(root, unfinished=()):
+    for n in (1, 2, 3):
+        site_dir = os.path.join(root, f'C{n}')
+        make_stage(site_dir, 'init', f'C{n}' not in unfinished, restart=f'C{n}')
+        make_stage(site_dir, 'hole', False)
+
+
+def test_unfinished_sources_are_skipped(tmp_path):
+    make_sites(str(tmp_path), unfinished=['C2'])
+
+    report = stage_restarts('fop_si', 'C', root=str(tmp_path), workers=2)
+
+    assert report['files'] == 2
+    assert report['skipped'] == {'unfinished': 1}
+    assert not os.path.exists(tmp_path / 'C2' / 'hole' / 'restart_file')
+
+
+@pytest.mark.parametrize('staged_again', [False, True])
+def test_resume_from_a_cut_off_journal(tmp_path, staged_again):
+    make_sites(str(tmp_path))
+    stage_restarts('fop_si', 'C', root=str(tmp_path), workers=1)
+    entries = (tmp_path / JOURNAL_FILE).read_text().splitlines()
+    assert len(entries) == 3
+
+    # A run interrupted while writing its third entry
+    kept = sorted(entries, key=lambda entry: json.loads(entry)['site'])[:2]
+    (tmp_path / JOURNAL_FILE).write_text('\n'.join(kept) + '\n' + entries[0][:10])
+    os.unlink(tmp_path / 'C3' / 'hole' / 'restart_file')
+    if staged_again:
+        # Staged files which went missing are staged again
+        os.unlink(tmp_path / 'C1' / 'hole' / 'restart_file')
+
+    report = stage_restarts('fop_si', 'C', root=str(tmp_path), workers=1)
+
+    assert report['files'] == (2 if staged_again else 1)
+    assert report['skipped'] == {'staged': 1 if staged_again else 2}
+    for n in (1, 2, 3):
+        assert (tmp_path / f'C{n}' / 'hole' / 'restart_file').read_text() == f'C{n}'
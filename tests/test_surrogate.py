@@ -0,0 +1,26 @@
+import numpy as np
+
+from environment import descriptors
+from surrogate import PREDICTED_PEAKS_FILE, Surrogate, write_predictions
+from test_environment import cu_slab
+
+
+def test_lattice_translation_keeps_predictions():
+    geometry, lattice = cu_slab()
+    shifted, _ = cu_slab(lattice[0] + lattice[2])
+    indices = geometry.element_indices('Cu')
+    train, energies = [0, 4, 12], [0.1, -0.3, 0.5]
+
+    expected = Surrogate(descriptors(geometry, indices)).fit(train, energies).predict()
+    got = Surrogate(descriptors(shifted, indices)).fit(train, energies).predict()
+
+    for a, b in zip(got, expected):
+        np.testing.assert_allclose(a, b, atol=1e-9)
+
+
+def test_peaks_use_computed_energies(tmp_path):
+    write_predictions('Cu', np.array([1.0, 2.0, 3.0]), np.array([0.1, 0.0, 0.2]), {2: 2.5},
+                      str(tmp_path))
+
+    peaks = np.loadtxt(tmp_path / PREDICTED_PEAKS_FILE.format(element='Cu'))
+    np.testing.assert_array_equal(peaks, [1.0, 2.5, 3.0])
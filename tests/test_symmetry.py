@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from symmetry import lattice_rotations
+
+
+@pytest.mark.parametrize('tol, count', [(1e-3, 48), (1e-4, 16)])
+def test_lattice_tolerance_is_a_length(tol, count):
+    # A 20 Angstrom cell stretched by 5e-4 Angstrom along z is cubic within 1e-3 only
+    lattice = np.diag([20.0, 20.0, 20.0005])
+
+    assert len(lattice_rotations(lattice, tol)) == count
+
+
+def test_hexagonal_lattice():
+    lattice = np.array([[2.5, 0.0, 0.0], [-1.25, 1.25 * np.sqrt(3), 0.0], [0.0, 0.0, 20.0]])
+
+    assert len(lattice_rotations(lattice, 1e-3)) == 24
@@ -0,0 +1,21 @@
+from control_in import ControlIn
+from warm_start import read_out_checks, restart_setup
+
+
+def test_out_checks_skip_the_control_echo(tmp_path):
+    out = tmp_path / 'aims.out'
+    out.write_text('  restart_write_only      restart_file\n')
+    assert read_out_checks(str(out), 'restart_file') == (False, False)
+
+    out.write_text('  restart_write_only      restart_file\n'
+                   '  Writing Kohn-Sham eigenvectors to file restart_file.\n'
+                   '          Have a nice day.\n')
+    assert read_out_checks(str(out), 'restart_file') == (True, True)
+
+
+def test_restart_setup_sees_spin():
+    ground = ControlIn(['xc pbe\n', 'spin none\n'])
+    polarised = ControlIn(['xc pbe\n', 'spin collinear\n'])
+
+    assert restart_setup(ground) != restart_setup(polarised)
+    assert restart_setup(ground) == restart_setup(ControlIn(['spin none\n', 'xc pbe\n']))
@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+from harvest import ENERGY_LINE
+from scf_monitor import PID_FILE
+from workflow import STATE_FILE, Workflow, command_launcher
+
+STAGES = ['init_1', 'init_2', 'hole']
+
+
+def make_sites(root, sites=('C1', 'C2')):
+    for site in sites:
+        for stage in STAGES:
+            os.makedirs(os.path.join(root, site, stage))
+
+
+class FakeLauncher:
+    """Record the stages run and write a final energy and restart file for each."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, stage_dir, site, stage):
+        with self.lock:
+            self.calls.append((site, stage, sorted(os.listdir(stage_dir))))
+        if (site, stage) in self.fail:
+            return 1
+
+        with open(os.path.join(stage_dir, 'aims.out'), 'w') as out:
+            out.write(f'  | Total energy of the DFT / Hartree-Fock {ENERGY_LINE}  -10.0 eV\n')
+        with open(os.path.join(stage_dir, 'restart_file'), 'w') as restart:
+            restart.write(f'{site} {stage}\n')
+        return 0
+
+    def stages(self, site):
+        return [stage for name, stage, _ in self.calls if name == site]
+
+
+def read_state(root):
+    with open(os.path.join(root, STATE_FILE)) as state:
+        return json.load(state)
+
+
+def test_sites_run_their_stages_in_order(tmp_path):
+    make_sites(tmp_path)
+    launcher = FakeLauncher()
+
+    ended = Workflow('fop_di', 'C', launcher, str(tmp_path), limit=2).run()
+
+    assert ended == {'done': 6}
+    for site in ('C1', 'C2'):
+        assert launcher.stages(site) == STAGES
+    # Every later stage starts with the restart of the one before it
+    assert all('restart_file' in files for _, stage, files in launcher.calls
+               if stage != 'init_1')
+    with open(tmp_path / 'C1' / 'hole' / 'restart_file') as restart:
+        assert restart.read() == 'C1 hole\n'
+    assert set(read_state(tmp_path).values()) == {'done'}
+
+
+def test_resume_skips_done_stages(tmp_path):
+    make_sites(tmp_path)
+    with open(tmp_path / 'C1' / 'init_1' / 'restart_file', 'w') as restart:
+        restart.write('C1 init_1\n')
+    with open(tmp_path / STATE_FILE, 'w') as state:
+        json.dump({'C1/init_1': 'done', 'C1/init_2': 'running', 'C2/init_1': 'failed'}, state)
+    launcher = FakeLauncher()
+
+    Workflow('fop_di', 'C', launcher, str(tmp_path)).run()
+
+    assert launcher.stages('C1') == ['init_2', 'hole']
+    assert launcher.stages('C2') == STAGES
+    assert set(read_state(tmp_path).values()) == {'done'}
+
+
+@pytest.mark.parametrize('stage', STAGES)
+def test_failed_stage_stops_its_site(tmp_path, stage):
+    make_sites(tmp_path)
+    launcher = FakeLauncher(fail=[('C1', stage)])
+
+    ended = Workflow('fop_di', 'C', launcher, str(tmp_path)).run()
+
+    assert launcher.stages('C1') == STAGES[:STAGES.index(stage) + 1]
+    assert launcher.stages('C2') == STAGES
+    assert ended['failed'] == 1
+    state = read_state(tmp_path)
+    assert state[f'C1/{stage}'] == 'failed'
+    assert all(f'C1/{later}' not in state for later in STAGES[STAGES.index(stage) + 1:])
+
+
+def test_command_launcher_writes_its_pid(tmp_path):
+    launch = command_launcher(f'{sys.executable} -c "import os; print(os.getpid())"')
+
+    assert launch(str(tmp_path), 'C1', 'init_1') == 0
+    assert (tmp_path / PID_FILE).read_text() == (tmp_path / 'aims.out').read_text()
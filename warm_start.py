@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Start the init stage of every site from the converged ground state restart."""
+
+import os
+
+import numpy as np
+
+from control_in import ControlIn
+from geometry_in import Geometry
+from stage_restart import source_finished, stage_file
+
+
+# The ground state restart files are linked into the init stages under
+# this prefix, so the restart files the init stages write never replace them
+GROUND_PREFIX = 'ground_'
+LINK_METHODS = ['hardlink', 'symlink']
+
+# Species lines which define the basis functions, and the ones where only
+# the shell matters since the init stages change the occupation
+BASIS_FUNCTIONS = ('hydro', 'ionic', 'gaussian', 'sto', 'confined')
+SHELLS = ('valence', 'ion_occ')
+
+# Keywords which change the layout of the restart files
+RESTART_SETUP = ('spin', 'k_grid')
+
+VERBATIM = 'The contents of {name} will be repeated verbatim below'
+FINISHED = 'Have a nice day'
+
+
+def restart_name(control):
+    """Get the name of the restart file a control.in writes, or None."""
+    for keyword in ('restart_write_only', 'restart'):
+        for j in control.keyword(keyword):
+            return control.lines[j].split()[1]
+
+    return None
+
+
+def ground_restart_lines(control):
+    """Get the indices of the lines of a control.in reading the ground state restart."""
+    return [j for j in control.keyword('restart_read_only')
+            if control.lines[j].split()[1].startswith(GROUND_PREFIX)]
+
+
+def reads_ground_restart(stage_dir):
+    """Check if the control.in of a stage starts it from the ground state restart."""
+    try:
+        return len(ground_restart_lines(ControlIn.read(os.path.join(stage_dir,
+                                                                     'control.in')))) > 0
+    except FileNotFoundError:
+        return False
+
+
+def read_line(name):
+    """Get the control.in line reading the linked ground state restart."""
+    return f'restart_read_only       {GROUND_PREFIX}{name}\n'
+
+
+def verbatim_echo(out_path, name):
+    """Get the lines of an input file which aims.out repeats verbatim, or None."""
+    marker = VERBATIM.format(name=name)
+    lines = None
+
+    with open(out_path, 'r', errors='replace') as out:
+        for line in out:
+            if lines is None:
+                if marker in line:
+                    lines = []
+                    dashes = 0
+            elif line.strip().startswith('----'):
+                dashes += 1
+                if dashes == 2:
+                    return lines
+            elif dashes == 1:
+                lines.append(line)
+
+    return None
+
+
+def basis_lines(control, block):
+    """Get the lines of a species block which define its basis functions."""
+    lines = []
+
+    for line in control.lines[block.start:block.end]:
+        spl = line.split()
+        if len(spl) == 0:
+            continue
+        if spl[0] in SHELLS:
+            lines.append(tuple(spl[:3]))
+        elif spl[0] in BASIS_FUNCTIONS:
+            lines.append(tuple(spl))
+
+    return lines
+
+
+def species_basis(control):
+    """Get the basis lines of every species of a control.in."""
+    return {block.name: basis_lines(control, block) for block in control.species}
+
+
+def restart_setup(control):
+    """Get the arguments of the keywords which change the layout of the restart files."""
+    return {keyword: [tuple(control.lines[j].split()[1:]) for j in control.keyword(keyword)]
+            for keyword in RESTART_SETUP}
+
+
+def read_out_checks(out_path, name):
+    """Check if aims.out ended normally and if it logged writing a restart file."""
+    finished = wrote_restart = False
+
+    with open(out_path, 'r', errors='replace') as out:
+        for line in out:
+            if FINISHED in line:
+                finished = True
+            elif name in line and 'writ' in line.lower() and \
+                    not line.split()[0].startswith('restart'):
+                # Lines starting with a restart keyword are the control.in echo
+                wrote_restart = True
+
+    return finished, wrote_restart
+
+
+def same_geometry(a, b, tol=1e-6):
+    """Check if two geometries have the same atoms and lattice."""
+    if len(a.species) != len(b.species) or (a.lattice is None) != (b.lattice is None):
+        return False
+    if [a.species_names[s] for s in a.species] != [b.species_names[s] for s in b.species]:
+        return False
+    if a.lattice is not None and not np.allclose(a.lattice, b.lattice, atol=tol):
+        return False
+
+    return np.allclose(a.cartesian(), b.cartesian(), atol=tol)
+
+
+def ground_restart_files(ground, name):
+    """Get the names of the restart files of the ground state."""
+    with os.scandir(ground) as files:
+        return sorted(entry.name for entry in files
+                      if entry.name.startswith(name) and entry.is_file())
+
+
+def check_ground_restart(ground, control_in, geometry_in, element, species_lines):
+    """
+    Check that the ground state restart can start the init stages.
+
+    The ground state must have finished with the geometry, species basis
+    sets, spin and k-point grid of the inputs being generated from, as
+    repeated in its aims.out, or if aims.out does not repeat them, its
+    restart files must be newer than the inputs. The basis set added for
+    the target element must also match the ground state one. Returns the
+    name of the restart files, or raises ValueError. Prints a warning if
+    aims.out did not end normally or did not log writing the restart.
+    """
+    control = ControlIn(control_in)
+    name = restart_name(control)
+    if name is None:
+        raise ValueError('the ground state control.in writes no restart file')
+    if not source_finished(ground):
+        raise ValueError(f'the ground state calculation in {ground} has not finished')
+
+    files = ground_restart_files(ground, name)
+    if not files:
+        raise ValueError(f'no {name} files in {ground}')
+
+    out_path = os.path.join(ground, 'aims.out')
+    finished, wrote_restart = read_out_checks(out_path, name)
+    if not finished:
+        print(f'Warning: {out_path} did not end normally, the ground state restart may be '
+              'incomplete')
+    if not wrote_restart:
+        print(f'Warning: {out_path} does not log writing {name}, the restart files may be '
+              'from an earlier calculation')
+    oldest_restart = min(os.path.getmtime(os.path.join(ground, f)) for f in files)
+
+    geometry_echo = verbatim_echo(out_path, 'geometry.in')
+    if geometry_echo is not None:
+        if not same_geometry(Geometry(geometry_echo), geometry_in):
+            raise ValueError('geometry.in differs from the one of the ground state calculation')
+    elif os.path.getmtime(os.path.join(ground, 'geometry.in')) > oldest_restart:
+        raise ValueError('geometry.in is newer than the ground state restart')
+
+    control_echo = verbatim_echo(out_path, 'control.in')
+    if control_echo is not None:
+        ground_control = ControlIn(control_echo)
+        if species_basis(ground_control) != species_basis(control):
+            raise ValueError('the basis sets differ from the ones of the ground state calculation')
+        if restart_setup(ground_control) != restart_setup(control):
+            raise ValueError('the spin or k-point grid differs from the one of the ground state '
+                             'calculation')
+    elif os.path.getmtime(os.path.join(ground, 'control.in')) > oldest_restart:
+        raise ValueError('control.in is newer than the ground state restart')
+
+    target = ControlIn(species_lines)
+    ground_block = control.species_block(element)
+    if ground_block is None or basis_lines(control, ground_block) != \
+            basis_lines(target, target.species_block(element)):
+        raise ValueError(f'the {element} basis set added for the core hole differs from the '
+                         'ground state one')
+
+    return name
+
+
+def link_ground_restart(ground, stage_dir, name):
+    """Link the ground state restart files into a stage, returning how many were linked."""
+    files = ground_restart_files(ground, name)
+
+    for f in files:
+        stage_file(os.path.join(ground, f), os.path.join(stage_dir, GROUND_PREFIX + f),
+                   LINK_METHODS)
+
+    return len(files)
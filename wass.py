@@ -1,25 +1,163 @@
 #!/usr/bin/env python3
+"""Wasserstein distances between the XPS peaks of many systems."""
 
-import scipy.stats as st
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-files = ['aims_az', 'aims_np', 'castep_az', 'castep_np']
+import numpy as np
 
-for i in files:
-    for j in files:
+import profiling
 
-        az_list = []
-        np_list = []
 
-        with open(f'./{i}_C_xps_peaks.txt', 'r') as az_file:
-            for line in az_file:
-                az_list.append(line)
+PEAKS_SUFFIX = '_xps_peaks.txt'
 
-        with open(f'./{j}_C_xps_peaks.txt', 'r') as np_file:
-            for line in np_file:
-                np_list.append(line)
 
-        wass_out = st.wasserstein_distance(az_list, np_list)
-        print(i)
-        print(j)
-        print(wass_out)
-        print()
+def load_peaks(path):
+    """
+    Read a peaks file into sorted energies and weights.
+
+    The weights are the optional second column, such as the number of
+    equivalent sites of each peak, and are 1 without one.
+    """
+    data = np.loadtxt(path, ndmin=2)
+    if data.size == 0:
+        raise ValueError(f'{path} has no peaks')
+
+    values = data[:, 0]
+    weights = data[:, 1] if data.shape[1] > 1 else np.ones(len(values))
+    order = np.argsort(values, kind='stable')
+
+    return values[order], weights[order]
+
+
+def pack_peaks(peaks):
+    """
+    Pack the peaks of every system into arrays padded to the longest.
+
+    values are padded with the last energy of each system, and weights
+    are normalised to a sum of 1 and padded with 0.
+    """
+    length = max(len(values) for values, _ in peaks)
+    packed = np.empty((len(peaks), length))
+    packed_weights = np.zeros((len(peaks), length))
+
+    for k, (values, weights) in enumerate(peaks):
+        packed[k, :len(values)] = values
+        packed[k, len(values):] = values[-1]
+        packed_weights[k, :len(values)] = weights / weights.sum()
+
+    return packed, packed_weights
+
+
+def row_distances(row, values, weights, columns):
+    """
+    Get the distances of one system to several others from their merged CDFs.
+
+    The energies of the row and of each column are merged in order, with
+    the weights of the column negated, so that their running sum is the
+    difference of both CDFs. The distance is the integral of its absolute
+    value over the merged energies.
+    """
+    m, length = len(columns), values.shape[1]
+    merged = np.concatenate([np.broadcast_to(values[row], (m, length)), values[columns]], axis=1)
+    signed = np.concatenate([np.broadcast_to(weights[row], (m, length)), -weights[columns]],
+                            axis=1)
+
+    # Both halves are sorted, so a stable sort only has to merge them
+    order = np.argsort(merged, axis=1, kind='stable')
+    grid = np.take_along_axis(merged, order, axis=1)
+    cdf_diff = np.cumsum(np.take_along_axis(signed, order, axis=1), axis=1)
+
+    return (np.abs(cdf_diff[:, :-1]) * np.diff(grid, axis=1)).sum(axis=1)
+
+
+def block_distances(rows, values, weights):
+    """Get the distances of a block of rows to every later system."""
+    n = len(values)
+    return [(row, row_distances(row, values, weights, np.arange(row + 1, n)))
+            for row in rows if row + 1 < n]
+
+
+@profiling.timed()
+def distance_matrix(peaks, workers=None, processes=False, block=16):
+    """
+    Get the symmetric matrix of Wasserstein distances between systems.
+
+    peaks holds the (energies, weights) of each system. Only the upper
+    triangle is computed, in blocks of rows which run concurrently.
+    """
+    values, weights = pack_peaks(peaks)
+    n = len(peaks)
+    matrix = np.zeros((n, n))
+    blocks = [range(start, min(start + block, n)) for start in range(0, n, block)]
+
+    if workers == 1 or len(blocks) <= 1:
+        results = [block_distances(rows, values, weights) for rows in blocks]
+    else:
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with pool(max_workers=workers) as executor:
+            results = list(executor.map(block_distances, blocks, [values] * len(blocks),
+                                        [weights] * len(blocks)))
+
+    for result in results:
+        for row, distances in result:
+            matrix[row, row + 1:] = distances
+            matrix[row + 1:, row] = distances
+
+    return matrix
+
+
+def label(path):
+    """Get the name of a system from its peaks file."""
+    name = os.path.basename(path)
+    return name[:-len(PEAKS_SUFFIX)] if name.endswith(PEAKS_SUFFIX) else name
+
+
+def write_matrix(path, labels, matrix):
+    """Write a distance matrix with a row and column of labels."""
+    width = max(len(name) for name in labels + ['system'])
+
+    with open(path, 'w') as out:
+        out.write(' '.join([f'{"system":{width}s}'] + [f'{name:>14s}' for name in labels]) + '\n')
+        for name, row in zip(labels, matrix):
+            out.write(' '.join([f'{name:{width}s}'] + [f'{d:14.8g}' for d in row]) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calculate the Wasserstein distances between '
+                                     'the XPS peaks of several systems.')
+    parser.add_argument('files', nargs='*',
+                        help=f'peaks files (default: every *{PEAKS_SUFFIX} here)')
+    parser.add_argument('-e', '--element', help=f'only use *_<element>{PEAKS_SUFFIX} files')
+    parser.add_argument('-o', '--output', default='wass_matrix.txt',
+                        help='distance matrix file (default: wass_matrix.txt)')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='number of row blocks to compute at once (default: all cores)')
+    parser.add_argument('--processes', action='store_true',
+                        help='compute row blocks with processes instead of threads')
+    parser.add_argument('-b', '--block', type=int, default=16,
+                        help='rows in each block (default: 16)')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
+    files = args.files
+    if not files:
+        pattern = f'*_{args.element}{PEAKS_SUFFIX}' if args.element else f'*{PEAKS_SUFFIX}'
+        files = sorted(glob.glob(pattern))
+    if len(files) < 2:
+        print('At least two peaks files are needed')
+        exit(1)
+
+    # Read every file once
+    peaks = [load_peaks(path) for path in files]
+    matrix = distance_matrix(peaks, args.workers, args.processes, args.block)
+
+    write_matrix(args.output, [label(path) for path in files], matrix)
+    print(f'Distances between {len(files)} systems written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
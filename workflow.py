@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Run the stages of FOP calculations site by site as a dependency chain."""
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import tempfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import profiling
+from harvest import find_sites
+from scf_monitor import PID_FILE
+from stage_restart import CHAINS, METHODS, source_finished, stage_site
+
+
+# State of every (site, stage), kept next to the site directories
+STATE_FILE = '.workflow_state.json'
+
+
+def chain_stages(method):
+    """Get the stages of a method in the order they run."""
+    chain = CHAINS[method]
+    return [chain[0][0]] + [dst_stage for _, dst_stage in chain]
+
+
+def command_launcher(command):
+    """
+    Make a launcher which runs a command in a stage directory.
+
+    The command may contain {site} and {stage}, e.g. 'srun -J {site}_{stage}
+    aims.x'. Its output is written to aims.out and errors to aims.err, and
+    its pid to aims.pid for the signal hook of scf_monitor.py.
+    """
+    def launch(stage_dir, site, stage):
+        args = shlex.split(command.format(site=site, stage=stage))
+
+        with open(os.path.join(stage_dir, 'aims.out'), 'w') as out, \
+                open(os.path.join(stage_dir, 'aims.err'), 'w') as err:
+            process = subprocess.Popen(args, cwd=stage_dir, stdout=out, stderr=err)
+            with open(os.path.join(stage_dir, PID_FILE), 'w') as pid:
+                pid.write(f'{process.pid}\n')
+            return process.wait()
+
+    return launch
+
+
+class Workflow:
+    """
+    Per-site chains of the stages of an element, run under a global limit.
+
+    Each site moves on to its next stage as soon as its previous stage
+    has finished and its restart files are staged, independently of the
+    other sites. A stage is done when the launcher succeeded and aims.out
+    has a final energy. The state is saved after every stage, so a new
+    run skips the stages already done and reruns failed or interrupted
+    ones.
+    """
+
+    def __init__(self, method, element, launcher, root='./', limit=4, methods=METHODS,
+                 move=False):
+        self.stages = chain_stages(method)
+        self.element = element
+        self.launcher = command_launcher(launcher) if isinstance(launcher, str) else launcher
+        self.root = root
+        self.limit = limit
+        self.methods = methods
+        self.move = move
+        self.state_path = os.path.join(root, STATE_FILE)
+        self.state = self.load_state()
+
+    def load_state(self):
+        """Read the saved state, or an empty one if there is none."""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as state:
+                return json.load(state)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_state(self):
+        """Replace the saved state atomically."""
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=STATE_FILE + '.')
+        try:
+            with os.fdopen(tmp_fd, 'w', encoding='utf-8') as tmp:
+                json.dump(self.state, tmp, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def is_done(self, directory, stage):
+        """Check if a stage of a site has finished, in this or an earlier run."""
+        status = self.state.get(f'{directory}/{stage}')
+        if status is not None:
+            return status == 'done'
+
+        # Stages run outside the workflow count if they finished
+        return source_finished(os.path.join(self.root, directory, stage))
+
+    def next_stage(self, directory, start=0):
+        """Get the index of the first stage of a site which is not done, or None."""
+        for n in range(start, len(self.stages)):
+            if not self.is_done(directory, self.stages[n]):
+                return n
+
+        return None
+
+    def run_stage(self, directory, n):
+        """Stage the restart files of a stage from the previous one and run it."""
+        site_dir = os.path.join(self.root, directory)
+        stage = self.stages[n]
+
+        if n > 0:
+            stage_site(site_dir, self.stages[n - 1], stage, self.methods, self.move)
+
+        with profiling.timer('workflow.run_stage', site=directory, stage=stage):
+            returncode = self.launcher(os.path.join(site_dir, stage), directory, stage)
+
+        if returncode != 0:
+            print(f'{directory}/{stage} failed with exit code {returncode}')
+            return 'failed'
+        if not source_finished(os.path.join(site_dir, stage)):
+            print(f'{directory}/{stage} did not reach a final energy')
+            return 'failed'
+
+        return 'done'
+
+    def run(self):
+        """Run every stage which is not done, returning how many stages ended in each state."""
+        # Sites without directories for these stages, such as FOB-only ones, are left out
+        sites = [directory for _, directory in find_sites(self.element, self.root)
+                 if os.path.isdir(os.path.join(self.root, directory, self.stages[0]))]
+        ended = Counter()
+
+        with ThreadPoolExecutor(max_workers=max(self.limit, 1)) as executor:
+            running = {}
+
+            def submit(directory, n):
+                self.state[f'{directory}/{self.stages[n]}'] = 'running'
+                running[executor.submit(self.run_stage, directory, n)] = (directory, n)
+
+            for directory in sites:
+                n = self.next_stage(directory)
+                if n is not None:
+                    submit(directory, n)
+            self.save_state()
+
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    directory, n = running.pop(future)
+
+                    try:
+                        status = future.result()
+                    except Exception as err:
+                        print(f'{directory}/{self.stages[n]} failed: {err}')
+                        status = 'failed'
+
+                    self.state[f'{directory}/{self.stages[n]}'] = status
+                    ended[status] += 1
+
+                    # Move this site on without waiting for the others
+                    if status == 'done':
+                        n = self.next_stage(directory, n + 1)
+                        if n is not None:
+                            submit(directory, n)
+
+                self.save_state()
+
+        return ended
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the stages of every site of an '
+                                     'element as soon as their previous stage finishes.')
+    parser.add_argument('method', choices=CHAINS, help='type of calculation')
+    parser.add_argument('-e', '--element', help='target element')
+    parser.add_argument('-l', '--launcher', required=True,
+                        help="command to run FHI-aims in a stage directory, e.g. "
+                        "'mpirun -np 32 aims.x', which may contain {site} and {stage}")
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='number of stages to run at once (default: 4)')
+    parser.add_argument('-m', '--methods', nargs='+', choices=METHODS, default=METHODS,
+                        help='ways to stage the restart files, in order of preference')
+    parser.add_argument('--move', action='store_true',
+                        help='move the restart files instead of linking them')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.setup(args.profile)
+
+    if args.element is None:
+        args.element = str(input('Enter atom: '))
+
+    workflow = Workflow(args.method, args.element, args.launcher, limit=args.jobs,
+                        methods=args.methods, move=args.move)
+    ended = workflow.run()
+
+    print(', '.join(f'{status} {count}' for status, count in ended.items())
+          or 'Every stage is already done')
+
+
+if __name__ == '__main__':
+    main()